@@ -0,0 +1,80 @@
+import os
+import json
+import asyncio
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from youtube_tools.ytshorts_pull import get_youtube_videos_details
+from jobs_handler import get_pipeline
+from tools.workers import run_in_stage
+from tools.video_urls import parse_video_url
+
+router = APIRouter()
+
+# Largest number of URLs accepted in one /batch request
+BATCH_MAX_URLS = 500
+# Number of items ingested concurrently within one batch. Each pipeline stage is
+# additionally bounded by its own pool in tools/workers.py.
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+class BatchRequest(BaseModel):
+    urls: list[str]
+
+async def prefetch_youtube_details(urls: list[str]):
+    """
+    Warms the metadata cache for every YouTube URL in the batch with batched
+    YouTube Data API calls (50 ids per call), so each item's pipeline hits the cache.
+    """
+    video_ids = []
+    for url in urls:
+        video = parse_video_url(url)
+        if video and video.source == "youtube":
+            video_ids.append(video.video_id)
+    if video_ids:
+        await run_in_stage("metadata", get_youtube_videos_details, video_ids)
+
+async def ingest_item(index: int, url: str, semaphore: asyncio.Semaphore):
+    """Runs one URL through its pipeline and returns a per-item result dict (never raises)."""
+    pipeline = get_pipeline(url)
+    if pipeline is None:
+        return {"index": index, "url": url, "status": "error", "error": "Unsupported URL. Please provide a valid TikTok or YouTube URL."}
+
+    async with semaphore:
+        try:
+            result = await pipeline(url)
+            return {"index": index, "url": url, "status": "ok", "result": result}
+        except HTTPException as e:
+            return {"index": index, "url": url, "status": "error", "error": str(e.detail)}
+        except Exception as e:
+            print(f"Unexpected error ingesting {url} in batch: {e}")
+            return {"index": index, "url": url, "status": "error", "error": str(e)}
+
+@router.post("/batch", tags=["batch"])
+async def ingest_batch(request: BatchRequest):
+    """
+    Ingests a list of YouTube/TikTok URLs at once.
+
+    YouTube metadata is fetched up front in batches of 50 ids per API call, then every
+    URL runs through its pipeline with at most BATCH_CONCURRENCY in flight. Results are
+    streamed back as NDJSON, one line per URL in completion order; each line carries
+    the URL's `index` in the request, a `status` of 'ok' or 'error', and the `result`
+    or `error`.
+    """
+    if not request.urls:
+        raise HTTPException(status_code=400, detail="No URLs provided.")
+    if len(request.urls) > BATCH_MAX_URLS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_URLS} URLs can be submitted per batch.")
+
+    async def ndjson_results():
+        await prefetch_youtube_details(request.urls)
+        semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+        tasks = [asyncio.create_task(ingest_item(index, url, semaphore)) for index, url in enumerate(request.urls)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield json.dumps(await next_done) + "\n"
+        finally:
+            # Stop outstanding items if the client disconnects mid-stream
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(ndjson_results(), media_type="application/x-ndjson")
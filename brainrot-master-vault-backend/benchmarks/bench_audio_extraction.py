@@ -0,0 +1,83 @@
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+import tempfile
+
+# Add the parent directory to sys.path so we can import the tools
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+from tools.audio import get_ffmpeg_path, extract_audio, extract_audio_bytes
+
+METHODS = ("moviepy-mp3", "ffmpeg-opus", "ffmpeg-flac", "ffmpeg-opus-pipe")
+
+def make_sample_video(path: str, seconds: int):
+    """Generates a synthetic 720p H.264 + AAC video (test pattern and a tone)."""
+    subprocess.run([
+        get_ffmpeg_path(), "-hide_banner", "-loglevel", "error", "-y",
+        "-f", "lavfi", "-i", f"testsrc=size=1280x720:rate=30:duration={seconds}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=44100:duration={seconds}",
+        "-c:v", "libx264", "-preset", "ultrafast", "-c:a", "aac", "-shortest", path,
+    ], check=True)
+
+def run_method(method: str, video_path: str, output_dir: str):
+    """Runs one extraction method in this process and returns the output size in bytes."""
+    if method == "moviepy-mp3":
+        # The previous pipeline: decode through moviepy and re-encode a 192k MP3
+        from moviepy import VideoFileClip
+        output_path = os.path.join(output_dir, "out.mp3")
+        with VideoFileClip(video_path) as video_clip:
+            video_clip.audio.write_audiofile(output_path, codec='mp3', logger=None)
+        return os.path.getsize(output_path)
+    if method == "ffmpeg-opus-pipe":
+        return len(extract_audio_bytes(video_path, "opus"))
+    fmt = method.split("-")[1]
+    output_path = os.path.join(output_dir, f"out.{fmt}")
+    extract_audio(video_path, output_path, fmt)
+    return os.path.getsize(output_path)
+
+def child(method: str, video_path: str):
+    """Child-process entry point: runs one method and prints its measurements as JSON."""
+    with tempfile.TemporaryDirectory() as output_dir:
+        start = time.perf_counter()
+        size = run_method(method, video_path, output_dir)
+        elapsed = time.perf_counter() - start
+    print(json.dumps({
+        "seconds": elapsed,
+        "bytes": size,
+        # ru_maxrss is in KB on Linux: peak of this Python process and of its largest ffmpeg child
+        "python_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "ffmpeg_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare audio extraction wall time and peak RSS.")
+    parser.add_argument("--input", help="Video to extract from. Defaults to a generated sample.")
+    parser.add_argument("--seconds", type=int, default=60, help="Length of the generated sample video.")
+    parser.add_argument("--child", choices=METHODS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.input)
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        video_path = args.input
+        if not video_path:
+            video_path = os.path.join(tmp_dir, "sample.mp4")
+            make_sample_video(video_path, args.seconds)
+
+        print(f"{'method':<18} {'wall s':>7} {'output KB':>10} {'python RSS MB':>14} {'ffmpeg RSS MB':>14}")
+        for method in METHODS:
+            # Each method runs in a fresh process so peak RSS isn't shared between them
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", method, "--input", video_path],
+                capture_output=True, text=True, check=True,
+            ).stdout.strip().splitlines()[-1]
+            result = json.loads(output)
+            print(f"{method:<18} {result['seconds']:>7.2f} {result['bytes'] / 1024:>10.0f} "
+                  f"{result['python_rss_mb']:>14.0f} {result['ffmpeg_rss_mb']:>14.0f}")
@@ -0,0 +1,104 @@
+import io
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import contextlib
+
+# Add the parent directory to sys.path so we can import db_commands
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+from youtube_tools import db_commands
+from youtube_tools.memory_cache import memory_cache
+from youtube_tools.cache_backend import RedisBackend, SQLiteBackend, set_cache_backend, get_cache_backend
+from stub_redis_server import start_stub_server
+
+LOCK_ROUNDS = 500
+
+def use_replica(tmp_dir: str, name: str):
+    """Points db_commands at a replica's own database, with a cold memory tier."""
+    db_commands.DB_PATH = os.path.join(tmp_dir, f"{name}.db")
+    memory_cache.clear()
+    with contextlib.redirect_stdout(io.StringIO()):
+        db_commands.init_db()
+
+def seed(video_ids: list[str]):
+    """Caches a response, transcript and summary per video, as a finished pipeline run does."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        for video_id in video_ids:
+            response = {"items": [{"id": video_id, "snippet": {"title": f"Video {video_id}", "channelTitle": "bench",
+                                                               "description": "lorem ipsum " * 100}}]}
+            db_commands.cache_response(video_id, response, source="youtube")
+            db_commands.cache_transcript(video_id, "transcript words " * 200)
+            db_commands.cache_summary(video_id, "summary words " * 20)
+
+def timed_round_trips(state, func, *args):
+    """Returns (result, ms, round trips to the stub)."""
+    before = state.round_trips
+    start = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - start) * 1000, state.round_trips - before
+
+def lock_round_trip_us(backend) -> float:
+    start = time.perf_counter()
+    for i in range(LOCK_ROUNDS):
+        token = backend.acquire_lock(f"bench:{i}", 30)
+        backend.release_lock(f"bench:{i}", token)
+    return (time.perf_counter() - start) / LOCK_ROUNDS * 1e6
+
+def contended_lock_winners(backend, threads: int = 8) -> int:
+    """How many of `threads` simultaneous acquirers of one lock get it (should be 1)."""
+    winners = []
+    barrier = threading.Barrier(threads)
+    def contend():
+        barrier.wait()
+        if backend.acquire_lock("bench:contended", 30):
+            winners.append(1)
+    workers = [threading.Thread(target=contend) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return len(winners)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared cache backend: cross-replica hits, pipelined batch gets and locks.")
+    parser.add_argument("--videos", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.0005, help="Simulated network round trip to Redis (seconds).")
+    args = parser.parse_args()
+
+    server, state, redis_url = start_stub_server(latency=args.latency)
+    set_cache_backend(RedisBackend(redis_url))
+    video_ids = [f"vid{i:07d}" for i in range(args.videos)]
+    print(f"{args.videos} videos, {args.latency * 1000:.1f} ms simulated round trip to the stub Redis server")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        use_replica(tmp_dir, "replica_a")
+        seed(video_ids)
+        print(f"replica A cached {len(state.data)} shared entries")
+
+        # Replica B: cold database, reads through to the shared cache one video at a time
+        use_replica(tmp_dir, "replica_b")
+        results, ms, trips = timed_round_trips(state, lambda: [db_commands.get_cached_response_data(v) for v in video_ids])
+        print(f"replica B, one lookup per video:   {ms:8.1f} ms, {trips:5d} round trips, {sum(map(bool, results))} hits")
+
+        # Replica C: cold database, one batched lookup
+        use_replica(tmp_dir, "replica_c")
+        results, ms, trips = timed_round_trips(state, db_commands.get_cached_responses_data, video_ids)
+        print(f"replica C, get_cached_responses_data: {ms:6.1f} ms, {trips:5d} round trips, {len(results)} hits")
+        memory_cache.clear()
+        results, ms, trips = timed_round_trips(state, db_commands.get_cached_responses_data, video_ids)
+        print(f"replica C again (local copies):    {ms:8.1f} ms, {trips:5d} round trips, {len(results)} hits")
+
+        transcript, ms, trips = timed_round_trips(state, db_commands.get_cached_transcript, video_ids[0])
+        print(f"replica C transcript from replica A: {'hit' if transcript else 'miss'} in {ms:.2f} ms, {trips} round trip")
+
+        print(f"lock acquire+release: redis {lock_round_trip_us(get_cache_backend()):7.0f} us, "
+              f"sqlite {lock_round_trip_us(SQLiteBackend()):7.0f} us")
+        print(f"contended lock winners out of 8: redis {contended_lock_winners(get_cache_backend())}, "
+              f"sqlite {contended_lock_winners(SQLiteBackend())}")
+        db_commands.close_connections()
+    server.shutdown()
@@ -0,0 +1,68 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import tempfile
+import threading
+
+# Add the parent directory to sys.path so we can import db_commands
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+from youtube_tools import db_commands
+
+NUM_VIDEOS = 1000
+NUM_LOOKUPS = 20000
+NUM_THREADS = 4
+
+def seed(num_videos: int):
+    """Fills the cache with fake videos so lookups have something to hit."""
+    for i in range(num_videos):
+        video_id = f"vid{i:07d}"
+        db_commands.cache_response(video_id, {"id": video_id, "title": f"Video {i}"}, source='tiktok')
+        db_commands.cache_transcript(video_id, f"transcript {i} " * 20)
+
+def naive_get_cached_response(video_id: str):
+    """The pre-pool implementation: one connection per lookup, default journal mode."""
+    conn = sqlite3.connect(db_commands.DB_PATH)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT body, encoding FROM responses WHERE video_id = ?", (video_id,))
+        result = cursor.fetchone()
+        return db_commands.decode_text(*result) if result else None
+    finally:
+        conn.close()
+
+def run(lookup, num_lookups: int, num_threads: int):
+    """Runs num_lookups lookups split across num_threads threads and returns lookups/sec."""
+    per_thread = num_lookups // num_threads
+
+    def worker(offset: int):
+        for i in range(per_thread):
+            lookup(f"vid{(offset + i) % NUM_VIDEOS:07d}")
+
+    threads = [threading.Thread(target=worker, args=(t * per_thread,)) for t in range(num_threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return (per_thread * num_threads) / elapsed
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_commands.DB_PATH = os.path.join(tmp_dir, "bench_cache.db")
+        db_commands.init_db()
+        seed(NUM_VIDEOS)
+        # Both paths must find the same row, or the comparison measures errors
+        assert naive_get_cached_response("vid0000000") == db_commands.get_cached_response("vid0000000") is not None
+
+        for threads in (1, NUM_THREADS):
+            before = run(naive_get_cached_response, NUM_LOOKUPS, threads)
+            after = run(db_commands.get_cached_response, NUM_LOOKUPS, threads)
+            print(f"{threads} thread(s): connect-per-call {before:,.0f} lookups/sec, "
+                  f"pooled {after:,.0f} lookups/sec ({after / before:.1f}x)")
+
+        db_commands.close_connections()
@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+
+# Add the parent directory to sys.path so we can import the embedding index
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+from youtube_tools import db_commands
+from tools import embeddings
+from tools.embeddings import EmbeddingIndex
+
+QUERIES = 50
+K = 10
+
+def clustered_vectors(count: int, dimensions: int, topics: int, seed: int = 42) -> np.ndarray:
+    """Unit vectors scattered around `topics` random directions, like summaries about a few hundred subjects."""
+    centres = np.random.default_rng(topics).standard_normal((topics, dimensions)).astype(np.float32)
+    rng = np.random.default_rng(seed)
+    vectors = centres[rng.integers(topics, size=count)] + 2.0 * rng.standard_normal((count, dimensions)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def timed_searches(index: EmbeddingIndex, queries: np.ndarray):
+    """Returns (ms per query, list of result id sets)."""
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        results.append({video_id for video_id, _ in index.search(query, K)})
+    return (time.perf_counter() - start) * 1000 / len(queries), results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark exact vs IVF related-video search.")
+    parser.add_argument("--videos", type=int, default=100_000)
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--topics", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_commands.DB_PATH = os.path.join(tmp_dir, "bench_embeddings.db")
+        db_commands.init_db()
+        index = EmbeddingIndex(os.path.join(tmp_dir, "embeddings"), args.dimensions)
+
+        vectors = clustered_vectors(args.videos, args.dimensions, args.topics)
+        start = time.perf_counter()
+        for offset in range(0, args.videos, 10_000):
+            batch = vectors[offset:offset + 10_000]
+            index.add([f"vid{i:07d}" for i in range(offset, offset + len(batch))], batch)
+        file_mb = os.path.getsize(index._path) / 1024 ** 2
+        print(f"Stored {args.videos} x {args.dimensions} vectors in {time.perf_counter() - start:.1f}s "
+              f"({file_mb:.0f} MB float16 file, {vectors.nbytes / 1024 ** 2:.0f} MB as float32)")
+
+        # Queries are fresh vectors from the same topics, not videos already in the index
+        queries = clustered_vectors(QUERIES, args.dimensions, args.topics, seed=7)
+
+        embeddings.EMBEDDING_ANN_THRESHOLD = args.videos + 1
+        exact_ms, exact_results = timed_searches(index, queries)
+        print(f"exact search:  {exact_ms:7.1f} ms/query")
+
+        start = time.perf_counter()
+        edges, _ = index.edges(k=5, min_score=0.0, limit=200)
+        print(f"/related/edges page of 200 videos: {(time.perf_counter() - start) * 1000:.0f} ms, {len(edges)} edges")
+        per_source = time.perf_counter()
+        index.related("vid0000000", 5)
+        print(f"  (one exact related() per video would take {(time.perf_counter() - per_source) * 200:.0f} s)")
+
+        # Crossing the threshold starts the IVF build in the background; queries don't wait for it
+        embeddings.EMBEDDING_ANN_THRESHOLD = 0
+        start = time.perf_counter()
+        index.search(queries[0], K)
+        print(f"first query past the threshold: {(time.perf_counter() - start) * 1000:.1f} ms (exact while the IVF index builds)")
+        while index._ivf is None:
+            time.sleep(0.01)
+        print(f"IVF build:     {(time.perf_counter() - start):7.1f} s")
+        for probes in (4, 8, 16, 32):
+            embeddings.EMBEDDING_ANN_PROBES = probes
+            ann_ms, ann_results = timed_searches(index, queries)
+            recall = np.mean([len(a & e) / K for a, e in zip(ann_results, exact_results)])
+            print(f"IVF {probes:>2} probes: {ann_ms:7.1f} ms/query, recall@{K} {recall:.3f}")
+
+        db_commands.close_connections()
@@ -0,0 +1,84 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+# Add the parent directory to sys.path so we can import db_commands
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+from youtube_tools import db_commands
+
+CLASSIFICATIONS = ["tech", "health", "crime", "education", "investing", "disaster", "food", "travel"]
+TRANSCRIPT = "word " * 300
+
+def seed(num_videos: int, num_channels: int):
+    """Bulk-inserts cached videos with transcripts, channels and one or two classifications each."""
+    conn = db_commands.get_connection()
+    rng = random.Random(42)
+    with conn:
+        channels = [f"channel{rng.randrange(num_channels)}" for _ in range(num_videos)]
+        conn.executemany(
+            "INSERT INTO cache (video_id, source, title, channel) VALUES (?, 'tiktok', ?, ?)",
+            ((f"vid{i:07d}", f"Video {i}", channels[i]) for i in range(num_videos)),
+        )
+        conn.executemany(
+            "INSERT INTO responses (video_id, body) VALUES (?, ?)",
+            (
+                (f"vid{i:07d}", json.dumps({"id": f"vid{i:07d}", "title": f"Video {i}", "channelTitle": channels[i]}))
+                for i in range(num_videos)
+            ),
+        )
+        conn.executemany(
+            "INSERT INTO transcripts (video_id, body) VALUES (?, ?)",
+            ((f"vid{i:07d}", TRANSCRIPT) for i in range(num_videos)),
+        )
+        conn.executemany(
+            "INSERT INTO classification (video_id, classification) VALUES (?, ?)",
+            (
+                (f"vid{i:07d}", classification)
+                for i in range(num_videos)
+                for classification in rng.sample(CLASSIFICATIONS, rng.choice((1, 2)))
+            ),
+        )
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark /graph against deriving the graph from the /home dump.")
+    parser.add_argument("--videos", type=int, default=100_000)
+    parser.add_argument("--channels", type=int, default=2_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_commands.DB_PATH = os.path.join(tmp_dir, "bench_graph.db")
+        db_commands.init_db()
+        seed(args.videos, args.channels)
+        _, build_ms = timed(db_commands.rebuild_graph)
+        print(f"Full graph build for {args.videos} videos: {build_ms / 1000:.1f}s")
+
+        # What the client used to download before drawing anything
+        videos, home_ms = timed(db_commands.get_videos)
+        home_bytes = len(json.dumps({"videos": videos[0]}))
+        print(f"{'/home dump':<32} {home_ms:8.0f} ms {home_bytes / 1024:10.0f} KB")
+        for detail, max_videos in (("classifications", 0), ("channels", 0), ("videos", 500), ("videos", 5000)):
+            graph, graph_ms = timed(db_commands.get_graph, detail, max_videos=max_videos)
+            label = f"/graph {detail}" + (f" ({max_videos} videos)" if max_videos else "")
+            print(f"{label:<32} {graph_ms:8.1f} ms {len(json.dumps(graph)) / 1024:10.0f} KB "
+                  f"({len(graph['nodes'])} nodes, {len(graph['edges'])} edges)")
+
+        # Cost of keeping the graph up to date on ingest
+        rng = random.Random(7)
+        start = time.perf_counter()
+        for i in range(1000):
+            video_id = f"new{i:05d}"
+            db_commands.cache_response(video_id, {"title": f"New {i}", "channelTitle": f"channel{rng.randrange(args.channels)}"}, source="tiktok")
+            db_commands.add_classification(video_id, rng.choice(CLASSIFICATIONS))
+        print(f"cache_response + add_classification with graph updates: {(time.perf_counter() - start):.3f} ms/video")
+        db_commands.close_connections()
@@ -0,0 +1,86 @@
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+
+# Add the parent directory to sys.path so we can import db_commands
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+from youtube_tools import db_commands
+
+VAULT_SIZES = (10_000, 100_000)
+CLASSIFICATIONS = ["tech", "health", "crime", "education", "investing", "disaster"]
+RUNS = 3
+
+def seed(num_videos: int):
+    """Bulk-inserts num_videos fake cached videos, each with 0-2 classifications."""
+    conn = db_commands.get_connection()
+    rng = random.Random(42)
+    with conn:
+        conn.executemany(
+            "INSERT INTO cache (video_id, source, title) VALUES (?, ?, ?)",
+            ((f"vid{i:07d}", "tiktok" if i % 2 else "youtube", f"Video {i}") for i in range(num_videos)),
+        )
+        conn.executemany(
+            "INSERT INTO responses (video_id, body) VALUES (?, ?)",
+            (
+                (f"vid{i:07d}", json.dumps({"id": f"vid{i:07d}", "title": f"Video {i}", "description": "lorem ipsum " * 10}))
+                for i in range(num_videos)
+            ),
+        )
+        conn.executemany(
+            "INSERT INTO transcripts (video_id, body) VALUES (?, ?)",
+            ((f"vid{i:07d}", "transcript words " * 50) for i in range(num_videos)),
+        )
+        conn.executemany(
+            "INSERT INTO summaries (video_id, body) VALUES (?, ?)",
+            ((f"vid{i:07d}", "summary words " * 10) for i in range(num_videos)),
+        )
+        conn.executemany(
+            "INSERT INTO classification (video_id, classification) VALUES (?, ?)",
+            (
+                (f"vid{i:07d}", label)
+                for i in range(num_videos)
+                for label in rng.sample(CLASSIFICATIONS, rng.randint(0, 2))
+            ),
+        )
+
+def get_all_n_plus_one():
+    """The previous get_all(): one classification query per cached video."""
+    cursor = db_commands.get_connection().execute(
+        "SELECT c.video_id, r.body, t.body, c.source FROM cache c"
+        " LEFT JOIN responses r ON r.video_id = c.video_id LEFT JOIN transcripts t ON t.video_id = c.video_id"
+    )
+    all_data = []
+    for video_id, response_data_json, transcript, source in cursor.fetchall():
+        all_data.append({
+            "video_id": video_id,
+            "response_data": json.loads(response_data_json) if response_data_json else None,
+            "transcript": transcript,
+            "source": source,
+            "classification": db_commands.get_classification(video_id) or [],
+        })
+    return all_data
+
+def time_home(get_all) -> float:
+    """Returns the best-of-RUNS latency in ms of building and serialising the /home payload."""
+    best = float("inf")
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        json.dumps({"videos": get_all()})
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+if __name__ == "__main__":
+    for size in VAULT_SIZES:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_commands.DB_PATH = os.path.join(tmp_dir, "bench_home.db")
+            db_commands.init_db()
+            seed(size)
+            before = time_home(get_all_n_plus_one)
+            after = time_home(db_commands.get_all)
+            print(f"{size:,} videos: /home N+1 {before:,.0f} ms, single query {after:,.0f} ms ({before / after:.1f}x)")
+            db_commands.close_connections()
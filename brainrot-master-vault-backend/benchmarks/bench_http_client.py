@@ -0,0 +1,102 @@
+import io
+import os
+import sys
+import time
+import argparse
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+# Add the parent directory to sys.path so we can import http_client
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+from tools import http_client
+from stub_flaky_server import start_stub_server
+
+def naive_get(url: str):
+    """What the tools did before: a fresh connection per call, one attempt, a 30 s timeout."""
+    return requests.get(url, timeout=30)
+
+def client_get(url: str):
+    return http_client.http_get(url, timeout=0.5, deadline=3)
+
+def run(get, url: str, calls: int, threads: int):
+    """Makes `calls` calls from `threads` threads. Returns (latencies in seconds, successes)."""
+    def call(_):
+        start = time.perf_counter()
+        try:
+            ok = get(url).status_code == 200
+        except requests.exceptions.RequestException:
+            ok = False
+        return time.perf_counter() - start, ok
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(threads) as pool:
+        results = list(pool.map(call, range(calls)))
+    return [latency for latency, _ in results], sum(ok for _, ok in results)
+
+def percentile(latencies, fraction: float) -> float:
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def report(label: str, state, latencies, successes: int, before: dict):
+    print(f"  {label:<14} ok {successes:4d}/{len(latencies)}  p50 {percentile(latencies, 0.5) * 1000:7.1f} ms  "
+          f"p95 {percentile(latencies, 0.95) * 1000:7.1f} ms  p99 {percentile(latencies, 0.99) * 1000:7.1f} ms  "
+          f"max {max(latencies) * 1000:7.1f} ms  server saw {state.requests - before['requests']:4d} requests "
+          f"on {state.connections - before['connections']:4d} connections")
+
+def snapshot(state) -> dict:
+    return {"requests": state.requests, "connections": state.connections}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Outbound HTTP client under injected faults: tail latency, retries and circuit breaking.")
+    parser.add_argument("--calls", type=int, default=600)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--reset-rate", type=float, default=0.02)
+    parser.add_argument("--slow-rate", type=float, default=0.02)
+    args = parser.parse_args()
+
+    # Short backoff and breaker reset so the run takes seconds, not minutes
+    http_client.HTTP_RETRY_BASE_DELAY = 0.05
+    http_client.HTTP_BREAKER_RESET = 1.0
+
+    server, state, url = start_stub_server(latency=0.01, error_rate=args.error_rate, reset_rate=args.reset_rate,
+                                           slow_rate=args.slow_rate, slow_seconds=3.0)
+    print(f"{args.calls} calls from {args.threads} threads, 10 ms per request; "
+          f"faults: {args.error_rate:.0%} 503, {args.reset_rate:.0%} resets, {args.slow_rate:.0%} hang 3 s")
+
+    print("healthy server:")
+    state.error_rate = state.reset_rate = state.slow_rate = 0
+    for label, get in (("naive requests", naive_get), ("http_client", client_get)):
+        before = snapshot(state)
+        report(label, state, *run(get, url, args.calls, args.threads), before)
+
+    print("injected faults:")
+    state.error_rate, state.reset_rate, state.slow_rate = args.error_rate, args.reset_rate, args.slow_rate
+    for label, get in (("naive requests", naive_get), ("http_client", client_get)):
+        before = snapshot(state)
+        report(label, state, *run(get, url, args.calls, args.threads), before)
+
+    time.sleep(3) # Let the server finish requests the client abandoned
+    print(f"per-host cap ({http_client.HTTP_MAX_PER_HOST}) with {args.threads * 2} threads:")
+    state.error_rate = state.reset_rate = state.slow_rate = 0
+    state.max_in_flight = 0
+    before = snapshot(state)
+    report("http_client", state, *run(client_get, url, args.calls, args.threads * 2), before)
+    print(f"  most requests in flight at the server: {state.max_in_flight}")
+
+    print("outage (every request 503):")
+    state.down = True
+    for label, get in (("naive requests", naive_get), ("http_client", client_get)):
+        before = snapshot(state)
+        report(label, state, *run(get, url, args.calls, args.threads), before)
+    host_stats = http_client.get_http_client_stats()[url.split("/")[2]]
+    print(f"  circuit open: {bool(host_stats['circuit_open'])}, calls short-circuited so far: {host_stats['short_circuited']}")
+
+    state.down = False
+    time.sleep(http_client.HTTP_BREAKER_RESET)
+    before = snapshot(state)
+    latencies, successes = run(client_get, url, 50, 1)
+    print(f"recovered after {http_client.HTTP_BREAKER_RESET:.0f}s: {successes}/50 ok, circuit open: "
+          f"{bool(http_client.get_http_client_stats()[url.split('/')[2]]['circuit_open'])}")
+    server.shutdown()
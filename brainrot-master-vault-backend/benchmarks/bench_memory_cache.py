@@ -0,0 +1,58 @@
+import os
+import sys
+import json
+import time
+import tempfile
+
+# Add the parent directory to sys.path so we can import db_commands
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+from youtube_tools import db_commands
+from youtube_tools.memory_cache import memory_cache
+
+NUM_VIDEOS = 500
+NUM_LOOKUPS = 50000
+
+def seed(num_videos: int):
+    """Caches num_videos YouTube-shaped responses (a few KB of JSON each)."""
+    for i in range(num_videos):
+        video_id = f"vid{i:08d}"
+        response = {
+            "kind": "youtube#videoListResponse",
+            "items": [{
+                "id": video_id,
+                "snippet": {
+                    "title": f"Video {i}",
+                    "description": "lorem ipsum dolor sit amet " * 40,
+                    "tags": [f"tag{t}" for t in range(20)],
+                    "thumbnails": {size: {"url": f"https://i.ytimg.com/vi/{video_id}/{size}.jpg"} for size in ("default", "medium", "high", "standard")},
+                },
+            }],
+        }
+        db_commands.cache_response(video_id, response, source='youtube')
+
+def sqlite_tier(video_id: str):
+    """A lookup that always goes to SQLite and re-parses the JSON (the previous behaviour)."""
+    return json.loads(db_commands.get_cached_response(video_id))
+
+def run(lookup) -> float:
+    """Returns the mean lookup latency in microseconds."""
+    start = time.perf_counter()
+    for i in range(NUM_LOOKUPS):
+        lookup(f"vid{i % NUM_VIDEOS:08d}")
+    return (time.perf_counter() - start) / NUM_LOOKUPS * 1e6
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_commands.DB_PATH = os.path.join(tmp_dir, "bench_memory.db")
+        db_commands.init_db()
+        seed(NUM_VIDEOS)
+
+        sqlite_latency = run(sqlite_tier)
+        memory_cache.clear()
+        memory_latency = run(db_commands.get_cached_response_data)
+        print(f"SQLite tier: {sqlite_latency:.1f} us/lookup")
+        print(f"Memory tier: {memory_latency:.1f} us/lookup ({sqlite_latency / memory_latency:.1f}x)")
+        print(f"Memory tier stats: {memory_cache.stats()}")
+        db_commands.close_connections()
@@ -0,0 +1,90 @@
+import io
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import contextlib
+
+# Add the parent directory to sys.path so we can import db_commands
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+from youtube_tools import db_commands, ytshorts_pull
+from youtube_tools.memory_cache import memory_cache
+from tools import metadata_refresh
+from stub_youtube_server import start_stub_server
+
+def age_cache(seconds: int):
+    """Makes every cached response look `seconds` old."""
+    conn = db_commands.get_connection()
+    with conn:
+        conn.execute("UPDATE cache SET timestamp = datetime('now', ?)", (f"-{seconds} seconds",))
+    memory_cache.clear()
+
+def read_all(video_ids) -> float:
+    """Reads every video's details like /youtube does; returns the mean latency in microseconds."""
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for video_id in video_ids:
+            assert ytshorts_pull.get_youtube_video_details(video_id)
+    return (time.perf_counter() - start) / len(video_ids) * 1e6
+
+async def stale_read_cycle(video_ids):
+    """Reads every (stale) video with the refresh worker running and waits until it has caught up."""
+    metadata_refresh.start_metadata_refresh()
+    latency = await asyncio.to_thread(read_all, video_ids)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        while metadata_refresh._pending or metadata_refresh._in_progress:
+            await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    await metadata_refresh.stop_metadata_refresh()
+    return latency, elapsed
+
+def report(label: str, state, before: dict, latency: float, elapsed: float):
+    stats = metadata_refresh.get_metadata_refresh_stats()
+    delta = {key: stats[key] - before.get(key, 0) for key in stats}
+    print(f"{label}: stale reads {latency:.0f} us each, refreshed in the background within {elapsed:.2f}s")
+    print(f"  {delta['api_calls']} API calls, {delta['quota_units_refresh']} quota units; "
+          f"{delta['refreshed']} changed, {delta['unchanged']} unchanged, {delta['not_modified']} not modified (304), {delta['missing']} missing")
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stale-while-revalidate refresh of cached YouTube metadata against a stub API.")
+    parser.add_argument("--videos", type=int, default=2000)
+    parser.add_argument("--changed", type=float, default=0.02, help="Fraction of videos whose metadata changes.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per stub API request.")
+    args = parser.parse_args()
+
+    server, state, videos_url = start_stub_server(latency=args.latency)
+    ytshorts_pull.YOUTUBE_API_URL = videos_url
+    metadata_refresh.METADATA_REFRESH_WINDOW = 0.05
+    rng = random.Random(42)
+    video_ids = [f"yt{i:09d}" for i in range(args.videos)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_commands.DB_PATH = os.path.join(tmp_dir, "bench_refresh.db")
+        with contextlib.redirect_stdout(io.StringIO()):
+            db_commands.init_db()
+            ytshorts_pull.get_youtube_videos_details(video_ids)
+        print(f"{args.videos} videos cached with {state.requests} API calls; {args.latency * 1000:.0f} ms per API call")
+        print(f"fresh reads: {read_all(video_ids):.0f} us each")
+        print(f"a synchronous re-fetch on every stale read would take {args.videos} calls, "
+              f"{args.videos} quota units and ~{args.latency * 1000:.0f} ms per read")
+
+        # Cycle 1: some videos changed, a few were deleted
+        age_cache(2 * 86400)
+        for video_id in rng.sample(video_ids, int(args.videos * args.changed)):
+            state.versions[video_id] = 1
+        state.deleted.update(rng.sample(video_ids, max(1, args.videos // 200)))
+        stats = report("cycle 1 (first refresh)", state, {}, *asyncio.run(stale_read_cycle(video_ids)))
+
+        # Cycle 2: nothing changed since, so the same batches come back 304 Not Modified
+        age_cache(2 * 86400)
+        report("cycle 2 (nothing changed)", state, stats, *asyncio.run(stale_read_cycle(video_ids)))
+        print(f"fresh reads after refresh: {read_all(video_ids):.0f} us each")
+        db_commands.close_connections()
+    server.shutdown()
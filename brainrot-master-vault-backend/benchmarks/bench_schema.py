@@ -0,0 +1,108 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+# Add the parent directory to sys.path so we can import db_commands
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+from youtube_tools import db_commands
+
+WORDS = ["the", "video", "shows", "how", "to", "cook", "pasta", "quickly", "and", "cheap", "money", "tips", "cat", "jumps"]
+RUNS = 3
+
+def youtube_response(rng: random.Random, i: int) -> dict:
+    """A videoListResponse shaped like what get_youtube_video_details caches (~2-3 KB of JSON)."""
+    return {
+        "kind": "youtube#videoListResponse",
+        "items": [{
+            "id": f"vid{i:07d}",
+            "snippet": {
+                "title": f"Video {i}",
+                "channelTitle": f"channel{rng.randrange(2000)}",
+                "publishedAt": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T12:00:00Z",
+                "description": " ".join(rng.choice(WORDS) for _ in range(150)),
+                "tags": [rng.choice(WORDS) for _ in range(15)],
+                "thumbnails": {size: {"url": f"https://i.ytimg.com/vi/vid{i:07d}/{size}.jpg"} for size in ("default", "medium", "high")},
+            },
+            "contentDetails": {"duration": f"PT{rng.randint(10, 59)}S"},
+        }],
+    }
+
+def seed(num_videos: int, transcript_words: int):
+    """Fills the legacy single-table layout and the normalised layout with the same videos."""
+    conn = db_commands.get_connection()
+    rng = random.Random(42)
+    conn.execute('''
+        CREATE TABLE legacy_cache (
+            video_id TEXT PRIMARY KEY, response_data TEXT NOT NULL, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            transcript TEXT, source TEXT, summary TEXT
+        )
+    ''')
+    with conn:
+        for i in range(num_videos):
+            response = youtube_response(rng, i)
+            transcript = " ".join(rng.choice(WORDS) for _ in range(transcript_words))
+            summary = " ".join(rng.choice(WORDS) for _ in range(60))
+            response_json = json.dumps(response)
+            conn.execute(
+                "INSERT INTO legacy_cache (video_id, response_data, transcript, source, summary) VALUES (?, ?, ?, 'youtube', ?)",
+                (f"vid{i:07d}", response_json, transcript, summary),
+            )
+            conn.execute(
+                '''INSERT INTO cache (video_id, source, title, channel, published_at, duration)
+                   VALUES (:video_id, 'youtube', :title, :channel, :published_at, :duration)''',
+                {"video_id": f"vid{i:07d}", **db_commands.video_fields(response)},
+            )
+            for table, text in (("responses", response_json), ("transcripts", transcript), ("summaries", summary)):
+                body, encoding = db_commands.encode_text(text)
+                conn.execute(f"INSERT INTO {table} (video_id, body, encoding) VALUES (?, ?, ?)", (f"vid{i:07d}", body, encoding))
+
+def best_of(sql: str, params=()) -> float:
+    conn = db_commands.get_connection()
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+def table_mb(*tables) -> float:
+    placeholders = ", ".join("?" for _ in tables)
+    size = db_commands.get_connection().execute(
+        f"SELECT COALESCE(SUM(pgsize), 0) FROM dbstat WHERE name IN ({placeholders})", tables
+    ).fetchone()[0]
+    return size / 1024 ** 2
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the legacy single-table cache layout with the normalised schema.")
+    parser.add_argument("--videos", type=int, default=50_000)
+    parser.add_argument("--words", type=int, default=400, help="Words per transcript.")
+    args = parser.parse_args()
+
+    for compression in ("none", "zlib", "zstd"):
+        db_commands.TEXT_COMPRESSION = compression
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_commands.DB_PATH = os.path.join(tmp_dir, "bench_schema.db")
+            db_commands.init_db()
+            seed(args.videos, args.words)
+            print(f"\nTEXT_COMPRESSION={compression}: {args.videos} videos, {args.words}-word transcripts")
+            if compression == "none":
+                print(f"{'legacy cache table':<34} {table_mb('legacy_cache'):8.1f} MB")
+            print(f"{'cache (metadata) table':<34} {table_mb('cache'):8.1f} MB")
+            print(f"{'responses table':<34} {table_mb('responses'):8.1f} MB")
+            print(f"{'transcripts + summaries tables':<34} {table_mb('transcripts', 'summaries'):8.1f} MB")
+
+            legacy_title = db_commands._V1_TITLE_SQL.format(column="response_data")
+            print(f"{'titles, channel, date for all videos':<40} legacy {best_of(f'''SELECT video_id, {legacy_title}, json_extract(response_data, '$.items[0].snippet.channelTitle'), json_extract(response_data, '$.items[0].snippet.publishedAt') FROM legacy_cache'''):7.1f} ms"
+                  f"   typed columns {best_of('SELECT video_id, title, channel, published_at FROM cache'):7.1f} ms")
+            print(f"{'newest 100 videos of one channel':<40} legacy {best_of(f'''SELECT video_id FROM legacy_cache WHERE json_extract(response_data, '$.items[0].snippet.channelTitle') = ? ORDER BY json_extract(response_data, '$.items[0].snippet.publishedAt') DESC LIMIT 100''', ('channel7',)):7.1f} ms"
+                  f"   typed columns {best_of('SELECT video_id FROM cache WHERE channel = ? ORDER BY published_at DESC LIMIT 100', ('channel7',)):7.1f} ms")
+            transcript_sql = db_commands.VIDEO_FIELD_COLUMNS["transcript"]
+            print(f"{'all transcripts':<40} legacy {best_of('SELECT transcript FROM legacy_cache'):7.1f} ms"
+                  f"   side table    {best_of(f'SELECT {transcript_sql} FROM cache c'):7.1f} ms")
+            db_commands.close_connections()
@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+# Add the parent directory to sys.path so we can import db_commands
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+from youtube_tools import db_commands
+
+CLASSIFICATIONS = ["tech", "health", "crime", "education", "investing", "disaster"]
+# Zipf-ish vocabulary: a few very common words and a long tail of rare ones
+VOCABULARY = [f"word{i}" for i in range(20_000)]
+QUERIES = ["word1", "word10 word20", "word500", "word15000", "word9*", "word3 word4 word5"]
+RUNS = 5
+
+def make_transcript(rng: random.Random, words: int) -> str:
+    return " ".join(VOCABULARY[min(int(rng.paretovariate(1.1)) - 1, len(VOCABULARY) - 1)] for _ in range(words))
+
+def seed(num_videos: int, words: int):
+    """Bulk-inserts num_videos cached videos with random transcripts; the FTS trigger on cache indexes them."""
+    conn = db_commands.get_connection()
+    rng = random.Random(42)
+    with conn:
+        titles = [f"Video {i} {make_transcript(rng, 5)}" for i in range(num_videos)]
+        conn.executemany(
+            "INSERT INTO transcripts (video_id, body) VALUES (?, ?)",
+            ((f"vid{i:07d}", make_transcript(rng, words)) for i in range(num_videos)),
+        )
+        conn.executemany(
+            "INSERT INTO summaries (video_id, body) VALUES (?, ?)",
+            ((f"vid{i:07d}", make_transcript(rng, 40)) for i in range(num_videos)),
+        )
+        # Inserted after the texts, so the insert trigger indexes each video once
+        conn.executemany(
+            "INSERT INTO cache (video_id, source, title) VALUES (?, ?, ?)",
+            ((f"vid{i:07d}", "tiktok" if i % 2 else "youtube", titles[i]) for i in range(num_videos)),
+        )
+        conn.executemany(
+            "INSERT INTO classification (video_id, classification) VALUES (?, ?)",
+            ((f"vid{i:07d}", rng.choice(CLASSIFICATIONS)) for i in range(num_videos)),
+        )
+
+def like_scan(query: str, limit: int = 20):
+    """What finding content took before the index: a LIKE scan of every transcript and summary."""
+    conditions = " AND ".join("(t.body LIKE ? OR s.body LIKE ?)" for _ in query.split())
+    params = [f"%{word.rstrip('*')}%" for word in query.split() for _ in range(2)]
+    return db_commands.get_connection().execute(
+        f"""SELECT c.video_id FROM cache c
+            LEFT JOIN transcripts t ON t.video_id = c.video_id LEFT JOIN summaries s ON s.video_id = c.video_id
+            WHERE {conditions} LIMIT ?""", params + [limit]
+    ).fetchall()
+
+def best_of(func, *args, **kwargs) -> float:
+    """Returns the best-of-RUNS latency in ms."""
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark /search's FTS5 index against LIKE scans.")
+    parser.add_argument("--videos", type=int, default=100_000)
+    parser.add_argument("--words", type=int, default=150, help="Words per transcript.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_commands.DB_PATH = os.path.join(tmp_dir, "bench_search.db")
+        db_commands.init_db()
+        start = time.perf_counter()
+        seed(args.videos, args.words)
+        print(f"Seeded and indexed {args.videos} transcripts in {time.perf_counter() - start:.1f}s "
+              f"(database {os.path.getsize(db_commands.DB_PATH) / 1024 ** 2:.0f} MB)")
+
+        # LIKE stops at the first 20 unranked hits, so it is only fast for words that appear
+        # almost everywhere; FTS ranks every match, which is what costs time for those
+        print(f"{'query':<20} {'fts ms':>8} {'fts+filter ms':>14} {'page 5 ms':>10} {'LIKE scan ms':>13}")
+        for query in QUERIES:
+            fts = best_of(db_commands.search_videos, query)
+            filtered = best_of(db_commands.search_videos, query, source="tiktok", classification="tech")
+            page_five = best_of(db_commands.search_videos, query, offset=80)
+            scan = best_of(like_scan, query) if "*" not in query else float("nan")
+            print(f"{query:<20} {fts:>8.1f} {filtered:>14.1f} {page_five:>10.1f} {scan:>13.1f}")
+
+        # Keeping the index in sync: cost of a transcript write with the triggers
+        start = time.perf_counter()
+        for i in range(1000):
+            db_commands.cache_transcript(f"vid{i:07d}", "updated transcript " * 50)
+        print(f"cache_transcript with index sync: {(time.perf_counter() - start):.3f} ms/write")
+        db_commands.close_connections()
@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+# Add the parent directory to sys.path so we can import the tools
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+from stub_gemini_server import start_stub_server
+
+def make_transcripts(count: int, words: int):
+    """Transcript-sized texts; every tenth one repeats an earlier one, like a reused sound."""
+    return [
+        f"Transcript {i % (count - count // 10) if i % 10 == 9 else i}: " + "lorem ipsum dolor sit amet " * (words // 5)
+        for i in range(count)
+    ]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare one-request-per-video summarization with the batched engine, against a stub server.")
+    parser.add_argument("--videos", type=int, default=100)
+    parser.add_argument("--words", type=int, default=400, help="Words per transcript.")
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub server seconds per request.")
+    parser.add_argument("--fail-rate", type=float, default=0.05, help="Fraction of requests the stub answers with 429.")
+    args = parser.parse_args()
+
+    server, state, base_url = start_stub_server(latency=args.latency, fail_rate=args.fail_rate)
+    # Must be set before tools.summarize creates its client; quota high enough not to dominate
+    os.environ["GEMINI_BASE_URL"] = base_url
+    os.environ.setdefault("GEMINI_API_KEY", "stub")
+    os.environ.setdefault("GEMINI_RPM", "6000")
+    os.environ.setdefault("SUMMARY_RETRY_BASE_DELAY", "0.05")
+    from youtube_tools import db_commands
+    from tools import summarize
+
+    transcripts = make_transcripts(args.videos, args.words)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_commands.DB_PATH = os.path.join(tmp_dir, "bench_summarize.db")
+        db_commands.init_db()
+
+        def measure(label, run):
+            requests_before, rejected_before = state.requests, state.rejected
+            start = time.perf_counter()
+            summaries = run()
+            elapsed = time.perf_counter() - start
+            print(f"{label:<28} {elapsed:>7.2f}s {state.requests - requests_before:>9} {state.rejected - rejected_before:>9} "
+                  f"{sum(1 for s in summaries if s):>10}/{len(summaries)}")
+
+        print(f"{'mode':<28} {'wall':>8} {'requests':>9} {'429s':>9} {'summaries':>14}")
+        # One request per video, no cache: the previous behaviour
+        summarize.SUMMARY_BATCH_MAX_ITEMS = 1
+        measure("one request per video", lambda: [summarize._generate(summarize.SUMMARY_PROMPT + t) for t in transcripts])
+        summarize.SUMMARY_BATCH_MAX_ITEMS = 20
+        measure("batched engine (cold cache)", lambda: summarize.summarize_texts(transcripts))
+        measure("batched engine (warm cache)", lambda: summarize.summarize_texts(transcripts))
+        db_commands.close_connections()
+    server.shutdown()
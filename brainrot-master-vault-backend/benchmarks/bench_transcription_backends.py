@@ -0,0 +1,83 @@
+import os
+import sys
+import time
+import argparse
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the parent directory to sys.path so we can import the tools
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+from tools.audio import get_ffmpeg_path, detect_silences
+from tools.transcription import TRANSCRIPTION_BACKENDS, get_backend
+
+def make_sample_audio(path: str, seconds: int):
+    """Generates a 16 kHz mono Opus file of a tone interrupted by pauses."""
+    subprocess.run([
+        get_ffmpeg_path(), "-hide_banner", "-loglevel", "error", "-y",
+        "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=16000:duration={seconds}",
+        "-af", "volume='if(lt(mod(t,5),4),1,0)':eval=frame",
+        "-ac", "1", "-c:a", "libopus", "-b:a", "24k", path,
+    ], check=True)
+
+def warm_up(name: str, audio_path: str):
+    """
+    Loads the backend and runs one untimed call, so a cold model or endpoint doesn't
+    skew the measurement. Returns the seconds taken, or None if the backend is unavailable.
+    """
+    start = time.perf_counter()
+    try:
+        backend = get_backend(name)
+        backend.load()
+        backend.transcribe_file(audio_path)
+    except Exception as e:
+        print(f"{name:<8} skipped: {e}")
+        return None
+    return time.perf_counter() - start
+
+def bench_backend(name: str, audio_path: str, duration: float, runs: int, concurrency: int, warm_up_seconds: float):
+    """Transcribes the file `runs` times with `concurrency` calls in flight and prints timings."""
+    backend = get_backend(name)
+
+    def one(_):
+        call_start = time.perf_counter()
+        backend.transcribe_file(audio_path)
+        return time.perf_counter() - call_start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(one, range(runs)))
+    elapsed = time.perf_counter() - start
+
+    mean_latency = sum(latencies) / len(latencies)
+    print(f"{name:<8} {concurrency:>5} {warm_up_seconds:>9.2f} {mean_latency:>9.2f} "
+          f"{mean_latency / duration:>8.3f} {runs * duration / elapsed:>12.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the real-time factor of each transcription backend.")
+    parser.add_argument("--input", help="Audio file to transcribe. Defaults to a generated sample.")
+    parser.add_argument("--seconds", type=int, default=60, help="Length of the generated sample audio.")
+    parser.add_argument("--backends", default=",".join(TRANSCRIPTION_BACKENDS), help="Comma-separated backends to compare.")
+    parser.add_argument("--runs", type=int, default=4, help="Measured transcriptions per backend.")
+    parser.add_argument("--concurrency", default="1,4", help="Comma-separated numbers of concurrent calls to try.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        audio_path = args.input
+        if not audio_path:
+            audio_path = os.path.join(tmp_dir, "sample.ogg")
+            make_sample_audio(audio_path, args.seconds)
+        duration, _ = detect_silences(audio_path)
+        print(f"Audio: {audio_path} ({duration:.1f}s)")
+
+        # RTF = processing seconds per second of audio (lower is better; < 1 is faster
+        # than real time). Throughput = seconds of audio transcribed per wall second.
+        print(f"{'backend':<8} {'conc':>5} {'warm-up s':>9} {'latency s':>9} {'RTF':>8} {'throughput':>12}")
+        for name in args.backends.split(","):
+            warm_up_seconds = warm_up(name, audio_path)
+            if warm_up_seconds is None:
+                continue
+            for concurrency in (int(value) for value in args.concurrency.split(",")):
+                bench_backend(name, audio_path, duration, args.runs, concurrency, warm_up_seconds)
@@ -0,0 +1,150 @@
+import io
+import os
+import re
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import threading
+import contextlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Add the parent directory to sys.path so we can import video_urls
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+from youtube_tools import db_commands
+from tools import video_urls
+from tools.video_urls import parse_video_url, resolve_video_url
+
+ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_-"
+
+# The URL handling this module replaced: substring routing in main/jobs/batch, the
+# /youtube regex, get_youtube_video_id's string splitting and the /tiktok regex
+LEGACY_YOUTUBE_PATTERN = re.compile(r"^(https?://)?(www\.)?(youtube\.com/watch\?v=|youtube\.com/shorts/|youtu\.be/)([a-zA-Z0-9_-]{11})$")
+LEGACY_TIKTOK_PATTERN = re.compile(r"https://www\.tiktok\.com/@?(?P<username>[^/]+)/video/(?P<video_id>\d+)")
+
+def legacy_key(url: str):
+    if "tiktok.com" in url:
+        match = LEGACY_TIKTOK_PATTERN.match(url)
+        return f"tiktok:{match.group('video_id')}" if match else None
+    if "youtube.com" in url or "youtu.be" in url:
+        if not LEGACY_YOUTUBE_PATTERN.match(url):
+            return None
+        if "youtube.com/watch?v=" in url:
+            return "youtube:" + url.split("v=")[1].split("&")[0]
+        return "youtube:" + url.split("/")[-1]
+    return None
+
+def youtube_forms(video_id: str, rng: random.Random):
+    return [
+        f"https://www.youtube.com/watch?v={video_id}",
+        f"https://youtube.com/watch?v={video_id}&t={rng.randint(1, 300)}s",
+        f"https://m.youtube.com/watch?v={video_id}&feature=share",
+        f"https://www.youtube.com/shorts/{video_id}",
+        f"https://youtube.com/shorts/{video_id}?si={''.join(rng.choices(ALPHABET, k=16))}",
+        f"https://youtu.be/{video_id}",
+        f"https://youtu.be/{video_id}?si={''.join(rng.choices(ALPHABET, k=16))}",
+        f"youtube.com/watch?v={video_id}",
+    ]
+
+def tiktok_forms(username: str, video_id: str):
+    return [
+        f"https://www.tiktok.com/@{username}/video/{video_id}",
+        f"https://www.tiktok.com/@{username}/video/{video_id}?is_from_webapp=1&sender_device=pc",
+        f"https://m.tiktok.com/@{username}/video/{video_id}",
+        f"https://tiktok.com/@{username}/video/{video_id}",
+        f"www.tiktok.com/@{username}/video/{video_id}",
+    ]
+
+def make_corpus(videos: int, rng: random.Random):
+    """Returns [(url, true key)]: every video in every form its users share it in."""
+    corpus = []
+    for i in range(videos):
+        if i % 2:
+            video_id = "".join(rng.choices(ALPHABET, k=11))
+            corpus += [(url, f"youtube:{video_id}") for url in youtube_forms(video_id, rng)]
+        else:
+            video_id = str(rng.randrange(10**18, 10**19))
+            corpus += [(url, f"tiktok:{video_id}") for url in tiktok_forms(f"user{i}", video_id)]
+    rng.shuffle(corpus)
+    return corpus
+
+def start_redirect_server(targets: dict, latency: float):
+    """Stub short-link host: GET /<code> answers 301 to the video URL in targets[code]."""
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            time.sleep(latency)
+            target = targets.get(self.path.strip("/"))
+            self.send_response(301 if target else 404)
+            if target:
+                self.send_header("Location", target)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def resolve_all(links, expect_found: bool = True) -> float:
+    """Resolves every link the way the handlers do; returns the mean milliseconds per link."""
+    async def run():
+        return [await resolve_video_url(link) for link in links]
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = asyncio.run(run())
+    assert all(results) if expect_found else not any(results)
+    return (time.perf_counter() - start) / len(links) * 1000
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="URL normalisation: coverage and speed vs the old parsing, and short-link resolution.")
+    parser.add_argument("--videos", type=int, default=10000)
+    parser.add_argument("--short-links", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per redirect from the stub short-link host.")
+    args = parser.parse_args()
+    rng = random.Random(7)
+
+    corpus = make_corpus(args.videos, rng)
+    truth = {key for _, key in corpus}
+    print(f"{len(corpus)} URLs for {len(truth)} videos, in the forms apps share them")
+    for label, normalise in (("old parsing", legacy_key), ("video_urls", lambda url: (video := parse_video_url(url)) and video.key)):
+        keys = [normalise(url) for url, _ in corpus]
+        start = time.perf_counter()
+        for url, _ in corpus:
+            normalise(url)
+        elapsed = time.perf_counter() - start
+        correct = sum(key == expected for key, (_, expected) in zip(keys, corpus))
+        wrong = sum(key is not None and key != expected for key, (_, expected) in zip(keys, corpus))
+        rejected = keys.count(None)
+        print(f"  {label:<12} {elapsed / len(corpus) * 1e6:5.2f} us/URL  {correct} right, {wrong} wrong ids, {rejected} rejected  "
+              f"-> {len({key for key in keys if key})} cache keys for {len(truth)} videos")
+
+    # Short links against a stub host standing in for vm.tiktok.com
+    codes = {"".join(rng.choices(ALPHABET[:62], k=9)): f"https://www.tiktok.com/@user{i}/video/{rng.randrange(10**18, 10**19)}?_r=1"
+             for i in range(args.short_links)}
+    server, base_url = start_redirect_server(codes, args.latency)
+    real_http_get = video_urls.http_get
+    video_urls.http_get = lambda url, **kwargs: real_http_get(url.replace("https://vm.tiktok.com", base_url), **kwargs)
+    links = [f"https://vm.tiktok.com/{code}/" for code in codes]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_commands.DB_PATH = os.path.join(tmp_dir, "bench_urls.db")
+        with contextlib.redirect_stdout(io.StringIO()):
+            db_commands.init_db()
+        print(f"{len(links)} short links, {args.latency * 1000:.0f} ms per redirect:")
+        print(f"  first resolution (redirect)   {resolve_all(links):7.3f} ms/link")
+        print(f"  again (memory)                {resolve_all(links):7.3f} ms/link")
+        video_urls._resolved.clear() # As after a restart
+        print(f"  after a restart (SQLite)      {resolve_all(links):7.3f} ms/link")
+        dead_links = [f"https://vm.tiktok.com/dead{i}/" for i in range(100)]
+        print(f"  dead link, first lookup       {resolve_all(dead_links, expect_found=False):7.3f} ms/link")
+        print(f"  dead link, again              {resolve_all(dead_links, expect_found=False):7.3f} ms/link")
+        print(f"  lookups by outcome: {video_urls.get_short_link_stats()}")
+        print(f"  the old /tiktok rejected {sum(legacy_key(link) is None for link in links)} of them with 400")
+        db_commands.close_connections()
+    server.shutdown()
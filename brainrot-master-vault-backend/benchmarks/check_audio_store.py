@@ -0,0 +1,119 @@
+import io
+import os
+import sys
+import tempfile
+import threading
+import contextlib
+import subprocess
+
+# Add the parent directory to sys.path so we can import the audio store
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+from youtube_tools import db_commands
+from tools import audio_store
+from tools.audio import AUDIO_FORMATS, get_ffmpeg_path, extract_audio, extract_audio_bytes, fingerprint_audio
+
+def make_video(path: str, seconds: int = 5):
+    """Writes a short mp4 with a tone and a black video track, like a downloaded TikTok."""
+    subprocess.run([
+        get_ffmpeg_path(), "-hide_banner", "-loglevel", "error", "-nostdin", "-y",
+        "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+        "-f", "lavfi", "-i", f"color=c=black:s=64x64:d={seconds}",
+        "-shortest", "-c:a", "aac", "-c:v", "libx264", path,
+    ], check=True)
+
+def check_dedup(video_path: str, fmt: str) -> tuple[list[str], str]:
+    """Extracts the same video twice under two keys; both must share one blob. Also returns the blob's path."""
+    failures = []
+    paths = []
+    for key in (f"tiktok:{fmt}-first", f"tiktok:{fmt}-second"):
+        staging_path = audio_store.get_staging_path(AUDIO_FORMATS[fmt]["extension"])
+        extract_audio(video_path, staging_path, fmt)
+        paths.append(audio_store.store_audio(key, staging_path))
+    if paths[0] != paths[1]:
+        failures.append(f"{fmt}: the same audio was stored twice ({paths[0]} and {paths[1]})")
+    return failures, paths[0]
+
+def check_fingerprint(video_path: str, stored_path: str, fmt: str) -> list[str]:
+    """
+    Audio extracted into the store and audio piped straight into an upload
+    (STREAM_AUDIO_UPLOAD) must fingerprint the same, or transcripts aren't reused
+    across the two modes.
+    """
+    stored_fingerprint, _ = fingerprint_audio(stored_path)
+    streamed_fingerprint, _ = fingerprint_audio(audio_bytes=extract_audio_bytes(video_path, fmt))
+    if stored_fingerprint != streamed_fingerprint:
+        return [f"{fmt}: stored and streamed audio fingerprint differently ({stored_fingerprint[:12]} vs {streamed_fingerprint[:12]})"]
+    return []
+
+def check_eviction_with_undeletable_files(tmp_dir: str) -> list[str]:
+    """
+    Blobs whose files can't be deleted (EACCES here) must be skipped rather than retried
+    forever under the eviction lock, and must not stop the evictable ones from going.
+    """
+    failures = []
+    undeletable_paths = set()
+    for i in range(6):
+        source_path = os.path.join(tmp_dir, f"blob{i}.bin")
+        with open(source_path, "wb") as f:
+            f.write(bytes([i]) * 1000)
+        stored_path = audio_store.store_audio(f"youtube:evict{i}", source_path)
+        if i < 3:
+            undeletable_paths.add(stored_path)
+
+    real_remove = os.remove
+    def remove(path):
+        if path in undeletable_paths:
+            raise PermissionError(13, "Permission denied", path)
+        real_remove(path)
+
+    # Small passes, so the undeletable blobs fill the first ones
+    audio_store.EVICTION_BATCH_SIZE = 2
+    os.remove = remove
+    try:
+        worker = threading.Thread(target=audio_store.enforce_budget, kwargs={"max_bytes": 0}, daemon=True)
+        worker.start()
+        worker.join(timeout=10)
+    finally:
+        os.remove = real_remove
+    if worker.is_alive():
+        return ["enforce_budget is still looping over undeletable blobs after 10s"]
+    stats = audio_store.get_audio_store_stats()
+    if (stats["blobs"], stats["bytes"]) != (3, 3000):
+        failures.append(f"expected only the 3 undeletable blobs (3000 bytes) left, found {stats['blobs']} ({stats['bytes']} bytes)")
+    if not all(os.path.exists(path) for path in undeletable_paths):
+        failures.append("an undeletable blob's file is gone")
+    return failures
+
+if __name__ == "__main__":
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_commands.DB_PATH = os.path.join(tmp_dir, "check_audio_store.db")
+        audio_store.AUDIO_STORE_DIR = os.path.join(tmp_dir, "audio_store")
+        video_path = os.path.join(tmp_dir, "video.mp4")
+        with contextlib.redirect_stdout(io.StringIO()):
+            db_commands.init_db()
+            make_video(video_path)
+            fingerprint_failures = []
+            for fmt in AUDIO_FORMATS:
+                dedup_failures, stored_path = check_dedup(video_path, fmt)
+                failures += dedup_failures
+                fingerprint_failures += check_fingerprint(video_path, stored_path, fmt)
+        stats = audio_store.get_audio_store_stats()
+        print(f"dedup: {stats['refs']} refs in {stats['blobs']} blobs (expected {2 * len(AUDIO_FORMATS)} in {len(AUDIO_FORMATS)})")
+        if stats["blobs"] != len(AUDIO_FORMATS):
+            failures.append(f"expected {len(AUDIO_FORMATS)} blobs, found {stats['blobs']}")
+        print(f"stored vs streamed fingerprints: {'ok' if not fingerprint_failures else 'failed'}")
+        failures += fingerprint_failures
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            eviction_failures = check_eviction_with_undeletable_files(tmp_dir)
+        print(f"eviction with undeletable files: {'ok' if not eviction_failures else 'failed'}")
+        failures += eviction_failures
+        db_commands.close_connections()
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print("ok" if not failures else f"{len(failures)} failure(s)")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,118 @@
+import os
+import re
+import sys
+import random
+import argparse
+
+# Add the parent directory to sys.path so we can import video_urls
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+from tools.video_urls import parse_video_url, detect_source
+
+CORPUS_PATH = os.path.join(current_dir, "url_corpus.tsv")
+ID_PATTERNS = {"youtube": re.compile(r"[A-Za-z0-9_-]{11}"), "tiktok": re.compile(r"\d{8,20}")}
+HOST = re.compile(r"^(\s*(?:https?://)?)([^/?#]+)", re.IGNORECASE)
+# Characters mutations insert: URL syntax plus a few that break naive parsers
+MUTATION_CHARS = "/?&=#@:.%-_ \t\nvV0aZé​\\"
+
+def load_corpus():
+    """Returns [(url, expected)] from url_corpus.tsv; expected is 'source:id', 'short' or '-'."""
+    entries = []
+    with open(CORPUS_PATH, encoding="utf-8") as corpus:
+        for line in corpus:
+            line = line.rstrip("\n")
+            if not line.strip() or line.startswith("#"):
+                continue
+            url, expected = line.rsplit("\t", 1)
+            entries.append((url, expected))
+    return entries
+
+def classify(url: str) -> str:
+    video = parse_video_url(url)
+    if video is not None:
+        return video.key
+    return "short" if detect_source(url) else "-"
+
+def mutate(url: str, rng: random.Random) -> str:
+    """Applies one to three random edits: insert, delete, swap case, duplicate or percent-encode."""
+    for _ in range(rng.randint(1, 3)):
+        if not url:
+            url = rng.choice(MUTATION_CHARS)
+            continue
+        position = rng.randrange(len(url) + 1)
+        edit = rng.randrange(5)
+        if edit == 0:
+            url = url[:position] + rng.choice(MUTATION_CHARS) + url[position:]
+        elif edit == 1:
+            url = url[:position] + url[position + 1:]
+        elif edit == 2:
+            url = url.swapcase() if rng.random() < 0.1 else url[:position] + url[position:position + 1].swapcase() + url[position + 1:]
+        elif edit == 3:
+            url = url[:position] + url[position:position + rng.randint(1, 8)] * 2 + url[position + rng.randint(1, 8):]
+        else:
+            url = url[:position] + "".join(f"%{ord(char):02X}" for char in url[position:position + 2] if ord(char) < 256) + url[position + 2:]
+    return url
+
+def check_invariants(url: str):
+    """Returns a description of the first broken invariant for url, or None."""
+    try:
+        video = parse_video_url(url)
+        source = detect_source(url)
+    except Exception as e:
+        return f"raised {type(e).__name__}: {e}"
+    if video is None:
+        return None
+    if source != video.source:
+        return f"detect_source says {source}, parse_video_url says {video.source}"
+    if not ID_PATTERNS[video.source].fullmatch(video.video_id):
+        return f"malformed id {video.video_id!r}"
+    if video.source == "tiktok" and (not video.username or "/" in video.username):
+        return f"malformed username {video.username!r}"
+    if parse_video_url(video.url) != video:
+        return f"canonical URL {video.url} doesn't parse back to {video}"
+    return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Checks the URL corpus, then fuzzes tools/video_urls.py with mutated corpus URLs.")
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    mismatches = [(url, expected, classify(url)) for url, expected in corpus if classify(url) != expected]
+    for url, expected, got in mismatches:
+        print(f"corpus mismatch: {url!r}: expected {expected}, got {got}")
+    print(f"corpus: {len(corpus) - len(mismatches)}/{len(corpus)} URLs classified as expected")
+
+    # Same video, cosmetic differences: all must normalise to the same key
+    equivalent_failures = 0
+    for url, expected in corpus:
+        if expected in ("short", "-"):
+            continue
+        variants = [
+            url.replace("https://", "http://", 1),
+            HOST.sub(lambda match: match.group(1) + match.group(2).upper(), url),
+            url.strip().split("#")[0] + ("&" if "?" in url else "?") + "utm_source=share",
+            " " + url + "\n",
+        ]
+        for variant in variants:
+            if classify(variant) != expected:
+                equivalent_failures += 1
+                print(f"variant mismatch: {variant!r}: expected {expected}, got {classify(variant)}")
+
+    rng = random.Random(args.seed)
+    seeds = [url for url, _ in corpus] + [""]
+    outcomes = {"accepted": 0, "rejected": 0}
+    failures = []
+    for _ in range(args.iterations):
+        url = mutate(rng.choice(seeds), rng)
+        problem = check_invariants(url)
+        if problem:
+            failures.append((url, problem))
+        outcomes["accepted" if parse_video_url(url) else "rejected"] += 1
+    for url, problem in failures[:20]:
+        print(f"fuzz failure: {url!r}: {problem}")
+    print(f"fuzz: {args.iterations} mutated URLs, {outcomes['accepted']} accepted, {outcomes['rejected']} rejected, "
+          f"{len(failures)} invariant failures")
+    sys.exit(1 if mismatches or equivalent_failures or failures else 0)
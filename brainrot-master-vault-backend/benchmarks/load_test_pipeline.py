@@ -0,0 +1,107 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+
+import httpx
+
+# Add the parent directory to sys.path so we can import the app
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+# Simulated latency of each blocking stage, in seconds
+FAKE_METADATA_SECONDS = 0.2
+FAKE_DOWNLOAD_SECONDS = 0.5
+FAKE_TRANSCRIBE_SECONDS = 0.5
+FAKE_SUMMARY_SECONDS = 0.3
+FAKE_EMBEDDING_SECONDS = 0.05
+
+def install_fake_stages():
+    """
+    Replaces the network-bound stages of the YouTube pipeline with blocking sleeps,
+    so the load test measures how well the server overlaps blocking work rather
+    than the speed of YouTube, Whisper or Gemini.
+    """
+    import youtube_handler
+    import tools.transcription
+    from youtube_tools.ytshorts_pull import AudioDownload
+    from tools.workers import run_in_stage
+
+    def fake_video_details(video_id):
+        time.sleep(FAKE_METADATA_SECONDS)
+        return {"items": [{"id": video_id, "snippet": {"title": f"Video {video_id}", "description": ""}}]}
+
+    def fake_download_audio(url, video_id):
+        time.sleep(FAKE_DOWNLOAD_SECONDS)
+        os.makedirs("youtube_audio", exist_ok=True)
+        audio_path = os.path.join("youtube_audio", f"{video_id}.mp3")
+        with open(audio_path, "wb") as f:
+            f.write(b"\0")
+        return AudioDownload(video_id, path=audio_path, size=1)
+
+    def fake_post_audio(transcribe_api_url, mp3_file):
+        time.sleep(FAKE_TRANSCRIBE_SECONDS)
+        return f"transcript of {mp3_file}"
+
+    async def fake_summarize(text):
+        await run_in_stage("summarization", time.sleep, FAKE_SUMMARY_SECONDS)
+        return "summary"
+
+    async def fake_embed_video(video_id, title, summary=None, transcript=None):
+        await run_in_stage("embedding", time.sleep, FAKE_EMBEDDING_SECONDS)
+
+    youtube_handler.get_youtube_video_details = fake_video_details
+    youtube_handler.download_audio = fake_download_audio
+    youtube_handler.summarize = fake_summarize
+    youtube_handler.embed_video = fake_embed_video
+    tools.transcription._post_audio = fake_post_audio
+
+async def fire(client: httpx.AsyncClient, num_requests: int, concurrency: int):
+    """Sends num_requests distinct /youtube requests with at most `concurrency` in flight."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        video_id = f"load{i:07d}"  # 11 characters, like a real YouTube id
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get("/youtube", params={"video_url": f"https://youtu.be/{video_id}"})
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(num_requests)))
+    return time.perf_counter() - start, sorted(latencies)
+
+async def main(args):
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=None)
+    else:
+        os.chdir(tempfile.mkdtemp())
+        from youtube_tools import db_commands
+        db_commands.DB_PATH = os.path.join(os.getcwd(), "load_test.db")
+        db_commands.init_db()
+        install_fake_stages()
+        from main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=None)
+
+    async with client:
+        elapsed, latencies = await fire(client, args.requests, args.concurrency)
+
+    serial = FAKE_METADATA_SECONDS + FAKE_DOWNLOAD_SECONDS + FAKE_TRANSCRIBE_SECONDS + FAKE_SUMMARY_SECONDS
+    print(f"{args.requests} requests, {args.concurrency} concurrent: {elapsed:.2f}s "
+          f"({args.requests / elapsed:.1f} req/s)")
+    print(f"latency p50 {latencies[len(latencies) // 2]:.2f}s, p95 {latencies[int(len(latencies) * 0.95) - 1]:.2f}s, "
+          f"max {latencies[-1]:.2f}s")
+    if not args.url:
+        print(f"a fully blocking event loop would need ~{serial * args.requests:.1f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent load test for the /youtube pipeline.")
+    parser.add_argument("--url", help="Base URL of a running server. Defaults to an in-process app with simulated stages.")
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=16)
+    asyncio.run(main(parser.parse_args()))
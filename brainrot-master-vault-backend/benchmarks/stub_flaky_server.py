@@ -0,0 +1,126 @@
+import sys
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# HTTP server that injects faults, for measuring tools/http_client.py (retries, deadlines,
+# circuit breakers) against misbehaving APIs. Every request gets a fixed latency and then,
+# at the configured rates, a 503, a hang of --slow-seconds, or a connection reset; with
+# --down every request is answered 503. Connections are kept alive (HTTP/1.1).
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops SYNs when many clients connect at once (1 s retransmits)
+    request_queue_size = 128
+
+class StubState:
+    def __init__(self, latency: float = 0.01, error_rate: float = 0.0, reset_rate: float = 0.0,
+                 slow_rate: float = 0.0, slow_seconds: float = 3.0, seed: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.reset_rate = reset_rate
+        self.slow_rate = slow_rate
+        self.slow_seconds = slow_seconds
+        self.down = False
+        self.requests = 0
+        self.connections = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.faults = {"error": 0, "reset": 0, "slow": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def pick_fault(self):
+        """Returns 'down', 'error', 'reset', 'slow' or None for the next request."""
+        with self._lock:
+            if self.down:
+                return "down"
+            roll = self._random.random()
+            for fault, rate in (("error", self.error_rate), ("reset", self.reset_rate), ("slow", self.slow_rate)):
+                if roll < rate:
+                    self.faults[fault] += 1
+                    return fault
+                roll -= rate
+            return None
+
+def make_handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body are separate writes; without this, delayed ACKs add ~40 ms per kept-alive request
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def setup(self):
+            super().setup()
+            with state._lock:
+                state.connections += 1
+
+        def _answer(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            if length:
+                self.rfile.read(length)
+            with state._lock:
+                state.requests += 1
+                state.in_flight += 1
+                state.max_in_flight = max(state.max_in_flight, state.in_flight)
+            try:
+                fault = state.pick_fault()
+                time.sleep(state.latency)
+                if fault == "slow":
+                    time.sleep(state.slow_seconds)
+                if fault == "reset":
+                    self.close_connection = True
+                    self.connection.close()
+                    return
+                status = 503 if fault in ("error", "down") else 200
+                body = b'{"ok": true}' if status == 200 else b'{"error": "unavailable"}'
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass # The client gave up (timed out) first
+            finally:
+                with state._lock:
+                    state.in_flight -= 1
+
+        do_GET = _answer
+        do_POST = _answer
+
+    return Handler
+
+def start_stub_server(port: int = 0, **faults):
+    """Starts the stub in a background thread. Returns (server, state, base_url)."""
+    state = StubState(**faults)
+    server = StubServer(("127.0.0.1", port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"http://127.0.0.1:{server.server_address[1]}/"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve an HTTP endpoint that injects faults.")
+    parser.add_argument("--port", type=int, default=8093)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.05, help="Fraction of requests answered 503.")
+    parser.add_argument("--reset-rate", type=float, default=0.02, help="Fraction of connections reset without an answer.")
+    parser.add_argument("--slow-rate", type=float, default=0.02, help="Fraction of requests that hang for --slow-seconds.")
+    parser.add_argument("--slow-seconds", type=float, default=3.0)
+    parser.add_argument("--down", action="store_true", help="Answer every request 503.")
+    args = parser.parse_args()
+
+    server, state, base_url = start_stub_server(
+        args.port, latency=args.latency, error_rate=args.error_rate, reset_rate=args.reset_rate,
+        slow_rate=args.slow_rate, slow_seconds=args.slow_seconds,
+    )
+    state.down = args.down
+    print(f"Flaky stub server on {base_url}")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"{state.requests} requests on {state.connections} connections, faults {state.faults}", file=sys.stderr)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,114 @@
+import re
+import hashlib
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Stand-in for the Gemini generateContent and batchEmbedContents REST endpoints, for exercising tools/summarize.py
+# without a key or quota. Run it and set GEMINI_BASE_URL=http://127.0.0.1:<port>/.
+
+TEXT_PATTERN = re.compile(r'<text id="(\d+)">')
+
+def stub_embedding(text: str, dimensions: int) -> list[float]:
+    """Hashed bag-of-words vector, so texts sharing words get similar embeddings."""
+    vector = [0.0] * dimensions
+    for word in re.findall(r"\w+", text.lower()):
+        vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % dimensions] += 1.0
+    return vector
+
+class StubState:
+    def __init__(self, latency: float, fail_rate: float, rpm: float):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.rpm = rpm
+        self.requests = 0
+        self.rejected = 0
+        self.input_chars = 0
+        self._window = []
+        self._lock = threading.Lock()
+
+    def admit(self) -> bool:
+        """Counts a request and returns False if it should get a 429 (quota or random failure)."""
+        with self._lock:
+            now = time.monotonic()
+            self._window = [t for t in self._window if now - t < 60]
+            over_quota = self.rpm and len(self._window) >= self.rpm
+            if over_quota or random.random() < self.fail_rate:
+                self.rejected += 1
+                return False
+            self._window.append(now)
+            self.requests += 1
+            return True
+
+def make_handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status: int, body: dict):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if self.path.split("?")[0].endswith(":batchEmbedContents"):
+                return self._reply(200, {"embeddings": [
+                    {"values": stub_embedding(
+                        "".join(part.get("text", "") for part in request["content"].get("parts", [])),
+                        request.get("outputDimensionality") or 768,
+                    )}
+                    for request in body.get("requests", [])
+                ]})
+            if not self.path.split("?")[0].endswith(":generateContent"):
+                return self._reply(404, {"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}})
+            if not state.admit():
+                return self._reply(429, {"error": {"code": 429, "message": "Resource has been exhausted", "status": "RESOURCE_EXHAUSTED"}})
+
+            prompt = "".join(part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", []))
+            with state._lock:
+                state.input_chars += len(prompt)
+            time.sleep(state.latency)
+
+            ids = TEXT_PATTERN.findall(prompt)
+            if body.get("generationConfig", {}).get("responseMimeType") == "application/json":
+                text = json.dumps([{"id": int(i), "summary": f"Stub summary of text {i}."} for i in ids])
+            else:
+                text = f"Stub summary of {len(prompt)} characters."
+            self._reply(200, {
+                "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+                "usageMetadata": {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": len(text) // 4},
+            })
+
+    return Handler
+
+def start_stub_server(port: int = 0, latency: float = 0.2, fail_rate: float = 0.0, rpm: float = 0):
+    """Starts the stub in a background thread. Returns (server, state, base_url)."""
+    state = StubState(latency, fail_rate, rpm)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"http://127.0.0.1:{server.server_address[1]}/"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a stub Gemini generateContent endpoint.")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds each request takes.")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests answered with 429.")
+    parser.add_argument("--rpm", type=float, default=0, help="Requests per minute before answering 429 (0 = unlimited).")
+    args = parser.parse_args()
+
+    server, state, base_url = start_stub_server(args.port, args.latency, args.fail_rate, args.rpm)
+    print(f"Stub Gemini server on {base_url} (set GEMINI_BASE_URL={base_url})")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"{state.requests} requests served, {state.rejected} rejected with 429", file=sys.stderr)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,176 @@
+import os
+import sys
+import time
+import argparse
+import threading
+import socketserver
+
+# Add the parent directory to sys.path so we can import cache_backend
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+from youtube_tools.cache_backend import RELEASE_LOCK_SCRIPT, EXTEND_LOCK_SCRIPT
+
+# Stand-in for a Redis server speaking RESP2, with just the commands youtube_tools/cache_backend.py
+# uses (GET, MGET, SET with NX/PX/EX, DEL, and EVAL of its two lock scripts). For exercising
+# CACHE_BACKEND=redis without a server: run it and set REDIS_URL=redis://127.0.0.1:<port>/0.
+
+class StubState:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.data = {}
+        self.expires = {}
+        self.commands = 0
+        self.round_trips = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Returns a key's value, dropping it first if it has expired."""
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return self.data.get(key)
+
+    def set(self, key, value, ttl_ms=None):
+        self.data[key] = value
+        if ttl_ms is None:
+            self.expires.pop(key, None)
+        else:
+            self.expires[key] = time.monotonic() + ttl_ms / 1000
+
+    def delete(self, key) -> int:
+        self.expires.pop(key, None)
+        return int(self.data.pop(key, None) is not None)
+
+    def execute(self, command):
+        """Runs one command. Returns the reply, or an Exception for an error reply."""
+        name, args = command[0].upper(), command[1:]
+        if name == "PING":
+            return "PONG"
+        if name in ("SELECT", "AUTH"):
+            return "OK"
+        if name == "GET":
+            return self.get(args[0])
+        if name == "MGET":
+            return [self.get(key) for key in args]
+        if name == "SET":
+            key, value, options = args[0], args[1], [option.upper() for option in args[2:]]
+            if "NX" in options and self.get(key) is not None:
+                return None
+            ttl_ms = None
+            if "PX" in options:
+                ttl_ms = int(args[2 + options.index("PX") + 1])
+            elif "EX" in options:
+                ttl_ms = int(args[2 + options.index("EX") + 1]) * 1000
+            self.set(key, value, ttl_ms)
+            return "OK"
+        if name == "DEL":
+            return sum(self.delete(key) for key in args)
+        if name == "DBSIZE":
+            return len(self.data)
+        if name == "FLUSHDB":
+            self.data.clear()
+            self.expires.clear()
+            return "OK"
+        if name == "EVAL":
+            script, key, token = args[0], args[2], args[3]
+            if self.get(key) != token:
+                return 0
+            if script == RELEASE_LOCK_SCRIPT:
+                return self.delete(key)
+            if script == EXTEND_LOCK_SCRIPT:
+                self.set(key, token, int(args[4]))
+                return 1
+            return Exception("ERR the stub only runs cache_backend's lock scripts")
+        return Exception(f"ERR unknown command '{name}'")
+
+def encode_reply(reply) -> bytes:
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, Exception):
+        return b"-%s\r\n" % str(reply).encode()
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, list):
+        return b"*%d\r\n" % len(reply) + b"".join(encode_reply(item) for item in reply)
+    if reply in ("OK", "PONG"):
+        return b"+%s\r\n" % reply.encode()
+    data = reply.encode() if isinstance(reply, str) else reply
+    return b"$%d\r\n%s\r\n" % (len(data), data)
+
+def parse_commands(buffer: bytes):
+    """Parses the complete RESP commands at the start of buffer. Returns (commands, unparsed rest)."""
+    commands = []
+    while buffer:
+        end = buffer.find(b"\r\n")
+        if end < 0:
+            break
+        if not buffer.startswith(b"*"):
+            commands.append(buffer[:end].decode().split()) # Inline command, e.g. from telnet
+            buffer = buffer[end + 2:]
+            continue
+        count, position = int(buffer[1:end]), end + 2
+        args = []
+        for _ in range(count):
+            end = buffer.find(b"\r\n", position)
+            if end < 0:
+                break
+            length = int(buffer[position + 1:end])
+            start = end + 2
+            if len(buffer) < start + length + 2:
+                break
+            args.append(buffer[start:start + length].decode())
+            position = start + length + 2
+        if len(args) < count:
+            break
+        commands.append(args)
+        buffer = buffer[position:]
+    return commands, buffer
+
+def make_handler(state: StubState):
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            buffer = b""
+            while True:
+                data = self.request.recv(1 << 16)
+                if not data:
+                    return
+                commands, buffer = parse_commands(buffer + data)
+                if not commands:
+                    continue
+                # Commands a client pipelined arrive together and are answered as one round trip
+                time.sleep(state.latency)
+                with state.lock:
+                    state.round_trips += 1
+                    state.commands += len(commands)
+                    replies = [state.execute(command) for command in commands]
+                self.request.sendall(b"".join(encode_reply(reply) for reply in replies))
+
+    return Handler
+
+class ThreadingServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def start_stub_server(port: int = 0, latency: float = 0.0):
+    """Starts the stub in a background thread. Returns (server, state, redis_url)."""
+    state = StubState(latency)
+    server = ThreadingServer(("127.0.0.1", port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"redis://127.0.0.1:{server.server_address[1]}/0"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a stub Redis (RESP2) endpoint.")
+    parser.add_argument("--port", type=int, default=6399)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every round trip (simulated network).")
+    args = parser.parse_args()
+
+    server, state, redis_url = start_stub_server(args.port, args.latency)
+    print(f"Stub Redis server on {redis_url} (set CACHE_BACKEND=redis REDIS_URL={redis_url})")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"{state.commands} commands in {state.round_trips} round trips, {len(state.data)} keys", file=sys.stderr)
+    except KeyboardInterrupt:
+        server.shutdown()
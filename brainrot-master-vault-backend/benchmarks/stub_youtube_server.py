@@ -0,0 +1,99 @@
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Stand-in for the YouTube Data API videos.list endpoint, with list ETags and 304 Not Modified
+# answers to If-None-Match, for exercising youtube_tools/ytshorts_pull.py without a key or
+# quota. Run it and set YOUTUBE_API_URL=http://127.0.0.1:<port>/youtube/v3/videos.
+
+class StubState:
+    def __init__(self, latency: float):
+        self.latency = latency
+        # Bumping a video's version changes its metadata and item ETag; deleted videos aren't returned
+        self.versions = {}
+        self.deleted = set()
+        self.requests = 0
+        self.not_modified = 0
+        self.ids_requested = 0
+        self._lock = threading.Lock()
+
+    def item(self, video_id: str) -> dict:
+        version = self.versions.get(video_id, 0)
+        return {
+            "kind": "youtube#video",
+            "etag": hashlib.sha1(f"{video_id}:{version}".encode()).hexdigest()[:27],
+            "id": video_id,
+            "snippet": {
+                "publishedAt": "2024-05-01T12:00:00Z",
+                "channelTitle": f"channel{int(hashlib.md5(video_id.encode()).hexdigest(), 16) % 50}",
+                "title": f"Video {video_id} (v{version})",
+                "description": "lorem ipsum " * 50,
+            },
+            "contentDetails": {"duration": "PT45S"},
+        }
+
+def make_handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            parsed = urlparse(self.path)
+            if not parsed.path.endswith("/videos"):
+                self.send_response(404)
+                self.end_headers()
+                return
+            video_ids = [video_id for video_id in parse_qs(parsed.query).get("id", [""])[0].split(",") if video_id]
+            time.sleep(state.latency)
+            items = [state.item(video_id) for video_id in video_ids if video_id not in state.deleted]
+            etag = '"' + hashlib.sha1("".join(item["etag"] for item in items).encode()).hexdigest() + '"'
+            with state._lock:
+                state.requests += 1
+                state.ids_requested += len(video_ids)
+                if self.headers.get("If-None-Match") == etag:
+                    state.not_modified += 1
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+            payload = json.dumps({
+                "kind": "youtube#videoListResponse",
+                "etag": etag,
+                "items": items,
+                "pageInfo": {"totalResults": len(items), "resultsPerPage": len(items)},
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return Handler
+
+def start_stub_server(port: int = 0, latency: float = 0.05):
+    """Starts the stub in a background thread. Returns (server, state, videos_url)."""
+    state = StubState(latency)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"http://127.0.0.1:{server.server_address[1]}/youtube/v3/videos"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a stub YouTube Data API videos endpoint.")
+    parser.add_argument("--port", type=int, default=8091)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds each request takes.")
+    args = parser.parse_args()
+
+    server, state, videos_url = start_stub_server(args.port, args.latency)
+    print(f"Stub YouTube Data API on {videos_url} (set YOUTUBE_API_URL={videos_url})")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"{state.requests} requests ({state.not_modified} not modified), {state.ids_requested} ids", file=sys.stderr)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,32 @@
+from fastapi import APIRouter, HTTPException
+from youtube_tools.db_commands import get_graph, GRAPH_DETAIL_LEVELS
+
+router = APIRouter()
+
+# Largest number of video and channel nodes returned in one graph
+MAX_GRAPH_VIDEOS = 5000
+MAX_GRAPH_CHANNELS = 1000
+
+@router.get("/graph", tags=["graph"])
+def graph(detail: str = "videos", max_videos: int = 500, max_channels: int = 200,
+          source: str = None, classification: str = None):
+    """
+    The knowledge graph of classifications, channels and videos, precomputed in SQLite.
+
+    Nodes are sent as [id, kind, label, weight] and edges as [source_index,
+    target_index, kind, weight], where kinds index into `node_kinds`/`edge_kinds`
+    and edge endpoints index into `nodes`. `detail` is `classifications`,
+    `channels` or `videos`; `max_channels` and `max_videos` cap the larger levels and
+    `omitted` reports how many nodes the caps left out.
+    """
+    if detail not in GRAPH_DETAIL_LEVELS:
+        raise HTTPException(status_code=400, detail=f"Detail must be one of: {', '.join(GRAPH_DETAIL_LEVELS)}.")
+    if not 0 <= max_videos <= MAX_GRAPH_VIDEOS:
+        raise HTTPException(status_code=400, detail=f"max_videos must be between 0 and {MAX_GRAPH_VIDEOS}.")
+    if not 0 <= max_channels <= MAX_GRAPH_CHANNELS:
+        raise HTTPException(status_code=400, detail=f"max_channels must be between 0 and {MAX_GRAPH_CHANNELS}.")
+
+    result = get_graph(detail, max_videos, max_channels, source, classification)
+    if result is None:
+        raise HTTPException(status_code=500, detail="Failed to load the knowledge graph.")
+    return result
@@ -0,0 +1,149 @@
+import os
+import asyncio
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from youtube_tools.db_commands import (
+    create_job, get_job, claim_next_job, extend_job_lease,
+    update_job_stage, complete_job, fail_job, release_job, recover_expired_jobs
+)
+from youtube_handler import get_youtube
+from tiktok_handler import get_tiktok
+from tools.workers import stage_listener
+from tools.video_urls import detect_source
+
+router = APIRouter()
+
+# Number of jobs processed concurrently. Each pipeline stage is additionally
+# bounded by its own pool in tools/workers.py.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Attempts per job before it is marked as failed, and the base of the exponential retry backoff
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BASE_DELAY = float(os.getenv("JOB_RETRY_BASE_DELAY", "5"))
+# How often idle workers check the queue for jobs whose retry delay has passed
+JOB_POLL_INTERVAL = 1.0
+# Seconds a claimed job stays leased to its worker without a renewal. Workers renew it every
+# third of that while the job runs; a job whose lease runs out (its process died) is
+# recovered by any replica sharing the database.
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+
+_worker_tasks = []
+_job_available = asyncio.Event()
+
+class JobRequest(BaseModel):
+    url: str
+
+def get_pipeline(url: str):
+    """Returns the handler that ingests the given URL, or None if the URL isn't supported."""
+    return {"youtube": get_youtube, "tiktok": get_tiktok}.get(detect_source(url))
+
+async def run_job(job_id: str, url: str, attempts: int, max_attempts: int):
+    """Runs one claimed job through its pipeline and records the outcome."""
+    pipeline = get_pipeline(url)
+    if pipeline is None:
+        fail_job(job_id, "Unsupported URL. Please provide a valid TikTok or YouTube URL.")
+        return
+
+    # Every run_in_stage() call made by the pipeline reports its stage to this job
+    stage_listener.set(lambda stage: update_job_stage(job_id, stage))
+    try:
+        result = await pipeline(url)
+    except HTTPException as e:
+        # Client errors (bad URL, video not found) won't succeed on retry
+        if e.status_code < 500 or attempts >= max_attempts:
+            fail_job(job_id, str(e.detail))
+        else:
+            fail_job(job_id, str(e.detail), retry_delay=JOB_RETRY_BASE_DELAY * 2 ** (attempts - 1))
+        return
+    except Exception as e:
+        print(f"Job {job_id} failed on attempt {attempts}/{max_attempts}: {e}")
+        if attempts >= max_attempts:
+            fail_job(job_id, str(e))
+        else:
+            fail_job(job_id, str(e), retry_delay=JOB_RETRY_BASE_DELAY * 2 ** (attempts - 1))
+        return
+
+    complete_job(job_id, result)
+    print(f"Job {job_id} succeeded for {url}")
+
+async def keep_job_lease(job_id: str):
+    """Renews a running job's lease until cancelled."""
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+        extend_job_lease(job_id, JOB_LEASE_SECONDS)
+
+async def job_worker(worker_id: int):
+    """Claims and runs queued jobs until cancelled."""
+    while True:
+        claimed = claim_next_job(JOB_LEASE_SECONDS)
+        if claimed is None:
+            _job_available.clear()
+            try:
+                await asyncio.wait_for(_job_available.wait(), timeout=JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        job_id, url, attempts, max_attempts = claimed
+        print(f"Worker {worker_id} running job {job_id} (attempt {attempts}/{max_attempts}): {url}")
+        lease = asyncio.create_task(keep_job_lease(job_id))
+        try:
+            # Each job runs in its own task so the stage listener doesn't leak between jobs
+            await asyncio.create_task(run_job(job_id, url, attempts, max_attempts))
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back rather than leave it until its lease expires
+            release_job(job_id)
+            raise
+        except Exception as e:
+            print(f"Worker {worker_id} error running job {job_id}: {e}")
+            fail_job(job_id, str(e))
+        finally:
+            lease.cancel()
+
+async def job_recovery():
+    """Recovers jobs whose lease expired (their process died) until cancelled."""
+    while True:
+        requeued, failed = recover_expired_jobs()
+        if requeued or failed:
+            print(f"Recovered {requeued + failed} job(s) with an expired lease: {requeued} requeued, {failed} failed after their last attempt.")
+        await asyncio.sleep(JOB_LEASE_SECONDS / 2)
+
+def start_job_workers():
+    """Starts the worker tasks and the recovery of jobs left behind by dead processes."""
+    for worker_id in range(JOB_WORKERS):
+        _worker_tasks.append(asyncio.create_task(job_worker(worker_id)))
+    _worker_tasks.append(asyncio.create_task(job_recovery()))
+    print(f"Started {JOB_WORKERS} job worker(s).")
+
+async def stop_job_workers():
+    """Cancels the worker tasks. Jobs they were running are put back on the queue."""
+    for task in _worker_tasks:
+        task.cancel()
+    await asyncio.gather(*_worker_tasks, return_exceptions=True)
+    _worker_tasks.clear()
+
+@router.post("/jobs", tags=["jobs"], status_code=202)
+async def submit_job(request: JobRequest):
+    """
+    Queues a YouTube or TikTok URL for background ingestion and returns its job id immediately.
+    Poll GET /jobs/{job_id} for progress.
+    """
+    if get_pipeline(request.url) is None:
+        raise HTTPException(status_code=400, detail="Unsupported URL. Please provide a valid TikTok or YouTube URL.")
+
+    job_id = create_job(request.url, max_attempts=JOB_MAX_ATTEMPTS)
+    if not job_id:
+        raise HTTPException(status_code=500, detail="Failed to queue job.")
+    _job_available.set()
+    return {"job_id": job_id, "status": "queued"}
+
+@router.get("/jobs/{job_id}", tags=["jobs"])
+async def get_job_status(job_id: str):
+    """
+    Returns a job's status ('queued', 'running', 'succeeded' or 'failed'), the pipeline
+    stage it is in while running, attempts so far, the last error and, once succeeded,
+    the same result /youtube or /tiktok would have returned.
+    """
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
@@ -1,14 +1,39 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse, PlainTextResponse
 import os
+import json
+import time
 from contextlib import asynccontextmanager # For lifespan management
 from fastapi.middleware.cors import CORSMiddleware
 
 # Import database functions and initialization
-from youtube_tools.db_commands import init_db, get_all
+from youtube_tools.db_commands import (
+    init_db, close_connections, get_videos, iter_videos, get_transcript_reuse_stats, VIDEO_FIELD_COLUMNS
+)
+from tools.workers import shutdown_executors
+from tools.transcription import warm_up_transcription
+from tools.single_flight import get_single_flight_stats
+from youtube_tools.memory_cache import memory_cache
+from youtube_tools.cache_backend import get_cache_backend
+from tools.audio_store import get_audio_store_stats
+from tools.embeddings import get_embedding_stats
+from tools.metadata_refresh import start_metadata_refresh, stop_metadata_refresh, get_metadata_refresh_stats
+from tools.http_client import get_http_client_stats
+from tools.video_urls import detect_source, get_short_link_stats
+from tools.metrics import (
+    observe, increment, register_gauges, render_prometheus,
+    request_timings, format_server_timing, TIMING_HEADERS
+)
 
 # Import routers from handler files
 from youtube_handler import router as youtube_router
 from tiktok_handler import router as tiktok_router
+from jobs_handler import router as jobs_router, start_job_workers, stop_job_workers
+from batch_handler import router as batch_router
+from podcast_handler import router as podcast_router
+from search_handler import router as search_router
+from related_handler import router as related_router
+from graph_handler import router as graph_router
 # Import specific handler functions needed for the /metadata endpoint
 from youtube_handler import get_youtube
 from tiktok_handler import get_tiktok
@@ -20,9 +45,17 @@ async def lifespan(app: FastAPI):
     print("Initializing database...")
     init_db()
     print("Database initialization complete.")
+    # Load a local transcription model now rather than on the first request
+    await warm_up_transcription()
+    start_job_workers()
+    start_metadata_refresh()
     yield
-    # Add cleanup logic here if needed in the future
     print("Application shutting down.")
+    await stop_job_workers()
+    await stop_metadata_refresh()
+    shutdown_executors()
+    get_cache_backend().close()
+    close_connections()
 
 app = FastAPI(lifespan=lifespan, title="BrainRot API", description="API for BrainRot Master Vault")
 
@@ -35,21 +68,111 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Records request latency/status per route and optionally adds a Server-Timing header."""
+    timings = []
+    request_timings.set(timings)
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+
+    # Label by route template (e.g. /jobs/{job_id}) to keep label cardinality bounded
+    route = request.scope.get("route")
+    path = route.path if route else "unmatched"
+    observe("brainrot_http_request_duration_seconds", elapsed, path=path)
+    increment("brainrot_http_requests_total", path=path, status=response.status_code)
+
+    if TIMING_HEADERS:
+        timings.append(("total", elapsed))
+        response.headers["Server-Timing"] = format_server_timing(timings)
+    return response
+
+register_gauges(
+    "brainrot_single_flight",
+    "Pipeline runs started, duplicate runs avoided by coalescing, and runs in flight.",
+    lambda: {(("kind", kind),): value for kind, value in get_single_flight_stats().items()},
+)
+
+register_gauges(
+    "brainrot_memory_cache",
+    "In-memory cache tier hits, misses, hit rate and size.",
+    lambda: {(("kind", kind),): value for kind, value in memory_cache.stats().items()},
+)
+
+register_gauges(
+    "brainrot_shared_cache",
+    "Lookups of the cache backend shared between replicas (CACHE_BACKEND): hits, misses and errors.",
+    lambda: {(("backend", get_cache_backend().name), ("kind", kind)): value for kind, value in get_cache_backend().stats().items()},
+)
+
+register_gauges(
+    "brainrot_metadata_refresh",
+    "Background refreshes of stale cached metadata by outcome, YouTube Data API quota units spent (fetch/refresh) and videos waiting.",
+    lambda: {(("kind", kind),): value for kind, value in get_metadata_refresh_stats().items()},
+)
+
+register_gauges(
+    "brainrot_http_client",
+    "Outbound API calls per host: requests, retries, failures, calls short-circuited by an open circuit, deadlines exceeded, calls in flight, slot limit and whether the circuit is open.",
+    lambda: {(("host", host), ("kind", kind)): value for host, stats in get_http_client_stats().items() for kind, value in stats.items()},
+)
+
+register_gauges(
+    "brainrot_short_links",
+    "Short-link lookups answered from memory, from the database, by following redirects, failed, or answered by a recent failure, and resolved and failed links held in memory.",
+    lambda: {(("kind", kind),): value for kind, value in get_short_link_stats().items()},
+)
+
+register_gauges(
+    "brainrot_audio_store",
+    "Audio store size in bytes, distinct blobs, video refs and disk budget.",
+    lambda: {(("kind", kind),): value for kind, value in get_audio_store_stats().items()},
+)
+
+register_gauges(
+    "brainrot_transcript_reuse",
+    "Transcription calls and seconds of audio saved by reusing transcripts of identical audio, since the database was created.",
+    lambda: {(("kind", kind),): value for kind, value in get_transcript_reuse_stats().items()},
+)
+
+register_gauges(
+    "brainrot_embeddings",
+    "Video embeddings indexed, and whether related-video search uses the approximate index.",
+    lambda: {(("kind", kind),): value for kind, value in get_embedding_stats().items()},
+)
+
 # Include the routers from the handler files
 app.include_router(youtube_router)
 app.include_router(tiktok_router)
+app.include_router(jobs_router)
+app.include_router(batch_router)
+app.include_router(podcast_router)
+app.include_router(search_router)
+app.include_router(related_router)
+app.include_router(graph_router)
 
 @app.get("/")
 async def root():
     return {"message": "Welcome to BrainRot API. Use /youtube or /tiktok endpoints."}
 
+@app.get("/metrics", tags=["metrics"], response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Prometheus-style metrics: per-stage latency histograms (cache lookup, metadata,
+    download, audio, transcription, summarization, DB write), request latency and counts
+    per route, cache hit/miss counts and hit ratio per column, and single-flight counters.
+    """
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
 @app.get("/metadata", tags=["metadata"])
 async def get_metadata(url: str):
     """
     Abstract endpoint to get metadata for TikTok or YouTube based on the URL.
     Delegates to the appropriate handler.
     """
-    if "tiktok.com" in url:
+    source = detect_source(url)
+    if source == "tiktok":
         # Call the TikTok handler function (imported)
         # Use try-except to catch potential HTTPExceptions from the handler
         try:
@@ -60,7 +183,7 @@ async def get_metadata(url: str):
             # Catch unexpected errors from the handler
             print(f"Unexpected error in TikTok handler via /metadata: {e}")
             raise HTTPException(status_code=500, detail="Internal server error processing TikTok URL.")
-    elif "youtube.com" in url or "youtu.be" in url:
+    elif source == "youtube":
         # Call the YouTube handler function (imported)
         try:
             return await get_youtube(url)
@@ -72,15 +195,52 @@ async def get_metadata(url: str):
     else:
         raise HTTPException(status_code=400, detail="Unsupported URL. Please provide a valid TikTok or YouTube URL.")
 
+# Largest page a client can request from /home in one call
+MAX_HOME_PAGE_SIZE = 1000
+
 @app.get("/home", tags=["home"])
-async def get_home():
-    # Get all cached videos (which now include source) from the database
-    all_videos = get_all()
-    if all_videos:
-        # No need to re-fetch or re-parse, just return the cached data
-        # The 'response_data' field already contains the parsed details
-        # The 'transcript' field contains the cached transcript
-        # The 'source' field indicates 'youtube' or 'tiktok'
-        return {"videos": all_videos}
-    else:
-        return {"videos": []}
+def get_home(
+    limit: int | None = None,
+    cursor: int | None = None,
+    fields: str | None = None,
+    source: str | None = None,
+    classification: str | None = None,
+    stream: bool = False,
+):
+    """
+    Lists cached videos in the order they were added.
+
+    - `limit`/`cursor`: page through the vault; pass the returned `next_cursor` to get the next page.
+    - `fields`: comma-separated subset of fields to return, e.g. `video_id,response_data,source`
+      to omit transcripts, or `video_id,title,channel,published_at,duration` for metadata only.
+    - `source`/`classification`: only return matching videos.
+    - `stream`: return every matching video as NDJSON (one video per line), fetched from the
+      database in batches so the full table is never held in memory.
+
+    Without parameters it returns every video, as before.
+    """
+    selected_fields = None
+    if fields:
+        selected_fields = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown_fields = set(selected_fields) - set(VIDEO_FIELD_COLUMNS)
+        if unknown_fields:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown_fields))}")
+    if source and source not in ['youtube', 'tiktok']:
+        raise HTTPException(status_code=400, detail="Source must be 'youtube' or 'tiktok'.")
+    if limit is not None and not 1 <= limit <= MAX_HOME_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"Limit must be between 1 and {MAX_HOME_PAGE_SIZE}.")
+
+    if stream:
+        # A sync generator: Starlette iterates it in a worker thread, one batch query at a time
+        def ndjson_lines():
+            for video in iter_videos(selected_fields, source, classification):
+                yield json.dumps(video) + "\n"
+        return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+    # A plain def endpoint: FastAPI runs it in its thread pool, so reading a large page
+    # (or, without a limit, the whole vault) doesn't block the event loop.
+    # The 'response_data' field already contains the parsed details,
+    # the 'transcript' field the cached transcript and
+    # the 'source' field indicates 'youtube' or 'tiktok'
+    videos, next_cursor = get_videos(cursor, limit, selected_fields, source, classification)
+    return {"videos": videos, "next_cursor": next_cursor}
@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+from tools.podcast import build_podcast_script
+
+router = APIRouter()
+
+@router.get("/podcast", tags=["podcast"])
+async def get_podcast(source: str = None, classification: str = None):
+    """
+    Streams a podcast script built from the cached videos' summaries, grouped by
+    classification. Each segment is sent as soon as it is generated (or reused).
+    """
+    # build_podcast_script blocks on the model endpoint; Starlette iterates sync generators in a thread
+    return StreamingResponse(build_podcast_script(source, classification), media_type="text/plain")
@@ -0,0 +1,41 @@
+from fastapi import APIRouter, HTTPException
+from tools.embeddings import embedding_index
+
+router = APIRouter()
+
+# Most neighbours returned per video
+MAX_RELATED = 100
+# Most source videos searched by one /related/edges request
+MAX_EDGE_SOURCES = 500
+
+@router.get("/related", tags=["related"])
+def related(video_id: str, k: int = 10):
+    """
+    Returns the k videos whose summaries are most similar to the given video's,
+    best first, with their cosine similarity. 404 if the video has no embedding yet.
+    """
+    if not 1 <= k <= MAX_RELATED:
+        raise HTTPException(status_code=400, detail=f"k must be between 1 and {MAX_RELATED}.")
+    # A plain def endpoint: scoring vectors runs in FastAPI's thread pool, off the event loop
+    results = embedding_index.related(video_id, k)
+    if results is None:
+        raise HTTPException(status_code=404, detail=f"No embedding for video {video_id}.")
+    return {"video_id": video_id, "related": [{"video_id": other_id, "score": round(score, 4)} for other_id, score in results]}
+
+@router.get("/related/edges", tags=["related"])
+def related_edges(k: int = 5, min_score: float = 0.75, limit: int = 200, offset: int = 0):
+    """
+    Similarity edges for the knowledge graph: `limit` videos, from `offset`, each linked
+    to its k nearest neighbours scoring at least `min_score`, as compact [source, target,
+    score] arrays. Page with `next_offset` (null on the last page); a pair found from
+    both of its videos can appear on two pages.
+    """
+    if not 1 <= k <= MAX_RELATED:
+        raise HTTPException(status_code=400, detail=f"k must be between 1 and {MAX_RELATED}.")
+    if not 1 <= limit <= MAX_EDGE_SOURCES:
+        raise HTTPException(status_code=400, detail=f"Limit must be between 1 and {MAX_EDGE_SOURCES}.")
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="Offset must not be negative.")
+    # One neighbour search per source video, so the page size bounds the work per request
+    edges, next_offset = embedding_index.edges(k, min_score, offset, limit)
+    return {"edges": [[source, target, round(score, 4)] for source, target, score in edges], "next_offset": next_offset}
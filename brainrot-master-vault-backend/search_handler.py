@@ -0,0 +1,29 @@
+from fastapi import APIRouter, HTTPException
+from youtube_tools.db_commands import search_videos
+
+router = APIRouter()
+
+# Largest page of search results
+MAX_SEARCH_PAGE_SIZE = 100
+
+@router.get("/search", tags=["search"])
+def search(q: str, limit: int = 20, offset: int = 0, source: str = None, classification: str = None):
+    """
+    Full-text search over video titles, transcripts and summaries.
+
+    Results are ranked best first and each carries a `snippet` of the best matching
+    passage with matched words wrapped in <b></b>. All words in `q` must match; end a
+    word with * for a prefix search. Filter with `source` and `classification`, and
+    page with `limit`/`offset` (`next_offset` is null on the last page).
+    """
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Query must not be empty.")
+    if not 1 <= limit <= MAX_SEARCH_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"Limit must be between 1 and {MAX_SEARCH_PAGE_SIZE}.")
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="Offset must not be negative.")
+
+    # A plain def endpoint: FastAPI runs it in its thread pool, so ranking a broad
+    # query over a large vault doesn't block the event loop
+    results, next_offset = search_videos(q, limit, offset, source, classification)
+    return {"results": results, "next_offset": next_offset}
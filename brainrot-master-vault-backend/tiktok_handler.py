@@ -1,71 +1,105 @@
 import os
-import re
 import csv
 import json
 import pyktok as pyk
 from fastapi import APIRouter, HTTPException
-from moviepy import VideoFileClip 
 from youtube_tools.db_commands import (
-    get_cached_response, cache_response,
+    get_cached_response_data, cache_response,
     get_cached_transcript, cache_transcript,
     get_cached_summary, cache_summary
 )
-from tools.transcription import transcribe
-from tools.summarize import summarize_text
+from tools.transcription import transcribe_audio_bytes
+from tools.transcript_reuse import fingerprint_and_reuse, transcribe_with_reuse
+from tools.audio import (
+    AUDIO_FORMATS, STREAM_AUDIO_UPLOAD,
+    get_audio_format, extract_audio, extract_audio_bytes
+)
+from tools.audio_store import audio_key, get_audio, get_staging_path, store_audio
+from tools.summarize import summarize
+from tools.embeddings import embed_video
+from tools.workers import run_in_stage
+from tools.single_flight import single_flight
+from tools.video_urls import parse_video_url, resolve_video_url
 
 router = APIRouter()
 
 def get_tiktok_username_id(tiktok_url: str) -> tuple[str | None, str | None]:
     """
     Extracts the TikTok username and video ID from the provided URL.
-    Returns (None, None) if the pattern doesn't match.
+    Returns (None, None) if the pattern doesn't match. Short links (vm.tiktok.com) need
+    resolve_video_url() instead.
     """
-    # Regular expression to extract username and video_id
-    pattern = r"https://www\.tiktok\.com/@?(?P<username>[^/]+)/video/(?P<video_id>\d+)"
-    match = re.match(pattern, tiktok_url)
-    if match:
-        return match.group("username"), match.group("video_id")
-    else:
-        # Handle short URLs like https://vm.tiktok.com/xxxxx/
-        # This might require an extra step to resolve the short URL first
-        # For now, return None if the standard format isn't matched
-        print(f"URL format not recognized for direct extraction: {tiktok_url}")
-        return None, None
+    video = parse_video_url(tiktok_url)
+    if video and video.source == "tiktok":
+        return video.username, video.video_id
+    print(f"URL format not recognized for direct extraction: {tiktok_url}")
+    return None, None
+
+def get_legacy_tiktok_audio_paths(username: str, video_id: str) -> list[str]:
+    """Where audio was saved before the audio store existed (adopted into the store on first use)."""
+    base_dir = "/db/cache" if os.path.exists('/db/cache/') else "."
+    return [
+        os.path.join(base_dir, "tiktok_audio", f"{username}_video_{video_id}.{audio_format['extension']}")
+        for audio_format in AUDIO_FORMATS.values()
+    ]
+
+def find_tiktok_audio(username: str, video_id: str) -> str | None:
+    """Returns the path of previously extracted audio for a video, or None."""
+    return get_audio(audio_key('tiktok', video_id), legacy_paths=get_legacy_tiktok_audio_paths(username, video_id))
+
+def extract_and_store_audio(video_id: str, mp4_file_path: str) -> str:
+    """Extracts the video's audio with ffmpeg into the audio store and returns the stored path (blocking)."""
+    staging_path = get_staging_path(get_audio_format()['extension'])
+    try:
+        extract_audio(mp4_file_path, staging_path)
+        return store_audio(audio_key('tiktok', video_id), staging_path)
+    finally:
+        if os.path.exists(staging_path):
+            os.remove(staging_path)
 
 async def extract_audio_and_transcribe(username: str, video_id: str, mp_file_url: str):
     """
     Extracts audio from the downloaded MP4, transcribes it, and handles caching.
     Cleans up the MP4 file afterwards.
-    """
-    # Determine output directory
-    base_dir = "/db/cache" if os.path.exists('/db/cache/') else "."
-    output_dir = os.path.join(base_dir, "tiktok_audio")
-    os.makedirs(output_dir, exist_ok=True)
 
-    # Define MP3 output path
-    mp3_file_path = os.path.join(output_dir, f"{username}_video_{video_id}.mp3")
+    Audio is extracted by an ffmpeg subprocess straight to compact 16 kHz mono speech
+    audio and kept in the audio store. With STREAM_AUDIO_UPLOAD enabled it is piped
+    into the upload without being written to disk.
+    """
+    audio_format = get_audio_format()
     transcribed_text = None
 
     # Check cache for transcript first
-    cached_transcript = get_cached_transcript(video_id)
+    cached_transcript = await run_in_stage("cache", get_cached_transcript, video_id)
     if cached_transcript:
         print(f"Cache hit for transcript: {video_id}")
         return cached_transcript
 
     # Check if audio file exists and transcribe
-    if os.path.exists(mp3_file_path):
-        print(f"Using existing audio file: {mp3_file_path}")
-        transcribed_text = await transcribe(mp3_file_path)
+    existing_audio_path = await run_in_stage("cache", find_tiktok_audio, username, video_id)
+    if existing_audio_path:
+        print(f"Using existing audio file: {existing_audio_path}")
+        transcribed_text = await transcribe_with_reuse(video_id, existing_audio_path)
     # Extract audio from video if mp4 exists
     elif os.path.exists(mp_file_url):
-        print(f"Extracting audio from {mp_file_url} to {mp3_file_path}")
         try:
-            with VideoFileClip(mp_file_url) as video_clip:
-                video_clip.audio.write_audiofile(mp3_file_path, codec='mp3')
-            print("Audio extracted successfully")
-            
-            # Transcribe the new audio
-            transcribed_text = await transcribe(mp3_file_path)
+            if STREAM_AUDIO_UPLOAD:
+                print(f"Extracting audio from {mp_file_url} for direct upload")
+                audio = await run_in_stage("audio", extract_audio_bytes, mp_file_url)
+                print("Audio extracted successfully")
+                # Reuse the transcript of identical audio (e.g. a reused TikTok sound) if there is one.
+                # The extracted audio is fingerprinted, not the mp4, so this matches audio
+                # fingerprinted from the audio store when streaming is off.
+                _, transcribed_text = await fingerprint_and_reuse(video_id, audio_bytes=audio)
+                if not transcribed_text:
+                    transcribed_text = await transcribe_audio_bytes(audio, f"{video_id}.{audio_format['extension']}", audio_format['mime_type'])
+            else:
+                print(f"Extracting audio from {mp_file_url} into the audio store")
+                audio_file_path = await run_in_stage("audio", extract_and_store_audio, video_id, mp_file_url)
+                print("Audio extracted successfully")
+
+                # Transcribe the new audio
+                transcribed_text = await transcribe_with_reuse(video_id, audio_file_path)
         except Exception as e:
             print(f"Error during audio extraction or transcription: {e}")
             raise
@@ -82,7 +116,7 @@ async def extract_audio_and_transcribe(username: str, video_id: str, mp_file_url
 
     # Cache successful transcription
     if transcribed_text:
-        cache_transcript(video_id, transcribed_text)
+        await run_in_stage("cache", cache_transcript, video_id, transcribed_text)
         print(f"Cached transcript for video ID: {video_id}")
 
     return transcribed_text
@@ -93,52 +127,56 @@ async def get_tiktok(tiktok_url: str):
     """
     Handles fetching details, audio, transcription, and summary for a TikTok video.
     """
-    username, video_id = get_tiktok_username_id(tiktok_url)
-    if not username or not video_id:
-        # Consider attempting to resolve short URLs here if needed
+    # Short links (vm.tiktok.com, tiktok.com/t/) are resolved once and remembered
+    video = await resolve_video_url(tiktok_url)
+    if not video or video.source != "tiktok":
         raise HTTPException(status_code=400, detail="Invalid or unsupported TikTok URL format")
 
+    # Concurrent requests for the same video (on any replica) share a single pipeline run.
+    # The canonical URL also fixes the name pyktok saves the video under (@<username>_video_<id>.mp4).
+    return await single_flight(video.key, lambda: run_tiktok_pipeline(video.url, video.username, video.video_id), distributed=True)
+
+async def run_tiktok_pipeline(tiktok_url: str, username: str, video_id: str):
+    """
+    Runs the TikTok pipeline (cache check, download, transcription, summary) for a validated video.
+    """
     print(f"Processing TikTok - Username: {username}, Video ID: {video_id}")
 
     # 1. Check cache for the full response data
-    cached_response_json = get_cached_response(video_id)
-    if cached_response_json:
+    cached_response_data = await run_in_stage("cache", get_cached_response_data, video_id)
+    if cached_response_data:
         print(f"Cache hit for TikTok response: {video_id}")
         try:
-            cached_response = json.loads(cached_response_json)
+            # Copy before filling in transcript/summary: the cached object is shared
+            cached_response = dict(cached_response_data)
             # Even if response is cached, ensure transcript and summary are present
             if 'transcription' not in cached_response or cached_response['transcription'] is None:
-                 cached_transcript = get_cached_transcript(video_id)
+                 cached_transcript = await run_in_stage("cache", get_cached_transcript, video_id)
                  if cached_transcript:
                      cached_response['transcription'] = cached_transcript
                  else:
                      # Attempt to transcribe if audio exists
-                     if os.path.exists('/db/cache/'):
-                         output_dir = "/db/cache/tiktok_audio/"
-                     else:
-                         output_dir = "tiktok_audio"
-                     mp3_file = os.path.join(output_dir, f"{username}_video_{video_id}.mp3")
-                     if os.path.exists(mp3_file):
+                     audio_file = await run_in_stage("cache", find_tiktok_audio, username, video_id)
+                     if audio_file:
                          print(f"Response cached, but transcript missing/stale for {video_id}. Transcribing existing audio.")
-                         transcribed_text = await transcribe(mp3_file)
+                         transcribed_text = await transcribe_with_reuse(video_id, audio_file)
                          if transcribed_text:
-                             cache_transcript(video_id, transcribed_text)
+                             await run_in_stage("cache", cache_transcript, video_id, transcribed_text)
                              cached_response['transcription'] = transcribed_text
 
             if 'summary' not in cached_response or cached_response['summary'] is None:
-                cached_summary = get_cached_summary(video_id)
+                cached_summary = await run_in_stage("cache", get_cached_summary, video_id)
                 if cached_summary:
                     cached_response['summary'] = cached_summary
                 elif cached_response.get('transcription'): # Generate summary if transcript now exists
                     print(f"Response cached, but summary missing/stale for {video_id}. Generating summary.")
-                    summary = summarize_text(f"Title: {cached_response.get('title', '')}\nTranscript: {cached_response['transcription']}\nDescription: {cached_response.get('description', '')}")
+                    summary = await summarize(f"Title: {cached_response.get('title', '')}\nTranscript: {cached_response['transcription']}\nDescription: {cached_response.get('description', '')}")
                     if summary:
-                        cache_summary(video_id, summary)
+                        await run_in_stage("cache", cache_summary, video_id, summary)
                         cached_response['summary'] = summary
+                        await embed_video(video_id, cached_response.get('title', ''), summary)
 
             return cached_response
-        except json.JSONDecodeError as e:
-            print(f"Error decoding cached JSON for TikTok {video_id}: {e}. Fetching fresh data.")
         except Exception as e:
              print(f"Unexpected error processing cached TikTok {video_id}: {e}. Fetching fresh data.")
 
@@ -146,27 +184,14 @@ async def get_tiktok(tiktok_url: str):
     # 2. If not in cache or cache error, fetch from TikTok
     print(f"Cache miss for TikTok response: {video_id}. Fetching from TikTok.")
     temp_csv_file = f'video_data_{video_id}.csv' # Unique temp file name
-
-    if os.path.exists('/db/cache/'):
-        output_dir = "/db/cache/tiktok_audio/"
-    else:
-        output_dir = "tiktok_audio"
-    os.makedirs(output_dir, exist_ok=True)
+    mp4_file_path = f"./@{username}_video_{video_id}.mp4" # Where pyktok saves the video
 
     try:
         # Download video data and video file
-        pyk.save_tiktok(tiktok_url, True, temp_csv_file)
+        # pyktok blocks on the network, so run it on the download pool
+        await run_in_stage("download", pyk.save_tiktok, tiktok_url, True, temp_csv_file)
         print(f"TikTok video and data downloaded for {video_id}.")
-        
-        # Determine target output directory
-        if os.path.exists('/db/cache/'):
-            output_dir = "/db/cache/tiktok_audio/"
-        else:
-            output_dir = "tiktok_audio"
-        
-        os.makedirs(output_dir, exist_ok=True)
-      
-        expected_filename = f"./@{username}_video_{video_id}.mp4" 
+
         # Check if the CSV file was created
         if not os.path.exists(temp_csv_file):
              raise HTTPException(status_code=500, detail=f"Failed to download TikTok data CSV for {video_id}")
@@ -182,7 +207,7 @@ async def get_tiktok(tiktok_url: str):
                  raise HTTPException(status_code=500, detail=f"Failed to read data from TikTok CSV for {video_id}")
 
         # Extract audio and transcribe (also handles MP4 cleanup)
-        transcribed_text = await extract_audio_and_transcribe(username, video_id, expected_filename)
+        transcribed_text = await extract_audio_and_transcribe(username, video_id, mp4_file_path)
 
         # Prepare final result
         result = {
@@ -192,6 +217,7 @@ async def get_tiktok(tiktok_url: str):
             'publishedAt': video_metadata.get('video_timestamp', None),
             'thumbnail': None, # pyktok doesn't easily provide this
             'channelTitle': video_metadata.get('author_name', username),
+            'duration': video_metadata.get('video_duration') or None,
             'transcription': transcribed_text,
             'summary': None # Initialize summary
         }
@@ -199,15 +225,16 @@ async def get_tiktok(tiktok_url: str):
         # Generate summary if transcription was successful
         if transcribed_text:
             print(f"Generating summary for TikTok {video_id}")
-            summary = summarize_text(f"Title: {result['title']}\nTranscript: {transcribed_text}\nDescription: {result['description']}")
+            summary = await summarize(f"Title: {result['title']}\nTranscript: {transcribed_text}\nDescription: {result['description']}")
             if summary:
                 result['summary'] = summary
-                cache_summary(video_id, summary) # Cache the summary
+                await run_in_stage("cache", cache_summary, video_id, summary) # Cache the summary
+                await embed_video(video_id, result['title'], summary)
             else:
                 print(f"Summarization failed for TikTok {video_id}")
 
         # Cache the full response
-        cache_response(video_id, result, source='tiktok')
+        await run_in_stage("cache", cache_response, video_id, result, source='tiktok')
         print(f"Cached TikTok response for video ID: {video_id} (source: tiktok)")
 
         return result
@@ -0,0 +1,213 @@
+import os
+import re
+import shutil
+import hashlib
+import threading
+import subprocess
+import numpy as np
+
+# Output formats for speech audio. Whisper resamples everything to 16 kHz mono, so
+# anything above that only costs disk space and upload time.
+AUDIO_FORMATS = {
+    # ~24 kbps Opus in an Ogg container: ~180 KB per minute of speech
+    "opus": {"extension": "ogg", "mime_type": "audio/ogg", "args": ["-c:a", "libopus", "-b:a", "24k", "-application", "voip", "-f", "ogg"]},
+    # Lossless, for transcription backends that want PCM-exact input
+    "flac": {"extension": "flac", "mime_type": "audio/flac", "args": ["-c:a", "flac", "-f", "flac"]},
+    # Legacy format the pipeline used to produce. No Xing header: it can't be written to a
+    # pipe, and without it files and piped uploads decode to the same samples (CBR needs
+    # it for nothing else)
+    "mp3": {"extension": "mp3", "mime_type": "audio/mpeg", "args": ["-c:a", "libmp3lame", "-b:a", "64k", "-write_xing", "0", "-f", "mp3"]},
+}
+
+# Format used for newly extracted audio. Set SPEECH_AUDIO_FORMAT=mp3 if the
+# transcription endpoint can't decode Opus.
+SPEECH_AUDIO_FORMAT = os.getenv("SPEECH_AUDIO_FORMAT", "opus")
+SPEECH_SAMPLE_RATE = 16000
+
+# Pipe extracted audio straight into the transcription upload instead of keeping a file
+STREAM_AUDIO_UPLOAD = os.getenv("STREAM_AUDIO_UPLOAD", "false").lower() in ("1", "true", "yes")
+
+def get_ffmpeg_path() -> str:
+    """
+    Returns the ffmpeg binary to run: the one on PATH (installed via nixpacks in
+    production) or the binary bundled with imageio-ffmpeg.
+    """
+    ffmpeg_path = shutil.which("ffmpeg")
+    if ffmpeg_path:
+        return ffmpeg_path
+    import imageio_ffmpeg
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+def get_audio_format(fmt: str = None) -> dict:
+    """Returns the settings for the given format name (default SPEECH_AUDIO_FORMAT)."""
+    fmt = fmt or SPEECH_AUDIO_FORMAT
+    if fmt not in AUDIO_FORMATS:
+        raise ValueError(f"Unsupported audio format '{fmt}'. Expected one of: {', '.join(AUDIO_FORMATS)}")
+    return AUDIO_FORMATS[fmt]
+
+def _ffmpeg_command(input_path: str, output: str, fmt: str = None) -> list[str]:
+    return [
+        get_ffmpeg_path(), "-hide_banner", "-loglevel", "error", "-nostdin", "-y",
+        "-i", input_path,
+        "-vn", "-ac", "1", "-ar", str(SPEECH_SAMPLE_RATE),
+        # Byte-stable output: no random Ogg stream serial, encoder version tag or copied
+        # metadata, so the same audio extracted twice hashes the same in the audio store
+        "-fflags", "+bitexact", "-flags:a", "+bitexact", "-map_metadata", "-1",
+        *get_audio_format(fmt)["args"],
+        output,
+    ]
+
+def extract_audio(input_path: str, output_path: str, fmt: str = None) -> str:
+    """
+    Extracts the audio track of a video (or re-encodes an audio file) to 16 kHz mono
+    speech audio with an ffmpeg subprocess. Nothing is decoded in Python.
+
+    Returns output_path. Raises RuntimeError if ffmpeg fails.
+    """
+    result = subprocess.run(_ffmpeg_command(input_path, output_path, fmt), capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed extracting audio from {input_path}: {result.stderr.decode(errors='replace').strip()}")
+    return output_path
+
+def extract_audio_bytes(input_path: str, fmt: str = None) -> bytes:
+    """
+    Like extract_audio, but pipes the encoded audio out of ffmpeg's stdout instead of
+    writing a file, so it can be uploaded without touching the disk.
+    """
+    result = subprocess.run(_ffmpeg_command(input_path, "pipe:1", fmt), capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed extracting audio from {input_path}: {result.stderr.decode(errors='replace').strip()}")
+    return result.stdout
+
+# Fingerprints hash decoded PCM in one-second chunks. Samples are reduced to their top
+# 8 bits first so tiny decoder differences don't change the hash.
+FINGERPRINT_CHUNK_SECONDS = 1
+FINGERPRINT_QUANTIZE_SHIFT = 8
+
+def _feed_stdin(stream, data: bytes):
+    # ffmpeg may exit (or the pipe be closed) before reading all of it; the error is
+    # reported from its exit status instead
+    try:
+        stream.write(data)
+        stream.close()
+    except (BrokenPipeError, ValueError):
+        pass
+
+def fingerprint_audio(input_path: str = None, audio_bytes: bytes = None) -> tuple[str, float]:
+    """
+    Computes a content fingerprint of a media file's audio (or of encoded audio held in
+    memory, e.g. piped out of extract_audio_bytes): ffmpeg decodes it to 16 kHz mono PCM,
+    which is hashed chunk by chunk while streaming (the PCM is never held in memory all
+    at once).
+
+    Callers fingerprint the extracted speech audio, never the source video: extraction is
+    bit-exact, so the same video fingerprints the same whether its audio went to a file
+    or straight into an upload.
+
+    Returns (fingerprint hex digest, duration in seconds). Raises RuntimeError if ffmpeg fails.
+    """
+    command = [
+        get_ffmpeg_path(), "-hide_banner", "-loglevel", "error", "-nostdin",
+        "-i", input_path if audio_bytes is None else "pipe:0",
+        "-vn", "-ac", "1", "-ar", str(SPEECH_SAMPLE_RATE), "-f", "s16le", "pipe:1",
+    ]
+    chunk_bytes = SPEECH_SAMPLE_RATE * 2 * FINGERPRINT_CHUNK_SECONDS
+    digest = hashlib.sha256()
+    total_bytes = 0
+    stdin = subprocess.DEVNULL if audio_bytes is None else subprocess.PIPE
+    with subprocess.Popen(command, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as process:
+        if audio_bytes is not None:
+            # Fed from a thread: ffmpeg blocks writing PCM until it is read below
+            threading.Thread(target=_feed_stdin, args=(process.stdin, audio_bytes), daemon=True).start()
+        while True:
+            chunk = process.stdout.read(chunk_bytes)
+            if not chunk:
+                break
+            total_bytes += len(chunk)
+            samples = np.frombuffer(chunk[:len(chunk) - len(chunk) % 2], dtype=np.int16)
+            digest.update(hashlib.sha256((samples >> FINGERPRINT_QUANTIZE_SHIFT).astype(np.int8).tobytes()).digest())
+        stderr = process.stderr.read()
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed decoding audio from {input_path or 'piped audio'}: {stderr.decode(errors='replace').strip()}")
+    return digest.hexdigest(), total_bytes / 2 / SPEECH_SAMPLE_RATE
+
+# Silence detection thresholds used to pick chunk boundaries for long audio
+SILENCE_NOISE_DB = int(os.getenv("SILENCE_NOISE_DB", "-35"))
+SILENCE_MIN_SECONDS = float(os.getenv("SILENCE_MIN_SECONDS", "0.4"))
+
+_DURATION_PATTERN = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+_SILENCE_PATTERN = re.compile(r"silence_(start|end): (-?\d+(?:\.\d+)?)")
+
+def probe_duration(input_path: str) -> float | None:
+    """
+    Reads a media file's duration in seconds from its container header, without decoding
+    it (ffmpeg with no output only prints the input's header). Returns None if the header
+    doesn't say, e.g. for streams without a duration.
+    """
+    result = subprocess.run([get_ffmpeg_path(), "-hide_banner", "-nostdin", "-i", input_path], capture_output=True)
+    duration_match = _DURATION_PATTERN.search(result.stderr.decode(errors="replace"))
+    if not duration_match:
+        return None
+    hours, minutes, seconds = duration_match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+def detect_silences(input_path: str) -> tuple[float, list[tuple[float, float]]]:
+    """
+    Runs ffmpeg's silencedetect filter over a media file's audio.
+
+    Returns (duration in seconds, [(silence start, silence end), ...]). Raises RuntimeError if ffmpeg fails.
+    """
+    command = [
+        get_ffmpeg_path(), "-hide_banner", "-nostdin", "-i", input_path, "-vn",
+        "-af", f"silencedetect=noise={SILENCE_NOISE_DB}dB:d={SILENCE_MIN_SECONDS}", "-f", "null", "-",
+    ]
+    result = subprocess.run(command, capture_output=True)
+    output = result.stderr.decode(errors="replace")
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed detecting silences in {input_path}: {output.strip()[-500:]}")
+
+    duration_match = _DURATION_PATTERN.search(output)
+    duration = 0.0
+    if duration_match:
+        hours, minutes, seconds = duration_match.groups()
+        duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+    silences = []
+    silence_start = None
+    for kind, value in _SILENCE_PATTERN.findall(output):
+        if kind == "start":
+            silence_start = max(float(value), 0.0)
+        elif silence_start is not None:
+            silences.append((silence_start, float(value)))
+            silence_start = None
+    if silence_start is not None:
+        silences.append((silence_start, duration))
+    return duration, silences
+
+def plan_chunks(duration: float, silences: list[tuple[float, float]], max_chunk_seconds: float) -> list[tuple[float, float]]:
+    """
+    Splits [0, duration] into chunks of at most max_chunk_seconds, cutting in the
+    middle of a silence where possible. The latest silence within a chunk's window
+    (but past its first half) is used; without one the chunk is cut at the limit.
+    """
+    midpoints = [(start + end) / 2 for start, end in silences]
+    chunks = []
+    chunk_start = 0.0
+    while duration - chunk_start > max_chunk_seconds:
+        limit = chunk_start + max_chunk_seconds
+        cuts = [point for point in midpoints if chunk_start + max_chunk_seconds / 2 <= point <= limit]
+        chunk_end = cuts[-1] if cuts else limit
+        chunks.append((chunk_start, chunk_end))
+        chunk_start = chunk_end
+    chunks.append((chunk_start, duration))
+    return chunks
+
+def extract_audio_segment(input_path: str, output_path: str, start: float, end: float, fmt: str = None) -> str:
+    """Like extract_audio, but only for the [start, end) seconds of the input."""
+    command = _ffmpeg_command(input_path, output_path, fmt)
+    input_index = command.index("-i")
+    command[input_index:input_index] = ["-ss", f"{start:.3f}", "-to", f"{end:.3f}"]
+    result = subprocess.run(command, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed extracting {start:.1f}-{end:.1f}s from {input_path}: {result.stderr.decode(errors='replace').strip()}")
+    return output_path
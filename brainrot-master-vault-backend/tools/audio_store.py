@@ -0,0 +1,140 @@
+import os
+import uuid
+import hashlib
+import threading
+from youtube_tools.db_commands import (
+    get_audio_ref, get_audio_blob, save_audio_blob, touch_audio_blob,
+    get_audio_store_usage, get_least_recently_used_audio_blobs, delete_audio_blob
+)
+
+# Root directory of the content-addressed store. Blobs live at <root>/<sha[:2]>/<sha>.<ext>
+if os.path.exists('/db/cache/'):
+    AUDIO_STORE_DIR = "/db/cache/audio_store"
+else:
+    AUDIO_STORE_DIR = "audio_store"
+
+# Disk budget for stored audio. When it is exceeded, the least recently used blobs are deleted.
+AUDIO_STORE_MAX_BYTES = int(os.getenv("AUDIO_STORE_MAX_BYTES", str(5 * 1024 ** 3)))
+
+HASH_CHUNK_SIZE = 1024 * 1024
+# Least recently used blobs fetched per eviction pass
+EVICTION_BATCH_SIZE = 100
+
+_eviction_lock = threading.Lock()
+
+def audio_key(source: str, video_id: str) -> str:
+    """Returns the store key for a video's audio, e.g. 'youtube:o4XRpgyz2O8'."""
+    return f"{source}:{video_id}"
+
+def get_staging_path(extension: str) -> str:
+    """
+    Returns a fresh path inside the store's staging directory to download or extract
+    audio into before handing it to store_audio(). Staging is on the same filesystem
+    as the store, so storing is a rename rather than a copy.
+    """
+    staging_dir = os.path.join(AUDIO_STORE_DIR, "staging")
+    os.makedirs(staging_dir, exist_ok=True)
+    return os.path.join(staging_dir, f"{uuid.uuid4().hex}.{extension}")
+
+def hash_file(path: str) -> str:
+    """Returns the SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _blob_path(sha256: str, extension: str) -> str:
+    return os.path.join(AUDIO_STORE_DIR, sha256[:2], f"{sha256}.{extension}")
+
+def store_audio(key: str, source_path: str) -> str:
+    """
+    Moves an audio file into the store under `key` and returns its stored path.
+
+    Identical audio (same bytes) is stored once: if a blob with the same hash already
+    exists, the source file is deleted and `key` simply points at the existing blob.
+    Stores beyond AUDIO_STORE_MAX_BYTES evict least recently used blobs.
+    """
+    sha256 = hash_file(source_path)
+    size = os.path.getsize(source_path)
+    extension = os.path.splitext(source_path)[1].lstrip(".") or "bin"
+
+    existing = get_audio_blob(sha256)
+    if existing and os.path.exists(existing[0]):
+        os.remove(source_path)
+        save_audio_blob(key, sha256, existing[0], existing[1])
+        print(f"Audio for {key} deduplicated against existing blob {sha256[:12]}")
+        return existing[0]
+
+    stored_path = _blob_path(sha256, extension)
+    os.makedirs(os.path.dirname(stored_path), exist_ok=True)
+    os.replace(source_path, stored_path)
+    save_audio_blob(key, sha256, stored_path, size)
+    print(f"Stored audio for {key} as {stored_path} ({size} bytes)")
+
+    enforce_budget(keep=sha256)
+    return stored_path
+
+def get_audio(key: str, legacy_paths=()) -> str | None:
+    """
+    Returns the stored audio path for `key`, or None.
+
+    Files from before the store existed can be passed as `legacy_paths`; the first one
+    that exists is adopted into the store (moved and hashed) and returned.
+    """
+    ref = get_audio_ref(key)
+    if ref:
+        sha256, path, _ = ref
+        if os.path.exists(path):
+            touch_audio_blob(sha256)
+            return path
+        # The file was removed behind the store's back; forget it
+        delete_audio_blob(sha256)
+
+    for legacy_path in legacy_paths:
+        if os.path.exists(legacy_path):
+            print(f"Adopting legacy audio file {legacy_path} into the audio store")
+            return store_audio(key, legacy_path)
+    return None
+
+def enforce_budget(max_bytes: int = None, keep: str = None):
+    """
+    Deletes least recently used blobs until the store fits within max_bytes
+    (default AUDIO_STORE_MAX_BYTES). The blob with hash `keep` is never evicted, and
+    blobs whose file can't be deleted are skipped for the rest of the call.
+    Returns the number of bytes freed.
+    """
+    max_bytes = AUDIO_STORE_MAX_BYTES if max_bytes is None else max_bytes
+    freed = 0
+    undeletable = set()
+    with _eviction_lock:
+        total_bytes, _, _ = get_audio_store_usage()
+        while total_bytes > max_bytes:
+            # Fetched past the skipped blobs, so they can't hide the evictable ones behind them
+            lru_blobs = get_least_recently_used_audio_blobs(EVICTION_BATCH_SIZE + len(undeletable) + 1)
+            candidates = [blob for blob in lru_blobs if blob[0] != keep and blob[0] not in undeletable]
+            if not candidates:
+                break
+            for sha256, path, size in candidates:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    # E.g. EACCES or EROFS: retrying won't help, and looping on it would hold the lock forever
+                    print(f"Error evicting audio blob {path}: {e}")
+                    undeletable.add(sha256)
+                    continue
+                delete_audio_blob(sha256)
+                total_bytes -= size
+                freed += size
+                if total_bytes <= max_bytes:
+                    break
+    if freed:
+        print(f"Audio store evicted {freed} bytes to stay within {max_bytes} bytes")
+    return freed
+
+def get_audio_store_stats():
+    """Returns the store's size in bytes, blob and ref counts, and its budget."""
+    total_bytes, blobs, refs = get_audio_store_usage()
+    return {"bytes": total_bytes, "blobs": blobs, "refs": refs, "max_bytes": AUDIO_STORE_MAX_BYTES}
@@ -0,0 +1,99 @@
+import os
+import asyncio
+from youtube_tools.db_commands import get_transcript_chunks, save_transcript_chunk
+from tools.audio import get_audio_format, probe_duration, detect_silences, plan_chunks, extract_audio_segment
+from tools.audio_store import get_staging_path, hash_file
+from tools.transcription import transcribe
+from tools.workers import run_in_stage
+
+# Audio longer than this is split on silence into chunks of at most this many seconds
+# and the chunks are transcribed concurrently. 0 disables chunking.
+TRANSCRIPTION_CHUNK_SECONDS = float(os.getenv("TRANSCRIPTION_CHUNK_SECONDS", "300"))
+# Chunks of one file transcribed at the same time. The transcription pool in
+# tools/workers.py still bounds the total across all files.
+TRANSCRIPTION_CHUNK_WORKERS = int(os.getenv("TRANSCRIPTION_CHUNK_WORKERS", "4"))
+
+def format_timestamp(seconds: float) -> str:
+    """Formats seconds as m:ss, or h:mm:ss past an hour."""
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
+
+def _transcript_text(result):
+    """Returns the text of a transcription API result (a string, or a dict with a 'text' field)."""
+    if isinstance(result, dict):
+        return result.get("text")
+    return result
+
+def stitch_transcript(chunk_transcripts) -> str:
+    """Joins (start, end, text) chunk transcripts into one transcript, each chunk prefixed with its start time."""
+    return "\n".join(f"[{format_timestamp(start)}] {text.strip()}" for start, _, text in chunk_transcripts)
+
+async def transcribe_chunked(audio_path: str, cache_key: str = None):
+    """
+    Transcribes an audio file, splitting long audio into chunks.
+
+    Audio up to TRANSCRIPTION_CHUNK_SECONDS is sent in one request, as before. Longer
+    audio is cut at silences into chunks of at most that length, which are transcribed
+    with up to TRANSCRIPTION_CHUNK_WORKERS in flight and stitched back together with
+    [mm:ss] timestamps. Finished chunks are cached under `cache_key` (default: the
+    file's SHA-256), so retrying after a failure only redoes the failed chunks.
+
+    Returns the transcript, or None if any chunk failed.
+    """
+    if TRANSCRIPTION_CHUNK_SECONDS <= 0:
+        return await transcribe(audio_path)
+
+    # The header says how long the audio is without decoding it, so short clips (most
+    # Shorts and TikToks) skip the full decode silence detection needs
+    try:
+        duration = await run_in_stage("audio", probe_duration, audio_path)
+    except Exception as e:
+        print(f"Could not read the duration of {audio_path}: {e}")
+        duration = None
+    if duration is not None and duration <= TRANSCRIPTION_CHUNK_SECONDS:
+        return await transcribe(audio_path)
+
+    try:
+        duration, silences = await run_in_stage("audio", detect_silences, audio_path)
+    except Exception as e:
+        print(f"Could not detect silences in {audio_path}, transcribing it whole: {e}")
+        return await transcribe(audio_path)
+
+    if duration <= TRANSCRIPTION_CHUNK_SECONDS:
+        return await transcribe(audio_path)
+
+    chunks = [(round(start, 3), round(end, 3)) for start, end in plan_chunks(duration, silences, TRANSCRIPTION_CHUNK_SECONDS)]
+    cache_key = cache_key or await run_in_stage("audio", hash_file, audio_path)
+    finished = get_transcript_chunks(cache_key)
+    print(f"Transcribing {audio_path} ({duration:.0f}s) in {len(chunks)} chunks, {sum(chunk in finished for chunk in chunks)} already done")
+
+    semaphore = asyncio.Semaphore(TRANSCRIPTION_CHUNK_WORKERS)
+    extension = get_audio_format()["extension"]
+
+    async def transcribe_chunk(start: float, end: float):
+        if (start, end) in finished:
+            return finished[(start, end)]
+        async with semaphore:
+            chunk_path = get_staging_path(extension)
+            try:
+                await run_in_stage("audio", extract_audio_segment, audio_path, chunk_path, start, end)
+                text = _transcript_text(await transcribe(chunk_path))
+            except Exception as e:
+                print(f"Error transcribing chunk {start:.1f}-{end:.1f}s of {audio_path}: {e}")
+                return None
+            finally:
+                if os.path.exists(chunk_path):
+                    os.remove(chunk_path)
+        if text:
+            save_transcript_chunk(cache_key, start, end, text)
+        return text
+
+    texts = await asyncio.gather(*(transcribe_chunk(start, end) for start, end in chunks))
+    failed = sum(1 for text in texts if not text)
+    if failed:
+        print(f"{failed} of {len(chunks)} chunks of {audio_path} failed to transcribe; finished chunks are cached for the retry")
+        return None
+    return stitch_transcript((start, end, text) for (start, end), text in zip(chunks, texts))
@@ -0,0 +1,370 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+import numpy as np
+
+# Add the parent directory to sys.path so this module can also be run as a script
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+from google.genai import types
+from youtube_tools.db_commands import get_embedding_rows, get_embedding_row_count, save_embedding_rows, get_embedding_candidates
+from tools.rate_limit import RateLimiter
+from tools.summarize import client, gemini_call
+from tools.workers import run_in_stage
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-004")
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "768"))
+# Texts per embedding request (the API's batch limit is 100)
+EMBEDDING_BATCH_SIZE = 100
+EMBEDDING_RPM = float(os.getenv("EMBEDDING_RPM", "1500"))
+# Characters of transcript embedded when a video has no summary
+EMBEDDING_MAX_CHARS = 8000
+
+# Vectors live in a float16 memory-mapped file, one row per video (row numbers are kept in SQLite)
+if os.path.exists('/db/cache/'):
+    EMBEDDINGS_DIR = "/db/cache/embeddings"
+else:
+    EMBEDDINGS_DIR = "embeddings"
+
+# Above this many vectors, searches probe an inverted-file (IVF) index instead of scanning every row
+EMBEDDING_ANN_THRESHOLD = int(os.getenv("EMBEDDING_ANN_THRESHOLD", "50000"))
+# Clusters searched per query with the IVF index; more is slower but finds more true neighbours
+EMBEDDING_ANN_PROBES = int(os.getenv("EMBEDDING_ANN_PROBES", "8"))
+# Rows scored per matrix multiply in exact search, to bound the float32 working set
+SEARCH_CHUNK_ROWS = 16384
+# How often (seconds) the index checks SQLite for rows another process (e.g. the
+# `python tools/embeddings.py` CLI next to the server) has added
+EMBEDDING_RELOAD_INTERVAL = 30
+
+rate_limiter = RateLimiter(EMBEDDING_RPM)
+
+def embedding_text(title: str, summary: str = None, transcript: str = None) -> str:
+    """The text embedded for a video: its title plus summary (or the start of its transcript)."""
+    body = summary or (transcript or "")[:EMBEDDING_MAX_CHARS]
+    return f"{title or ''}\n{body}".strip()
+
+def embed_texts(texts: list[str]) -> np.ndarray:
+    """Embeds texts with the Gemini embedding model (blocking). Returns unit-length float32 rows."""
+    vectors = []
+    for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+        rate_limiter.acquire()
+        response = gemini_call(
+            client.models.embed_content,
+            model=EMBEDDING_MODEL,
+            contents=texts[start:start + EMBEDDING_BATCH_SIZE],
+            config=types.EmbedContentConfig(output_dimensionality=EMBEDDING_DIMENSIONS),
+        )
+        vectors.extend(embedding.values for embedding in response.embeddings)
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+def _top_k(scores: np.ndarray, rows: np.ndarray, k: int):
+    if len(scores) > k:
+        best = np.argpartition(-scores, k)[:k]
+        scores, rows = scores[best], rows[best]
+    order = np.argsort(-scores)
+    return rows[order], scores[order]
+
+class EmbeddingIndex:
+    """
+    Unit-length video embeddings in a float16 memmap, with cosine top-k search.
+
+    Small vaults are searched exactly with chunked matrix multiplies. Once the index
+    holds EMBEDDING_ANN_THRESHOLD vectors, an IVF index (k-means clusters over the
+    vectors) is built in memory by a background thread and each query only scores the
+    rows of the EMBEDDING_ANN_PROBES nearest clusters, plus any rows added since the
+    last build.
+    """
+
+    def __init__(self, directory: str = None, dimensions: int = None):
+        self.directory = directory or EMBEDDINGS_DIR
+        self.dimensions = dimensions or EMBEDDING_DIMENSIONS
+        self._lock = threading.RLock()
+        self._matrix = None
+        self._capacity = 0
+        self._row_to_video = []
+        self._video_to_row = {}
+        self._ivf = None
+        self._ivf_building = False
+        self._checked_at = 0.0
+
+    @property
+    def _path(self) -> str:
+        return os.path.join(self.directory, f"vectors_{self.dimensions}.f16")
+
+    def load(self):
+        """
+        Opens the vector file and reads the video -> row mapping from SQLite (once), then
+        every EMBEDDING_RELOAD_INTERVAL seconds picks up rows added by other processes.
+        """
+        with self._lock:
+            if self._matrix is not None:
+                if time.monotonic() - self._checked_at > EMBEDDING_RELOAD_INTERVAL:
+                    self._checked_at = time.monotonic()
+                    if get_embedding_row_count() > len(self._row_to_video):
+                        self._read_rows()
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            self._read_rows()
+
+    def _read_rows(self):
+        """(Re)reads the video -> row mapping from SQLite and maps the whole vector file."""
+        rows = get_embedding_rows()
+        self._row_to_video = [None] * (max((row for _, row, _ in rows), default=-1) + 1)
+        self._video_to_row = {}
+        for video_id, row, model in rows:
+            self._row_to_video[row] = video_id
+            self._video_to_row[video_id] = row
+        other_models = sum(model != EMBEDDING_MODEL for _, _, model in rows)
+        if other_models:
+            print(f"Warning: {other_models} stored embeddings come from another model than {EMBEDDING_MODEL}; "
+                  f"run `python tools/embeddings.py` to re-embed them.")
+        existing_rows = os.path.getsize(self._path) // (2 * self.dimensions) if os.path.exists(self._path) else 0
+        self._open(max(existing_rows, len(self._row_to_video), self._capacity, 1024))
+        self._checked_at = time.monotonic()
+
+    def _open(self, capacity: int):
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        with open(self._path, "ab") as f:
+            if f.tell() < capacity * 2 * self.dimensions:
+                f.truncate(capacity * 2 * self.dimensions)
+        self._matrix = np.memmap(self._path, dtype=np.float16, mode="r+", shape=(capacity, self.dimensions))
+        self._capacity = capacity
+
+    def __len__(self):
+        return len(self._row_to_video)
+
+    def add(self, video_ids: list[str], vectors: np.ndarray, content_hashes: list[str] = None):
+        """Stores (or replaces) the vectors of the given videos."""
+        self.load()
+        with self._lock:
+            def write_vectors(rows):
+                if max(rows) >= self._capacity:
+                    self._open(max(self._capacity * 2, max(rows) + 1))
+                for row, vector in zip(rows, vectors):
+                    self._matrix[row] = vector
+                self._matrix.flush()
+
+            # Rows come from SQLite, so another process adding vectors at the same time
+            # can't be handed the same ones
+            entries = [(video_id, EMBEDDING_MODEL, content_hashes[i] if content_hashes else None) for i, video_id in enumerate(video_ids)]
+            rows = save_embedding_rows(entries, write_vectors)
+            if rows is None:
+                return
+            known_rows = len(self._row_to_video)
+            for video_id, row in zip(video_ids, rows):
+                if row >= len(self._row_to_video):
+                    self._row_to_video.extend([None] * (row + 1 - len(self._row_to_video)))
+                self._row_to_video[row] = video_id
+                self._video_to_row[video_id] = row
+            # Rows skipped over were allocated by another process since the map was read
+            if None in self._row_to_video[known_rows:]:
+                self._read_rows()
+
+    def vector(self, video_id: str):
+        """Returns a video's vector (float32), or None if it has none."""
+        self.load()
+        row = self._video_to_row.get(video_id)
+        return None if row is None else np.asarray(self._matrix[row], dtype=np.float32)
+
+    def _exact(self, query: np.ndarray, rows: np.ndarray, k: int):
+        best_rows, best_scores = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        for start in range(0, len(rows), SEARCH_CHUNK_ROWS):
+            chunk = rows[start:start + SEARCH_CHUNK_ROWS]
+            if len(chunk) and chunk[-1] - chunk[0] == len(chunk) - 1:
+                # Contiguous rows: slice the memmap instead of gathering
+                vectors = self._matrix[chunk[0]:chunk[-1] + 1]
+            else:
+                vectors = self._matrix[chunk]
+            scores = vectors.astype(np.float32) @ query
+            best_rows, best_scores = _top_k(np.concatenate([best_scores, scores]), np.concatenate([best_rows, chunk]), k)
+        return best_rows, best_scores
+
+    def _exact_many(self, queries: np.ndarray, k: int):
+        """
+        Exact top-k over every row for a batch of queries at once: each chunk of the file
+        is converted to float32 once and scored against all queries in one multiply.
+        Returns (rows, scores) arrays of shape (queries, k), best first.
+        """
+        count = len(self)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, count, SEARCH_CHUNK_ROWS):
+            vectors = np.asarray(self._matrix[start:min(start + SEARCH_CHUNK_ROWS, count)], dtype=np.float32)
+            scores = np.concatenate([best_scores, queries @ vectors.T], axis=1)
+            rows = np.concatenate([best_rows, np.broadcast_to(np.arange(start, start + len(vectors)), (len(queries), len(vectors)))], axis=1)
+            if scores.shape[1] > k:
+                best = np.argpartition(-scores, k, axis=1)[:, :k]
+                scores, rows = np.take_along_axis(scores, best, axis=1), np.take_along_axis(rows, best, axis=1)
+            best_rows, best_scores = rows, scores
+        order = np.argsort(-best_scores, axis=1)
+        return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    def build_ivf(self, iterations: int = 10, seed: int = 0):
+        """
+        (Re)builds the IVF index: k-means over a sample of the vectors, then every row
+        assigned to its nearest centroid. The rows are snapshotted under the lock and the
+        clustering runs without it, so searches carry on during a build.
+        """
+        self.load()
+        with self._lock:
+            count = len(self)
+            matrix = self._matrix
+        lists = max(1, int(np.sqrt(count)))
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(count, size=min(count, lists * 40), replace=False))
+        data = np.asarray(matrix[sample], dtype=np.float32)
+        centroids = data[rng.choice(len(data), size=lists, replace=False)]
+        for _ in range(iterations):
+            labels = np.argmax(data @ centroids.T, axis=1)
+            for cluster in range(lists):
+                members = data[labels == cluster]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[cluster] = centroid / (np.linalg.norm(centroid) or 1)
+
+        labels = np.empty(count, dtype=np.int32)
+        for start in range(0, count, SEARCH_CHUNK_ROWS):
+            vectors = np.asarray(matrix[start:start + SEARCH_CHUNK_ROWS], dtype=np.float32)[:count - start]
+            labels[start:start + len(vectors)] = np.argmax(vectors @ centroids.T, axis=1)
+        order = np.argsort(labels, kind="stable")
+        offsets = np.searchsorted(labels[order], np.arange(lists + 1))
+        with self._lock:
+            self._ivf = {"centroids": centroids, "order": order, "offsets": offsets, "size": count}
+        print(f"Built IVF embedding index: {count} vectors in {lists} clusters")
+
+    def _build_ivf_in_background(self):
+        try:
+            self.build_ivf()
+        except Exception as e:
+            print(f"Error building IVF embedding index: {e}")
+        finally:
+            self._ivf_building = False
+
+    def _candidate_rows(self, query: np.ndarray) -> np.ndarray:
+        count = len(self)
+        if count < EMBEDDING_ANN_THRESHOLD:
+            return np.arange(count)
+        # (Re)build once the vault has grown by a quarter since the last build, in the
+        # background: until it is ready, queries use the previous index or an exact scan
+        if (self._ivf is None or count > self._ivf["size"] * 1.25) and not self._ivf_building:
+            self._ivf_building = True
+            threading.Thread(target=self._build_ivf_in_background, name="ivf-build", daemon=True).start()
+        ivf = self._ivf
+        if ivf is None:
+            return np.arange(count)
+        probes = np.argsort(-(ivf["centroids"] @ query))[:EMBEDDING_ANN_PROBES]
+        rows = [ivf["order"][ivf["offsets"][cluster]:ivf["offsets"][cluster + 1]] for cluster in probes]
+        # Rows added since the build aren't in any cluster yet, so always scan them
+        rows.append(np.arange(ivf["size"], count))
+        return np.sort(np.concatenate(rows))
+
+    def search(self, query: np.ndarray, k: int = 10, exclude: str = None):
+        """Returns up to k (video_id, cosine similarity) pairs most similar to the query vector."""
+        self.load()
+        with self._lock:
+            if not len(self):
+                return []
+            query = np.asarray(query, dtype=np.float32)
+            rows, scores = self._exact(query, self._candidate_rows(query), k + (1 if exclude else 0))
+            results = [(self._row_to_video[row], float(score)) for row, score in zip(rows, scores)]
+        # Rows without a video (not yet read from another process's writes) are dropped
+        return [(video_id, score) for video_id, score in results if video_id is not None and video_id != exclude][:k]
+
+    def related(self, video_id: str, k: int = 10):
+        """Returns up to k (video_id, similarity) pairs for the videos most similar to video_id, or None if it isn't indexed."""
+        vector = self.vector(video_id)
+        if vector is None:
+            return None
+        return self.search(vector, k, exclude=video_id)
+
+    def edges(self, k: int = 5, min_score: float = 0.75, offset: int = 0, limit: int = 100):
+        """
+        Returns similarity edges for the knowledge graph from a page of `limit` source
+        videos (in row order, starting at `offset`): each linked to its k nearest neighbours
+        scoring at least min_score, as (source, target, score) with every pair listed once
+        per page. Also returns the offset of the next page, or None after the last one.
+        """
+        self.load()
+        with self._lock:
+            video_ids = [video_id for video_id in self._row_to_video[offset:offset + limit] if video_id]
+            next_offset = offset + limit if offset + limit < len(self) else None
+            if not video_ids:
+                return [], next_offset
+            # Exact search for the whole page in one pass over the file: faster than one IVF
+            # query per video, and exact
+            queries = np.asarray(self._matrix[[self._video_to_row[video_id] for video_id in video_ids]], dtype=np.float32)
+            rows, scores = self._exact_many(queries, k + 1)
+            neighbours = [
+                [(self._row_to_video[row], float(score)) for row, score in zip(rows[i], scores[i]) if self._row_to_video[row] not in (None, video_id)][:k]
+                for i, video_id in enumerate(video_ids)
+            ]
+        edges = {}
+        for video_id, related in zip(video_ids, neighbours):
+            for other_id, score in related:
+                if other_id and score >= min_score:
+                    pair = tuple(sorted((video_id, other_id)))
+                    edges[pair] = max(score, edges.get(pair, 0))
+        return [(source, target, score) for (source, target), score in edges.items()], next_offset
+
+embedding_index = EmbeddingIndex()
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(f"{EMBEDDING_MODEL}\0{text}".encode()).hexdigest()
+
+def index_video(video_id: str, title: str, summary: str = None, transcript: str = None):
+    """Embeds one video and stores its vector (blocking). Errors are logged, not raised."""
+    text = embedding_text(title, summary, transcript)
+    if not text:
+        return
+    try:
+        embedding_index.add([video_id], embed_texts([text]), [content_hash(text)])
+    except Exception as e:
+        print(f"Error embedding video {video_id}: {e}")
+
+async def embed_video(video_id: str, title: str, summary: str = None, transcript: str = None):
+    """Embeds a freshly ingested video on the embedding pool."""
+    await run_in_stage("embedding", index_video, video_id, title, summary, transcript)
+
+def index_stale_videos(batch_size: int = EMBEDDING_BATCH_SIZE):
+    """
+    Embeds every cached video with a summary or transcript whose vector is missing or
+    out of date: made by another EMBEDDING_MODEL or from text that has changed since
+    (compared through content_hash). Returns the number indexed.
+    """
+    indexed = 0
+    after_id = 0
+    while True:
+        videos = get_embedding_candidates(after_id, batch_size)
+        if not videos:
+            return indexed
+        after_id = videos[-1][0]
+        stale = []
+        for _, video_id, title, summary, transcript, stored_hash in videos:
+            text = embedding_text(title, summary, transcript)
+            if text and stored_hash != content_hash(text):
+                stale.append((video_id, text))
+        if not stale:
+            continue
+        texts = [text for _, text in stale]
+        embedding_index.add([video_id for video_id, _ in stale], embed_texts(texts), [content_hash(text) for text in texts])
+        indexed += len(stale)
+        print(f"Embedded {indexed} videos")
+
+def get_embedding_stats():
+    """Returns the number of indexed vectors and whether the approximate (IVF) index is in use."""
+    embedding_index.load()
+    return {"vectors": len(embedding_index), "approximate": int(len(embedding_index) >= EMBEDDING_ANN_THRESHOLD)}
+
+# Run directly to embed videos cached before the index existed, or re-embed changed
+# summaries and vectors of a previous EMBEDDING_MODEL
+if __name__ == "__main__":
+    print(f"Indexed {index_stale_videos()} videos")
+    print(json.dumps(get_embedding_stats()))
@@ -0,0 +1,314 @@
+import os
+import time
+import random
+import threading
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from tools.metrics import observe
+
+# Keep-alive connections kept open per host, and hosts with a pool
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+HTTP_POOL_HOSTS = int(os.getenv("HTTP_POOL_HOSTS", "16"))
+# Requests in flight to one host; further callers wait for a slot. Override per host
+# with HTTP_HOST_LIMITS, e.g. "www.googleapis.com=4,example.modal.run=2".
+HTTP_MAX_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", "8"))
+HTTP_HOST_LIMITS = {
+    host.strip(): int(limit)
+    for host, _, limit in (pair.partition("=") for pair in os.getenv("HTTP_HOST_LIMITS", "").split(",") if "=" in pair)
+}
+# Retries of connection errors, timeouts and RETRYABLE_STATUS_CODES, with full-jitter
+# exponential backoff (a random delay up to base * 2^attempt, capped)
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_RETRY_BASE_DELAY = float(os.getenv("HTTP_RETRY_BASE_DELAY", "0.25"))
+HTTP_RETRY_MAX_DELAY = float(os.getenv("HTTP_RETRY_MAX_DELAY", "10"))
+# After this many consecutive failures a host's circuit opens: calls fail at once for
+# HTTP_BREAKER_RESET seconds, then a single probe call decides whether it closes again
+HTTP_BREAKER_FAILURES = int(os.getenv("HTTP_BREAKER_FAILURES", "5"))
+HTTP_BREAKER_RESET = float(os.getenv("HTTP_BREAKER_RESET", "30"))
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without calling a host whose circuit breaker is open."""
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """Raised when a call's deadline passes before it got an answer (including retries)."""
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker: closed -> open after `failure_threshold`
+    failures in a row, open -> half-open after `reset_timeout` seconds, where one probe
+    call is let through; it closes the circuit if it succeeds and reopens it if not.
+    """
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def rejecting(self) -> bool:
+        """Whether the circuit is open and not yet due for a probe (a cheap check before waiting for a slot)."""
+        with self._lock:
+            return self.state == self.OPEN and time.monotonic() - self._opened_at < self.reset_timeout
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now. In the half-open state only one probe is allowed."""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+class FairSlots:
+    """
+    Counting semaphore that hands freed slots to waiters in arrival order. With
+    threading.Semaphore a thread that releases a slot can take it straight back,
+    starving the callers queued behind it.
+    """
+
+    def __init__(self, value: int):
+        self._value = value
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: float = None) -> bool:
+        with self._lock:
+            if self._value > 0 and not self._waiters:
+                self._value -= 1
+                return True
+            waiter = threading.Event()
+            self._waiters.append(waiter)
+        if waiter.wait(timeout):
+            return True
+        with self._lock:
+            if waiter.is_set(): # Handed a slot just as the wait timed out
+                return True
+            self._waiters.remove(waiter)
+            return False
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                self._waiters.popleft().set()
+            else:
+                self._value += 1
+
+class HostState:
+    """Concurrency cap, circuit breaker and counters for one outbound host."""
+
+    def __init__(self, host: str):
+        self.host = host
+        self.limit = HTTP_HOST_LIMITS.get(host, HTTP_MAX_PER_HOST)
+        self.slots = FairSlots(self.limit)
+        self.breaker = CircuitBreaker(HTTP_BREAKER_FAILURES, HTTP_BREAKER_RESET)
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "short_circuited": 0, "deadline_exceeded": 0, "in_flight": 0}
+        self._lock = threading.Lock()
+
+    def count(self, **counts):
+        with self._lock:
+            for key, value in counts.items():
+                self.stats[key] += value
+
+_hosts = {}
+_hosts_lock = threading.Lock()
+
+def get_host_state(host: str) -> HostState:
+    with _hosts_lock:
+        if host not in _hosts:
+            _hosts[host] = HostState(host)
+        return _hosts[host]
+
+def _make_session() -> requests.Session:
+    session = requests.Session()
+    # Retries are done here rather than by urllib3, so they honour deadlines and breakers
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_SIZE, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+# One session per process, so connections to each host are reused across calls and threads
+_session = _make_session()
+
+def _remaining(give_up_at):
+    return None if give_up_at is None else give_up_at - time.monotonic()
+
+def _short_circuit(state: HostState):
+    state.count(short_circuited=1)
+    return CircuitOpenError(f"Circuit open for {state.host} after {state.breaker.failures} consecutive failures")
+
+def _acquire(state: HostState, give_up_at):
+    """Takes one of the host's slots, failing fast if its circuit is open."""
+    if state.breaker.rejecting():
+        raise _short_circuit(state)
+    remaining = _remaining(give_up_at)
+    if not state.slots.acquire(timeout=None if remaining is None else max(remaining, 0)):
+        state.count(deadline_exceeded=1)
+        raise DeadlineExceeded(f"Deadline passed waiting for a connection slot to {state.host}")
+    # Checked again with the slot held: in the half-open state this claims the one probe
+    if not state.breaker.allow():
+        state.slots.release()
+        raise _short_circuit(state)
+    state.count(requests=1, in_flight=1)
+
+def _release(state: HostState, failed: bool):
+    state.slots.release()
+    state.count(in_flight=-1, failures=int(failed))
+    if failed:
+        state.breaker.record_failure()
+    else:
+        state.breaker.record_success()
+
+@contextmanager
+def host_guard(host: str, is_failure=None, deadline: float = None):
+    """
+    Runs its body as one call to `host` under the host's concurrency cap and circuit
+    breaker, for clients that don't go through http_request (e.g. the Gemini SDK).
+    An exception counts as a failure unless is_failure(exception) returns False.
+    """
+    state = get_host_state(host)
+    _acquire(state, time.monotonic() + deadline if deadline else None)
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        _release(state, failed=is_failure is None or bool(is_failure(e)))
+        raise
+    else:
+        _release(state, failed=False)
+    finally:
+        observe("brainrot_outbound_request_duration_seconds", time.perf_counter() - start, host=host)
+
+def _retry_delay(attempt: int, response):
+    """
+    Full-jitter backoff, or the server's Retry-After if that is longer. Returns None when
+    Retry-After exceeds HTTP_RETRY_MAX_DELAY: retrying sooner is pointless, and waiting
+    would park a pool thread for as long as the server likes.
+    """
+    delay = random.uniform(0, min(HTTP_RETRY_MAX_DELAY, HTTP_RETRY_BASE_DELAY * 2 ** attempt))
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        if float(retry_after) > HTTP_RETRY_MAX_DELAY:
+            return None
+        delay = max(delay, float(retry_after))
+    return delay
+
+def _rewind(files):
+    """Seeks file objects in a multipart upload back to the start before a retry."""
+    for value in (files or {}).values():
+        if hasattr(value, "seek"):
+            value.seek(0)
+
+def http_request(method: str, url: str, timeout: float = 30, deadline: float = None, retries: int = None,
+                 idempotent: bool = None, **kwargs) -> requests.Response:
+    """
+    Sends a request over the shared connection pool, like requests.request.
+
+    Args:
+        timeout: Seconds allowed per attempt (connect and each read).
+        deadline: Seconds allowed for the whole call, including waiting for a slot and retries.
+        retries: Retries of connection errors, timeouts and 429/5xx answers. Defaults to
+            HTTP_MAX_RETRIES for idempotent calls and 0 otherwise.
+        idempotent: Whether the call is safe to repeat. Defaults to True for GET, HEAD,
+            OPTIONS, PUT and DELETE.
+
+    Returns the last response, even with an error status (call raise_for_status()).
+    Raises requests exceptions: CircuitOpenError if the host's circuit is open,
+    DeadlineExceeded when the deadline passes, or the last connection error/timeout.
+    """
+    host = urlsplit(url).netloc
+    state = get_host_state(host)
+    if idempotent is None:
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+    if retries is None:
+        retries = HTTP_MAX_RETRIES if idempotent else 0
+    give_up_at = time.monotonic() + deadline if deadline else None
+
+    for attempt in range(retries + 1):
+        remaining = _remaining(give_up_at)
+        if remaining is not None and remaining <= 0:
+            state.count(deadline_exceeded=1)
+            raise DeadlineExceeded(f"Deadline of {deadline}s passed calling {host} ({attempt} attempt(s))")
+        _rewind(kwargs.get("files"))
+        _acquire(state, give_up_at)
+        start = time.perf_counter()
+        response = error = None
+        try:
+            response = _session.request(method, url, timeout=timeout if remaining is None else min(timeout, remaining), **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            error = e
+            _release(state, failed=True)
+        except requests.exceptions.RequestException:
+            _release(state, failed=False) # A bad request, not a sick host
+            raise
+        else:
+            # 429 means out of quota rather than down, so it doesn't count against the breaker
+            _release(state, failed=response.status_code >= 500)
+        observe("brainrot_outbound_request_duration_seconds", time.perf_counter() - start, host=host)
+
+        if response is not None and response.status_code not in RETRYABLE_STATUS_CODES:
+            return response
+        delay = _retry_delay(attempt, response)
+        remaining = _remaining(give_up_at)
+        if delay is None:
+            print(f"{method} {host} answered {response.status_code} with Retry-After {response.headers['Retry-After']}s, not retrying")
+            return response
+        if attempt == retries:
+            if response is not None:
+                return response
+            raise error
+        if remaining is not None and delay >= remaining:
+            if response is not None:
+                return response
+            state.count(deadline_exceeded=1)
+            raise DeadlineExceeded(f"Deadline of {deadline}s passed calling {host} ({attempt + 1} attempt(s))") from error
+        state.count(retries=1)
+        print(f"{method} {host} failed ({error or response.status_code}), retrying in {delay:.2f}s (attempt {attempt + 1}/{retries})")
+        time.sleep(delay)
+
+def http_get(url: str, **kwargs) -> requests.Response:
+    return http_request("GET", url, **kwargs)
+
+def http_post(url: str, **kwargs) -> requests.Response:
+    return http_request("POST", url, **kwargs)
+
+def get_http_client_stats():
+    """Returns {host: counters plus circuit state and slot limit} for every host called so far."""
+    with _hosts_lock:
+        states = list(_hosts.values())
+    stats = {}
+    for state in states:
+        with state._lock:
+            stats[state.host] = {
+                **state.stats,
+                "limit": state.limit,
+                "circuit_open": int(state.breaker.state != CircuitBreaker.CLOSED),
+            }
+    return stats
@@ -0,0 +1,137 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+
+# Add the parent directory to sys.path so this module can also be run as a script
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+from youtube_tools.db_commands import init_db, get_response_fetched_at, get_stale_video_ids
+from tools.workers import run_in_stage
+
+# How long (seconds) cached metadata is served before it is refreshed in the background,
+# per source. 0 disables refreshing. TikTok has no metadata-only API (pyktok downloads the
+# whole video), so its cached responses are kept as they are.
+METADATA_TTL = {
+    "youtube": float(os.getenv("YOUTUBE_METADATA_TTL", "86400")),
+}
+# Stale videos read within this many seconds of each other are refreshed in one API call
+METADATA_REFRESH_WINDOW = float(os.getenv("METADATA_REFRESH_WINDOW", "2"))
+# The YouTube Data API videos endpoint accepts at most 50 ids per call
+REFRESH_BATCH_SIZE = 50
+
+# Refresh outcomes per video (refreshed = changed and rewritten, unchanged = same item ETag,
+# not_modified = whole batch answered 304, missing = no longer returned by the API), plus
+# refresh API calls and failures. quota_units counts YouTube Data API units by purpose.
+refresh_stats = {"scheduled": 0, "refreshed": 0, "unchanged": 0, "not_modified": 0, "missing": 0, "api_calls": 0, "errors": 0}
+quota_units = {"fetch": 0, "refresh": 0}
+_stats_lock = threading.Lock()
+
+# Videos waiting for a refresh, or being refreshed (insertion-ordered dicts used as sets)
+_pending = {}
+_in_progress = set()
+_pending_lock = threading.Lock()
+_wakeup = None
+_loop = None
+_worker_task = None
+
+def count_refresh(**counts):
+    with _stats_lock:
+        for key, value in counts.items():
+            refresh_stats[key] += value
+
+def record_quota(units: int, purpose: str):
+    """Counts YouTube Data API quota units spent, for 'fetch' (cache misses) or 'refresh'."""
+    with _stats_lock:
+        quota_units[purpose] += units
+
+def is_stale(source: str, fetched_at: float) -> bool:
+    ttl = METADATA_TTL.get(source)
+    return bool(ttl) and fetched_at is not None and time.time() - fetched_at > ttl
+
+def refresh_if_stale(source: str, video_id: str):
+    """Schedules a background refresh of a cached video whose metadata is past its TTL. Thread-safe."""
+    if not METADATA_TTL.get(source) or not is_stale(source, get_response_fetched_at(video_id)):
+        return
+    with _pending_lock:
+        if video_id in _pending or video_id in _in_progress:
+            return
+        _pending[video_id] = None
+    count_refresh(scheduled=1)
+    if _loop is not None:
+        # Usually called from a metadata worker thread, not the event loop
+        _loop.call_soon_threadsafe(_wakeup.set)
+
+def _take_batch():
+    with _pending_lock:
+        video_ids = list(_pending)[:REFRESH_BATCH_SIZE]
+        for video_id in video_ids:
+            del _pending[video_id]
+        _in_progress.update(video_ids)
+        return video_ids
+
+async def refresh_worker():
+    """Refreshes scheduled videos in batches of up to REFRESH_BATCH_SIZE, one API call each."""
+    # Imported here: ytshorts_pull imports this module to schedule refreshes
+    from youtube_tools.ytshorts_pull import refresh_youtube_videos
+    while True:
+        await _wakeup.wait()
+        # Let other stale reads join the batch unless it is already full
+        if len(_pending) < REFRESH_BATCH_SIZE:
+            await asyncio.sleep(METADATA_REFRESH_WINDOW)
+        _wakeup.clear()
+        video_ids = _take_batch()
+        if _pending:
+            _wakeup.set()
+        if not video_ids:
+            continue
+        try:
+            await run_in_stage("metadata", refresh_youtube_videos, video_ids)
+        except Exception as e:
+            count_refresh(errors=1)
+            print(f"Metadata refresh of {len(video_ids)} video(s) failed: {e}")
+        finally:
+            with _pending_lock:
+                _in_progress.difference_update(video_ids)
+
+def start_metadata_refresh():
+    """Starts the background refresh worker on the running event loop."""
+    global _wakeup, _loop, _worker_task
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    _worker_task = asyncio.create_task(refresh_worker())
+    if _pending:
+        _wakeup.set()
+
+async def stop_metadata_refresh():
+    """Cancels the refresh worker. Pending refreshes are dropped; the videos are rescheduled when next read."""
+    global _loop, _worker_task
+    if _worker_task is None:
+        return
+    _worker_task.cancel()
+    await asyncio.gather(_worker_task, return_exceptions=True)
+    _loop = _worker_task = None
+
+def get_metadata_refresh_stats():
+    """Returns refresh counters, quota units spent per purpose and the number of videos waiting."""
+    with _stats_lock:
+        return {
+            **refresh_stats,
+            **{f"quota_units_{purpose}": units for purpose, units in quota_units.items()},
+            "pending": len(_pending),
+        }
+
+def refresh_stale_videos(limit: int = 5000):
+    """Refreshes up to `limit` stale cached YouTube videos now, oldest first (blocking)."""
+    from youtube_tools.ytshorts_pull import refresh_youtube_videos
+    video_ids = get_stale_video_ids("youtube", METADATA_TTL["youtube"], limit)
+    for start in range(0, len(video_ids), REFRESH_BATCH_SIZE):
+        refresh_youtube_videos(video_ids[start:start + REFRESH_BATCH_SIZE])
+    return len(video_ids)
+
+if __name__ == "__main__":
+    init_db()
+    print(f"Checked {refresh_stale_videos()} stale videos")
+    print(get_metadata_refresh_stats())
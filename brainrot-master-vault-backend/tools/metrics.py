@@ -0,0 +1,157 @@
+import os
+import time
+import bisect
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets. Spans fast SQLite lookups
+# up to multi-minute transcriptions.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Add a Server-Timing header with per-stage durations to every response
+TIMING_HEADERS = os.getenv("TIMING_HEADERS", "false").lower() in ("1", "true", "yes")
+
+_lock = threading.Lock()
+# (metric name, labels) -> [bucket counts..., sum, count]
+_histograms = {}
+# (metric name, labels) -> value
+_counters = {}
+# Extra gauges computed at scrape time: name -> (help, callable returning {labels: value})
+_gauge_collectors = {}
+
+_help = {
+    "brainrot_stage_duration_seconds": "Time spent in each pipeline stage.",
+    "brainrot_http_request_duration_seconds": "HTTP request latency by route.",
+    "brainrot_http_requests_total": "HTTP requests by route and status code.",
+    "brainrot_cache_lookups_total": "Cache lookups by column and result (hit or miss).",
+    "brainrot_transcriptions_saved_total": "Transcription calls skipped by reusing the transcript of identical audio.",
+    "brainrot_outbound_request_duration_seconds": "Latency of calls to external APIs by host, per attempt.",
+    "brainrot_transcription_seconds_saved_total": "Seconds of audio not transcribed thanks to transcript reuse.",
+}
+
+# Per-request list of (stage, seconds), set by the timing middleware
+request_timings = contextvars.ContextVar("request_timings", default=None)
+
+def _labels_key(labels: dict):
+    return tuple(sorted(labels.items()))
+
+def observe(name: str, seconds: float, **labels):
+    """Records one observation in the named latency histogram."""
+    key = (name, _labels_key(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+        index = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        if index < len(LATENCY_BUCKETS):
+            histogram[index] += 1
+        histogram[-2] += seconds
+        histogram[-1] += 1
+
+def increment(name: str, amount: float = 1, **labels):
+    """Adds amount to the named counter."""
+    key = (name, _labels_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+def observe_stage(stage: str, seconds: float):
+    """Records a pipeline stage duration in the histogram and the current request's timings."""
+    observe("brainrot_stage_duration_seconds", seconds, stage=stage)
+    timings = request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+@contextmanager
+def time_stage(stage: str):
+    """Context manager that records how long its body takes as the given stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+def timed(stage: str):
+    """Decorator that records every call of a (synchronous) function as the given stage."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with time_stage(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record_cache_lookup(column: str, hit: bool):
+    """Counts a cache lookup of the given column as a hit or a miss."""
+    increment("brainrot_cache_lookups_total", column=column, result="hit" if hit else "miss")
+
+def register_gauges(name: str, help_text: str, collect):
+    """
+    Registers a gauge whose values are computed at scrape time. `collect` returns a
+    dict of labels dict (as a tuple of (key, value) pairs) -> value.
+    """
+    _gauge_collectors[name] = (help_text, collect)
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{str(value)}"' for key, value in pairs) + "}"
+
+def render_prometheus() -> str:
+    """Renders every metric in the Prometheus text exposition format."""
+    with _lock:
+        histograms = {key: list(values) for key, values in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = []
+    for metric in sorted({name for name, _ in histograms}):
+        lines.append(f"# HELP {metric} {_help.get(metric, metric)}")
+        lines.append(f"# TYPE {metric} histogram")
+        for (name, labels), values in sorted(histograms.items()):
+            if name != metric:
+                continue
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, values):
+                cumulative += count
+                lines.append(f"{metric}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{metric}_bucket{_format_labels(labels, [('le', '+Inf')])} {values[-1]}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {values[-2]}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {values[-1]}")
+
+    for metric in sorted({name for name, _ in counters}):
+        lines.append(f"# HELP {metric} {_help.get(metric, metric)}")
+        lines.append(f"# TYPE {metric} counter")
+        for (name, labels), value in sorted(counters.items()):
+            if name == metric:
+                lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+    # Cache hit ratio per column, derived from the lookup counters
+    lookups = {}
+    for (name, labels), value in counters.items():
+        if name == "brainrot_cache_lookups_total":
+            labels = dict(labels)
+            column_counts = lookups.setdefault(labels["column"], {"hit": 0, "miss": 0})
+            column_counts[labels["result"]] += value
+    if lookups:
+        lines.append("# HELP brainrot_cache_hit_ratio Fraction of cache lookups that were hits, by column.")
+        lines.append("# TYPE brainrot_cache_hit_ratio gauge")
+        for column, counts in sorted(lookups.items()):
+            total = counts["hit"] + counts["miss"]
+            lines.append(f'brainrot_cache_hit_ratio{{column="{column}"}} {counts["hit"] / total if total else 0}')
+
+    for metric, (help_text, collect) in sorted(_gauge_collectors.items()):
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} gauge")
+        for labels, value in sorted(collect().items()):
+            lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+    return "\n".join(lines) + "\n"
+
+def format_server_timing(timings) -> str:
+    """Formats (stage, seconds) pairs as a Server-Timing header value, summing repeated stages."""
+    totals = {}
+    for stage, seconds in timings:
+        totals[stage] = totals.get(stage, 0) + seconds
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in totals.items())
@@ -1,5 +1,5 @@
 import requests
-import json
+import hashlib
 import sys
 import os
 
@@ -7,248 +7,125 @@ import os
 current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.append(parent_dir)
-from youtube_tools.db_commands import get_all
+from youtube_tools.db_commands import get_videos, iter_videos, get_podcast_segment, save_podcast_segment
+from tools.http_client import http_post
 
 # Load the Phi-3 model
-model_url = "https://ngavu2004--podcast-generator-phi3-generate-text-endpoint-dev.modal.run"
-
-def create_podcast_script_from_text(texts):
-    # Combine the texts into a single string
-    content = ""
-    for i, text in enumerate(texts):
-        content += f"Text {i+1}: {text}\n"
-
-    prompt = f"""
-        {content}
-        """
-    # Define the payload
+model_url = os.getenv("PODCAST_MODEL_URL", "https://ngavu2004--podcast-generator-phi3-generate-text-endpoint-dev.modal.run")
+
+# Videos per podcast segment. Segments are cut in insertion order, so adding a few
+# videos only changes the last segment of their classification.
+PODCAST_SEGMENT_SIZE = int(os.getenv("PODCAST_SEGMENT_SIZE", "5"))
+
+SEGMENT_PROMPT = (
+    "You are the host of a podcast about short-form videos. Write a lively, spoken podcast segment "
+    "about '{topic}' that covers each of the following videos in a few sentences, with smooth "
+    "transitions between them. Only output the words the host says.\n\n{content}"
+)
+
+# Fields the podcast needs: titles are a typed column and transcripts are never read
+PODCAST_VIDEO_FIELDS = ["video_id", "title", "summary", "classification"]
+
+def create_podcast_script_from_text(texts, topic: str = "the latest videos"):
+    """Sends the given texts to the Phi-3 endpoint and returns the generated podcast script."""
+    content = "\n".join(f"Video {i+1}: {text}" for i, text in enumerate(texts))
     payload = {
-        "prompt": "What is the meaning of life?"
+        "prompt": SEGMENT_PROMPT.format(topic=topic, content=content)
     }
 
-    # Make the POST request
-    response = requests.post(model_url, json=payload)
-
-    # Print the response
-    print("Status Code:", response.status_code)
+    # Generating a segment has no side effects, so it is safe to retry
+    response = http_post(model_url, json=payload, timeout=300, idempotent=True)
+    response.raise_for_status()
     return response.text
 
+def get_podcast_groups(source: str = None, classification: str = None):
+    """
+    Returns summarized videos grouped by their first classification, as
+    {classification: [video, ...]} in insertion order. Unclassified videos are
+    grouped under 'Uncategorized'; videos without a summary are skipped.
+    """
+    groups = {}
+    for video in iter_videos(fields=PODCAST_VIDEO_FIELDS, source=source, classification=classification):
+        if not video.get("summary"):
+            continue
+        topic = classification or (video["classification"][0] if video["classification"] else "Uncategorized")
+        groups.setdefault(topic, []).append(video)
+    return groups
+
+def plan_segments(groups):
+    """Splits each classification group into (topic, videos) segments of at most PODCAST_SEGMENT_SIZE videos."""
+    return [
+        (topic, videos[start:start + PODCAST_SEGMENT_SIZE])
+        for topic, videos in groups.items()
+        for start in range(0, len(videos), PODCAST_SEGMENT_SIZE)
+    ]
+
+def segment_key(topic: str, videos) -> str:
+    """Hash of everything a segment's script depends on: prompt, model, topic and each video's title and summary."""
+    digest = hashlib.sha256(f"{SEGMENT_PROMPT}\0{model_url}\0{topic}".encode())
+    for video in videos:
+        digest.update(f"\0{video['video_id']}\0{video.get('title')}\0{video['summary']}".encode())
+    return digest.hexdigest()
+
+def build_podcast_script(source: str = None, classification: str = None):
+    """
+    Builds a podcast script from the cached videos and yields it piece by piece: an
+    intro, then one segment per group of videos as soon as that segment is ready.
+
+    Segment scripts are stored by segment_key(), so rebuilding after a few videos were
+    added reuses every segment whose videos didn't change and only calls the model for
+    the rest.
+    """
+    segments = plan_segments(get_podcast_groups(source, classification))
+    if not segments:
+        yield "No summarized videos to build a podcast from.\n"
+        return
+
+    topics = list(dict.fromkeys(topic for topic, _ in segments))
+    yield f"Welcome to the Brainrot Vault podcast! Today: {', '.join(topics)}.\n"
+
+    generated = reused = 0
+    for topic, videos in segments:
+        key = segment_key(topic, videos)
+        script = get_podcast_segment(key)
+        if script is not None:
+            reused += 1
+        else:
+            try:
+                script = create_podcast_script_from_text(
+                    [f"{video.get('title') or 'Untitled'}\n{video['summary']}" for video in videos], topic
+                )
+            except requests.exceptions.RequestException as e:
+                print(f"Error generating podcast segment for '{topic}': {e}")
+                continue
+            save_podcast_segment(key, topic, [video["video_id"] for video in videos], script)
+            generated += 1
+        yield f"\n## {topic}\n\n{script.strip()}\n"
+
+    print(f"Podcast built from {len(segments)} segments: {generated} generated, {reused} reused")
+    yield "\nThat's all for today. Thanks for listening!\n"
+
 def get_first_five_videos():
     """Retrieves and prints the first 5 videos from the cache."""
-    # Get all videos from the cache
-    all_videos = get_all()
-    
-    # Take only the first 5 videos
-    first_five = all_videos[5:11]
-    
-    print(f"Found {len(all_videos)} total videos in cache. Displaying first 5:")
+    first_five, _ = get_videos(limit=5, fields=["video_id", "title", "source", "classification", "summary"])
+
+    print(f"Displaying the first {len(first_five)} videos in the cache:")
     print("-" * 80)
-    
+
     # Print details for each video
     for i, video in enumerate(first_five):
-        video_id = video.get("video_id", "Unknown ID")
-        source = video.get("source", "Unknown source")
-        
-        # Extract title based on the source format
-        title = "Unknown title"
-        response_data = video.get("response_data", {})
-        
-        if source == "youtube" and response_data and "items" in response_data:
-            if response_data["items"] and "snippet" in response_data["items"][0]:
-                title = response_data["items"][0]["snippet"].get("title", "No title")
-        elif source == "tiktok" and response_data:
-            title = response_data.get("title", "No title")
-        
-        # Get the classification tags
         classifications = video.get("classification", [])
-        classification_str = ", ".join(classifications) if classifications else "None"
-        
-        # Print the information
         print(f"Video {i+1}:")
-        print(f"  ID: {video_id}")
-        print(f"  Source: {source}")
-        print(f"  Title: {title}")
-        print(f"  Classifications: {classification_str}")
-        print(f"  Has transcript: {'Yes' if video.get('transcript') else 'No'}")
+        print(f"  ID: {video.get('video_id', 'Unknown ID')}")
+        print(f"  Source: {video.get('source', 'Unknown source')}")
+        print(f"  Title: {video.get('title') or 'Unknown title'}")
+        print(f"  Classifications: {', '.join(classifications) if classifications else 'None'}")
+        print(f"  Has summary: {'Yes' if video.get('summary') else 'No'}")
         print("-" * 80)
-    
+
     return first_five
 
-def get_first_five_from_api():
-    """Retrieves and prints the first 5 items from the brainrotapi API."""
-    api_url = "https://brainrotapi.codestacx.com/home"
-    
-    try:
-        # Make the GET request to the API
-        response = requests.get(api_url)
-        
-        # Check if the request was successful
-        if response.status_code == 200:
-            data = response.json()
-            
-            # The API returns a dict with a 'videos' key containing the list of videos
-            videos = data.get('videos', [])
-            
-            # Take only the first 5 videos if available
-            first_five = videos 
-         
-            print(f"Retrieved {len(first_five)} videos from the API:")
-            print("-" * 80)
-            
-            # Print details for each video
-            for i, video in enumerate(first_five):
-                video_id = video.get("video_id", "Unknown ID")
-                source = video.get("source", "Unknown source")
-                transcript = video.get("transcript", "")
-                transcript_preview = transcript[:100] + "..." if transcript and len(transcript) > 100 else transcript
-                
-                # Extract title based on the source format
-                title = "Unknown title"
-                response_data = video.get("response_data", {})
-                
-                if source == "youtube" and response_data and "items" in response_data:
-                    if response_data["items"] and "snippet" in response_data["items"][0]:
-                        title = response_data["items"][0]["snippet"].get("title", "No title")
-                elif source == "tiktok" and response_data:
-                    title = response_data.get("title", "No title")
-                
-                # Get the classification tags
-                classifications = video.get("classification", [])
-                classification_str = ", ".join(classifications) if classifications else "None"
-                
-                # Print the information
-                # print(f"Video {i+1}:")
-                # print(f"  ID: {video_id}")
-                # print(f"  Source: {source}")
-                # print(f"  Title: {title}")
-                # print(f"  Classifications: {classification_str}")
-                # print(f"  Transcript preview: {transcript_preview}")
-                # print("-" * 80)
-            
-            return first_five
-        else:
-            print(f"Error: API request failed with status code {response.status_code}")
-            print(f"Response: {response.text}")
-            return []
-            
-    except requests.exceptions.RequestException as e:
-        print(f"Error: Failed to connect to the API: {e}")
-        return []
-    except json.JSONDecodeError:
-        print(f"Error: Failed to parse API response as JSON")
-        print(f"Response: {response.text}")
-        return []
-
-def create_podcast_script_from_api_responses():
-    """
-    Fetches the first 5 videos from the API, extracts their transcripts,
-    and sends them to the modal URL to generate a podcast script.
-    """
-    # Get the first 5 videos from the API
-    videos = get_first_five_from_api()
-    
-    if not videos:
-        print("No videos retrieved from API. Cannot create podcast script.")
-        return
-    
-    # Extract transcripts from the videos
-    transcripts = []
-    for i, video in enumerate(videos):
-        transcript = video.get("transcript", "")
-        if transcript:
-            # Truncate very long transcripts to avoid overwhelming the model
-            if len(transcript) > 1000:
-                transcript = transcript[:1000] + "..."
-            
-            title = "Unknown title"
-            source = video.get("source", "Unknown source")
-            response_data = video.get("response_data", {})
-            
-            if source == "youtube" and response_data and "items" in response_data:
-                if response_data["items"] and "snippet" in response_data["items"][0]:
-                    title = response_data["items"][0]["snippet"].get("title", "No title")
-            elif source == "tiktok" and response_data:
-                title = response_data.get("title", "No title")
-            
-            # Add title and transcript to the list
-            transcripts.append(f"Title: {title}\n{transcript}")
-    
-    if not transcripts:
-        print("No transcripts found in the videos. Cannot create podcast script.")
-        return
-    
-    print(f"Sending {len(transcripts)} transcripts to the modal URL to generate podcast script...")
-    
-    # Create the podcast script from the transcripts
-    script = create_podcast_script_from_text(transcripts)
-    
-    print("\nGenerated Podcast Script:")
-    print("=" * 80)
-    print(script)
-    print("=" * 80)
-    
-    return script
-
-def display_videos_detailed_info():
-    """
-    Fetches the first 5 videos from the API and displays detailed information
-    including title, description, transcript, and any available summary.
-    """
-    # Get the first 5 videos from the API
-    videos = get_first_five_from_api()
-    
-    if not videos:
-        print("No videos retrieved from API.")
-        return
-    
-    print(f"\nDetailed Information for {len(videos)} Videos:")
-    print("=" * 100)
-    
-    for i, video in enumerate(videos):
-        # Extract video details
-        video_id = video.get("video_id", "Unknown ID")
-        source = video.get("source", "Unknown source")
-        transcript = video.get("transcript", "No transcript available")
-        
-        # Extract title and description based on the source
-        title = "Unknown title"
-        description = "No description available"
-        response_data = video.get("response_data", {})
-        
-        if source == "youtube" and response_data and "items" in response_data:
-            if response_data["items"] and "snippet" in response_data["items"][0]:
-                snippet = response_data["items"][0]["snippet"]
-                title = snippet.get("title", "No title")
-                description = snippet.get("description", "No description available")
-        elif source == "tiktok" and response_data:
-            title = response_data.get("title", "No title")
-            description = response_data.get("desc", "No description available")
-        
-        # Get the classification tags (can serve as a summary)
-        classifications = video.get("classification", [])
-        classification_str = ", ".join(classifications) if classifications else "None"
-        
-        # Get any summary if available
-        summary = video.get("summary", "No summary available")
-        
-        # Print the detailed information
-        print(f"VIDEO {i+1}: {title} ({source} ID: {video_id})")
-        print("-" * 100)
-        print("DESCRIPTION:")
-        print(description)
-        print("\nCLASSIFICATIONS/TAGS:")
-        print(classification_str)
-        print("\nSUMMARY:")
-        print(summary)
-        print("\nTRANSCRIPT:")
-        print(transcript[:500] + "..." if len(transcript) > 500 else transcript)
-        print("=" * 100)
-    
-    return videos
-
-# If the script is run directly, execute the function
+# If the script is run directly, stream a podcast script to stdout
 if __name__ == "__main__":
-    # get_first_five_videos()
-    # get_first_five_from_api()
-    # create_podcast_script_from_api_responses()
-    display_videos_detailed_info()
\ No newline at end of file
+    for piece in build_podcast_script():
+        print(piece, end="", flush=True)
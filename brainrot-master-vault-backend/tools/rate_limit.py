@@ -0,0 +1,56 @@
+import time
+import threading
+
+class RateLimiter:
+    """
+    Client-side token-bucket limiter for an API quota of requests per minute and,
+    optionally, tokens per minute. acquire() blocks until the call fits in the quota,
+    so it is meant to be called from worker threads (see tools/workers.py).
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float = None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute or 0)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        if self.tokens_per_minute:
+            self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    def acquire(self, tokens: int = 0) -> float:
+        """Waits until one request of `tokens` tokens is allowed and returns the seconds waited."""
+        if self.tokens_per_minute:
+            # A single request larger than the whole quota would otherwise wait forever
+            tokens = min(tokens, self.tokens_per_minute)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._blocked_until - now
+                if wait <= 0:
+                    missing_requests = 1 - self._requests
+                    missing_tokens = tokens - self._tokens if self.tokens_per_minute else 0
+                    if missing_requests <= 0 and missing_tokens <= 0:
+                        self._requests -= 1
+                        if self.tokens_per_minute:
+                            self._tokens -= tokens
+                        return waited
+                    wait = max(
+                        missing_requests * 60 / self.requests_per_minute,
+                        missing_tokens * 60 / self.tokens_per_minute if missing_tokens > 0 else 0,
+                    )
+            time.sleep(wait)
+            waited += wait
+
+    def block_for(self, seconds: float):
+        """Holds every caller back for `seconds`, e.g. after the server answered 429."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
@@ -0,0 +1,68 @@
+import asyncio
+from youtube_tools.cache_backend import get_cache_backend, CACHE_LOCK_TTL
+
+# Pipeline runs currently in progress, keyed by e.g. "youtube:<video_id>"
+_in_flight = {}
+
+# How many pipeline runs were started, and how many callers joined one already in progress
+# instead of starting their own (i.e. duplicate runs avoided). lock_waits counts runs that
+# waited for another process or replica holding the same key's lock.
+single_flight_stats = {"runs": 0, "coalesced": 0, "lock_waits": 0}
+
+# Seconds between attempts to take a lock held elsewhere
+LOCK_POLL_INTERVAL = 0.5
+
+async def single_flight(key: str, run, distributed: bool = False):
+    """
+    Runs `run()` (a coroutine function) at most once at a time per key.
+
+    Callers that arrive while a run for the same key is in progress await that run's
+    result (or exception) instead of starting their own. The key is opaque, so it can
+    be a video id today and an audio content hash later.
+
+    With `distributed`, the run also holds the key's lock in the cache backend, so other
+    processes and replicas sharing it wait instead of running the same pipeline. `run()`
+    should check the cache first: after the wait it usually finds the other run's result.
+
+    The run is shielded: if one caller disconnects, the run carries on for the others.
+    """
+    task = _in_flight.get(key)
+    if task is not None:
+        single_flight_stats["coalesced"] += 1
+        print(f"Joining in-flight run for {key}")
+        return await asyncio.shield(task)
+
+    task = asyncio.ensure_future(run_locked(key, run) if distributed else run())
+    _in_flight[key] = task
+    single_flight_stats["runs"] += 1
+    task.add_done_callback(lambda _: _in_flight.pop(key, None))
+    return await asyncio.shield(task)
+
+async def run_locked(key: str, run):
+    """Runs `run()` while holding the cache backend's lock for key, extending it until the run ends."""
+    backend = get_cache_backend()
+    token = backend.acquire_lock(key, CACHE_LOCK_TTL)
+    if token is None:
+        single_flight_stats["lock_waits"] += 1
+        print(f"Waiting for another process running {key}")
+        while token is None:
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+            token = backend.acquire_lock(key, CACHE_LOCK_TTL)
+
+    async def keep_alive():
+        while True:
+            await asyncio.sleep(CACHE_LOCK_TTL / 3)
+            if not backend.extend_lock(key, token, CACHE_LOCK_TTL):
+                print(f"Lost the lock for {key}; another process may start the same run")
+                return
+
+    keep_alive_task = asyncio.ensure_future(keep_alive())
+    try:
+        return await run()
+    finally:
+        keep_alive_task.cancel()
+        backend.release_lock(key, token)
+
+def get_single_flight_stats():
+    """Returns a snapshot of the run/coalesce counters and the number of runs in flight."""
+    return {**single_flight_stats, "in_flight": len(_in_flight)}
@@ -1,29 +1,216 @@
 from google import genai
+from google.genai import types, errors
 from dotenv import load_dotenv
 import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+import functools
+from urllib.parse import urlsplit
+from youtube_tools.db_commands import get_summaries_by_hash, save_summaries_by_hash
+from tools.rate_limit import RateLimiter
+from tools.workers import run_in_stage
+from tools.http_client import host_guard
 
 load_dotenv()
 
 api_key = os.getenv("GEMINI_API_KEY")
 
-client = genai.Client(api_key=api_key)
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "gemini-2.0-flash")
+# Point the client at another server speaking the Gemini REST API (e.g. benchmarks/stub_gemini_server.py)
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")
 
-# response = client.models.generate_content(
-#     model="gemini-2.0-flash",
-#     contents="Summarize the following text:\n\n" + """
-#     You've been back-talking your mother? Boy, come here, I'm gonna give you 20! Boy, you've been playing hooky from school? Come here, I'm gonna give you 10! Michael, you've been smoking Mary Jane? Don't make me give you one! You stole my Corvette and you took Mary Beth to make out point? You are grounded, mister. No homecoming. Did you forget to return the Blockbuster rentals again? Somebody's gonna pay for those, mister. And let me tell you something. It's not gonna be me. Yo, you got an F? That is not swag. That's an epic fail, young lady. Hi. Honey, we're limiting your iPad use to only 12 hours a day. Ew. You are so right. We're the problem. So scary. You were caught uranium dumping? Your father and I did not design you to be this environmentally unconscious. Now stop running simulations on your Neuralink before we end your free Thought Premium subscription. What did we say about speaking out against the overseers? If you do that, they're going to take away our water rights, and then we're going to die.""",
-# )
+GEMINI_HOST = urlsplit(GEMINI_BASE_URL).netloc if GEMINI_BASE_URL else "generativelanguage.googleapis.com"
+# Seconds allowed per Gemini request
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "120"))
+
+# The SDK keeps its own keep-alive connection pool; calls go through gemini_call() for the
+# shared per-host concurrency cap and circuit breaker in tools/http_client.py
+http_options = {"timeout": int(GEMINI_TIMEOUT * 1000)}
+if GEMINI_BASE_URL:
+    http_options["base_url"] = GEMINI_BASE_URL
+client = genai.Client(api_key=api_key, http_options=types.HttpOptions(**http_options))
+
+SUMMARY_PROMPT = "Provide a concise summary of the following text in 100 words or less. Focus on the key points and main ideas:\n\n"
+BATCH_SUMMARY_PROMPT = (
+    "Each <text> element below is a separate text. For each one, provide a concise summary in 100 words "
+    "or less, focusing on its key points and main ideas. Respond with a JSON array containing one "
+    "{\"id\": <the text's id>, \"summary\": <its summary>} object per text.\n\n"
+)
+
+# Client-side quota. The defaults match the Gemini free tier for gemini-2.0-flash.
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "15"))
+GEMINI_TPM = float(os.getenv("GEMINI_TPM", "1000000"))
+# Several transcripts are packed into one request up to this many (estimated) input tokens
+SUMMARY_BATCH_TOKEN_BUDGET = int(os.getenv("SUMMARY_BATCH_TOKEN_BUDGET", "30000"))
+SUMMARY_BATCH_MAX_ITEMS = int(os.getenv("SUMMARY_BATCH_MAX_ITEMS", "20"))
+# How long summarize() waits to collect concurrent requests into one batch
+SUMMARY_BATCH_WINDOW = float(os.getenv("SUMMARY_BATCH_WINDOW", "0.25"))
+SUMMARY_MAX_RETRIES = int(os.getenv("SUMMARY_MAX_RETRIES", "5"))
+SUMMARY_RETRY_BASE_DELAY = float(os.getenv("SUMMARY_RETRY_BASE_DELAY", "2"))
+# Quota and transient server errors worth retrying
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+rate_limiter = RateLimiter(GEMINI_RPM, GEMINI_TPM)
+
+def is_gemini_failure(e: BaseException) -> bool:
+    """Whether an error means the Gemini API is unhealthy (quota and bad requests don't)."""
+    return not isinstance(e, errors.APIError) or e.code >= 500
+
+def gemini_call(func, *args, **kwargs):
+    """Calls a Gemini SDK method under its host's concurrency cap and circuit breaker."""
+    with host_guard(GEMINI_HOST, is_failure=is_gemini_failure):
+        return func(*args, **kwargs)
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token), without an API call."""
+    return len(text) // 4 + 1
+
+def summary_cache_key(text: str) -> str:
+    """Hash of (prompt template, model, input) used to cache summaries."""
+    return hashlib.sha256(f"{SUMMARY_PROMPT}\0{SUMMARY_MODEL}\0{text}".encode()).hexdigest()
+
+def _generate(contents: str, config=None) -> str:
+    """Calls the model, waiting on the rate limiter and retrying quota/server errors with exponential backoff."""
+    for attempt in range(SUMMARY_MAX_RETRIES + 1):
+        rate_limiter.acquire(estimate_tokens(contents))
+        try:
+            response = gemini_call(client.models.generate_content, model=SUMMARY_MODEL, contents=contents, config=config)
+            return response.text
+        except errors.APIError as e:
+            if e.code not in RETRYABLE_STATUS_CODES or attempt == SUMMARY_MAX_RETRIES:
+                raise
+            delay = SUMMARY_RETRY_BASE_DELAY * 2 ** attempt * random.uniform(0.5, 1.5)
+            if e.code == 429:
+                # Out of quota: hold back every caller, not just this one
+                rate_limiter.block_for(delay)
+            print(f"Gemini returned {e.code}, retrying in {delay:.1f}s (attempt {attempt + 1}/{SUMMARY_MAX_RETRIES})")
+            time.sleep(delay)
+
+def _summarize_batch(texts: list[str]) -> list:
+    """Summarizes several texts in one request. Returns one summary (or None if missing) per text."""
+    contents = BATCH_SUMMARY_PROMPT + "".join(f'<text id="{i}">\n{text}\n</text>\n' for i, text in enumerate(texts))
+    response_text = _generate(contents, config=types.GenerateContentConfig(response_mime_type="application/json"))
+    summaries = [None] * len(texts)
+    try:
+        for item in json.loads(response_text):
+            index = int(item["id"])
+            if 0 <= index < len(texts) and item.get("summary"):
+                summaries[index] = item["summary"]
+    except (ValueError, TypeError, KeyError) as e:
+        print(f"Could not parse batched summary response: {e}")
+    return summaries
+
+def pack_batches(texts: list[str]) -> list[list[int]]:
+    """
+    Groups text indexes into batches of at most SUMMARY_BATCH_MAX_ITEMS whose estimated
+    tokens fit SUMMARY_BATCH_TOKEN_BUDGET. A text over the budget gets a batch to itself.
+    """
+    batches = []
+    batch, batch_tokens = [], 0
+    for index, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if batch and (batch_tokens + tokens > SUMMARY_BATCH_TOKEN_BUDGET or len(batch) >= SUMMARY_BATCH_MAX_ITEMS):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(index)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+def summarize_texts(texts: list[str]) -> list:
+    """
+    Summarizes many texts with as few billed requests as possible (blocking).
+
+    Cached summaries are returned as-is, identical texts are summarized once, and the
+    rest are packed into token-budgeted batch requests. A text the batch response
+    leaves out is retried on its own. Returns one summary (or None on failure) per text.
+    """
+    keys = [summary_cache_key(text) for text in texts]
+    summaries_by_key = get_summaries_by_hash(list(set(keys)))
+
+    pending = {}
+    for key, text in zip(keys, texts):
+        if key not in summaries_by_key:
+            pending.setdefault(key, text)
+    pending_keys = list(pending)
+    pending_texts = [pending[key] for key in pending_keys]
+
+    new_summaries = []
+    for batch in pack_batches(pending_texts):
+        batch_texts = [pending_texts[i] for i in batch]
+        results = [None] * len(batch)
+        if len(batch) > 1:
+            try:
+                results = _summarize_batch(batch_texts)
+            except Exception as e:
+                print(f"Error generating batched summaries, summarizing one by one: {e}")
+        for position, result in enumerate(results):
+            if result is None:
+                try:
+                    results[position] = _generate(SUMMARY_PROMPT + batch_texts[position])
+                except Exception as e:
+                    print(f"Error generating summary: {e}")
+        for i, summary in zip(batch, results):
+            if summary:
+                summaries_by_key[pending_keys[i]] = summary
+                new_summaries.append((pending_keys[i], SUMMARY_MODEL, summary))
+
+    save_summaries_by_hash(new_summaries)
+    return [summaries_by_key.get(key) for key in keys]
 
 def summarize_text(text):
     """
     Summarizes the given text using the Gemini API.
     """
+    return summarize_texts([text])[0]
+
+# Requests waiting for the current batch window; each batch's flush task owns its own list
+_pending_requests = None
+
+async def _flush_pending(requests: list):
+    global _pending_requests
+    await asyncio.sleep(SUMMARY_BATCH_WINDOW)
+    if _pending_requests is requests:
+        _pending_requests = None
     try:
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents="Provide a concise summary of the following text in 100 words or less. Focus on the key points and main ideas:\n\n" + text,
-        )
-        return response.text
+        summaries = await run_in_stage("summarization", summarize_texts, [text for text, _ in requests])
     except Exception as e:
-        print(f"Error generating summary: {e}")
-        return None
\ No newline at end of file
+        print(f"Error generating summaries: {e}")
+        summaries = [None] * len(requests)
+    for (_, future), summary in zip(requests, summaries):
+        if not future.done():
+            future.set_result(summary)
+
+def _fail_unfinished(requests: list, task: asyncio.Task):
+    """
+    Done callback of a flush task. If it was cancelled (e.g. on shutdown, possibly before
+    it even started) its callers would wait forever, so their futures get an exception.
+    """
+    global _pending_requests
+    if _pending_requests is requests:
+        _pending_requests = None
+    for _, future in requests:
+        if not future.done():
+            future.set_exception(RuntimeError("Summarization batch was cancelled before it finished"))
+
+async def summarize(text: str):
+    """
+    Summarizes a text from async code. Calls made within SUMMARY_BATCH_WINDOW of each
+    other (e.g. concurrent pipelines in a /batch import) share batched requests.
+    Returns the summary, or None if summarization failed.
+
+    The summary cache is checked by summarize_texts() on the summarization pool, never
+    here on the event loop.
+    """
+    global _pending_requests
+    future = asyncio.get_running_loop().create_future()
+    if _pending_requests is None:
+        _pending_requests = []
+        flush_task = asyncio.create_task(_flush_pending(_pending_requests))
+        flush_task.add_done_callback(functools.partial(_fail_unfinished, _pending_requests))
+    _pending_requests.append((text, future))
+    return await future
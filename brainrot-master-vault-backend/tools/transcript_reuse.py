@@ -0,0 +1,49 @@
+from youtube_tools.db_commands import (
+    save_audio_fingerprint, find_transcript_by_fingerprint,
+    mark_transcript_reused
+)
+from tools.audio import fingerprint_audio
+from tools.metrics import increment
+from tools.single_flight import single_flight
+from tools.chunked_transcription import transcribe_chunked
+from tools.workers import run_in_stage
+
+async def fingerprint_and_reuse(video_id: str, audio_path: str = None, audio_bytes: bytes = None):
+    """
+    Fingerprints a video's extracted speech audio (a file, or the encoded bytes about to
+    be uploaded) and looks for another video with the same audio that was already
+    transcribed (re-uploads, reused TikTok sounds, duplicate shorts).
+
+    Returns (fingerprint, transcript): transcript is the reused transcript or None.
+    fingerprint is None if the audio couldn't be decoded.
+    """
+    try:
+        fingerprint, duration = await run_in_stage("audio", fingerprint_audio, audio_path, audio_bytes)
+    except Exception as e:
+        print(f"Could not fingerprint audio for {video_id}: {e}")
+        return None, None
+
+    await run_in_stage("cache", save_audio_fingerprint, video_id, fingerprint, duration)
+    match = await run_in_stage("cache", find_transcript_by_fingerprint, fingerprint, exclude_video_id=video_id)
+    if not match:
+        return fingerprint, None
+
+    source_video_id, transcript = match
+    await run_in_stage("cache", mark_transcript_reused, video_id, source_video_id)
+    increment("brainrot_transcriptions_saved_total")
+    increment("brainrot_transcription_seconds_saved_total", duration)
+    print(f"Reusing transcript of {source_video_id} for {video_id} (same audio, {duration:.1f}s not transcribed)")
+    return fingerprint, transcript
+
+async def transcribe_with_reuse(video_id: str, audio_path: str):
+    """
+    Transcribes an audio file unless a video with identical audio already has a
+    transcript. Concurrent transcriptions of the same audio share one Whisper call, and
+    long audio is transcribed in chunks (see tools/chunked_transcription.py).
+    """
+    fingerprint, transcript = await fingerprint_and_reuse(video_id, audio_path)
+    if transcript:
+        return transcript
+    if fingerprint is None:
+        return await transcribe_chunked(audio_path)
+    return await single_flight(f"audio:{fingerprint}", lambda: transcribe_chunked(audio_path, cache_key=fingerprint))
@@ -1,43 +1,177 @@
-import requests
+import io
 import os
+import time
+import threading
+import requests
+from tools.workers import run_in_stage, STAGE_CONCURRENCY
+from tools.http_client import http_post
+
+DEFAULT_TRANSCRIPTION_API_URL = "https://ngavu2004--brainrot-mastervault-whisper-small-handle-tra-b41132.modal.run/"
+
+# Backend used for transcription: 'http' (the remote Whisper endpoint) or 'local'
+# (faster-whisper on this machine's CPU). If a fallback backend is set, it is tried
+# whenever the primary one fails, e.g. while the remote endpoint is cold or saturated.
+TRANSCRIPTION_BACKEND = os.getenv("TRANSCRIPTION_BACKEND", "http")
+TRANSCRIPTION_FALLBACK_BACKEND = os.getenv("TRANSCRIPTION_FALLBACK_BACKEND", "")
+
+# Local backend settings. int8 quantisation keeps the small model at ~250 MB of RAM.
+LOCAL_WHISPER_MODEL = os.getenv("LOCAL_WHISPER_MODEL", "small")
+LOCAL_WHISPER_COMPUTE_TYPE = os.getenv("LOCAL_WHISPER_COMPUTE_TYPE", "int8")
+LOCAL_WHISPER_CPU_THREADS = int(os.getenv("LOCAL_WHISPER_CPU_THREADS", "0"))  # 0 lets CTranslate2 decide
+LOCAL_WHISPER_BATCH_SIZE = int(os.getenv("LOCAL_WHISPER_BATCH_SIZE", "8"))
+
+def _post_audio(transcribe_api_url: str, mp3_file: str):
+    """Uploads the audio file to the transcription API and returns the parsed JSON response."""
+    with open(mp3_file, "rb") as file:
+        return _post_audio_file(transcribe_api_url, file)
+
+def _post_audio_file(transcribe_api_url: str, file):
+    """Uploads an audio file object (or a (filename, bytes, mime type) tuple) and returns the parsed JSON response."""
+    # Transcribing the same audio twice is harmless, so failed uploads are retried
+    response = http_post(transcribe_api_url, files={"file": file}, timeout=300, idempotent=True)
+
+    response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
+
+    # Assuming the API returns JSON with the transcription text
+    # Adjust parsing based on the actual API response format
+    return response.json()
+
+class HTTPTranscriptionBackend:
+    """Uploads audio to the remote Whisper endpoint at TRANSCRIPTION_API_URL."""
+    name = "http"
+
+    def _url(self) -> str:
+        # Use environment variable for API URL if available, otherwise default
+        transcribe_api_url = os.getenv("TRANSCRIPTION_API_URL", DEFAULT_TRANSCRIPTION_API_URL)
+        if not transcribe_api_url:
+            raise RuntimeError("TRANSCRIPTION_API_URL environment variable not set and no default provided.")
+        return transcribe_api_url
+
+    def load(self):
+        """Nothing to load; the model lives on the remote endpoint."""
+
+    def transcribe_file(self, audio_path: str):
+        return _post_audio(self._url(), audio_path)
+
+    def transcribe_bytes(self, audio: bytes, filename: str, mime_type: str):
+        return _post_audio_file(self._url(), (filename, audio, mime_type))
+
+class LocalWhisperBackend:
+    """
+    Transcribes in-process on the CPU with faster-whisper (Whisper on CTranslate2).
+
+    The model is loaded once and kept warm for the life of the process. Audio is
+    cut into voice segments that are decoded in batches of LOCAL_WHISPER_BATCH_SIZE,
+    and up to TRANSCRIPTION_CONCURRENCY files are decoded at once.
+    """
+    name = "local"
+
+    def __init__(self):
+        self._pipeline = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Loads the model if it isn't loaded yet and returns the batched pipeline (blocking)."""
+        with self._lock:
+            if self._pipeline is None:
+                try:
+                    from faster_whisper import WhisperModel, BatchedInferencePipeline
+                except ImportError as e:
+                    raise RuntimeError("The local transcription backend needs faster-whisper (pip install faster-whisper)") from e
+                start = time.perf_counter()
+                model = WhisperModel(
+                    LOCAL_WHISPER_MODEL,
+                    device="cpu",
+                    compute_type=LOCAL_WHISPER_COMPUTE_TYPE,
+                    cpu_threads=LOCAL_WHISPER_CPU_THREADS,
+                    num_workers=STAGE_CONCURRENCY["transcription"],
+                )
+                self._pipeline = BatchedInferencePipeline(model=model)
+                print(f"Loaded local Whisper model '{LOCAL_WHISPER_MODEL}' ({LOCAL_WHISPER_COMPUTE_TYPE}) in {time.perf_counter() - start:.1f}s")
+        return self._pipeline
+
+    def transcribe_file(self, audio):
+        segments, _ = self.load().transcribe(audio, batch_size=LOCAL_WHISPER_BATCH_SIZE)
+        return " ".join(segment.text.strip() for segment in segments)
+
+    def transcribe_bytes(self, audio: bytes, filename: str, mime_type: str):
+        return self.transcribe_file(io.BytesIO(audio))
+
+TRANSCRIPTION_BACKENDS = {
+    "http": HTTPTranscriptionBackend,
+    "local": LocalWhisperBackend,
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+def get_backend(name: str = None):
+    """Returns the (shared) transcription backend with the given name (default TRANSCRIPTION_BACKEND)."""
+    name = name or TRANSCRIPTION_BACKEND
+    if name not in TRANSCRIPTION_BACKENDS:
+        raise ValueError(f"Unknown transcription backend '{name}'. Expected one of: {', '.join(TRANSCRIPTION_BACKENDS)}")
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = TRANSCRIPTION_BACKENDS[name]()
+        return _backends[name]
+
+def _backend_chain():
+    backends = [get_backend()]
+    if TRANSCRIPTION_FALLBACK_BACKEND and TRANSCRIPTION_FALLBACK_BACKEND != TRANSCRIPTION_BACKEND:
+        backends.append(get_backend(TRANSCRIPTION_FALLBACK_BACKEND))
+    return backends
+
+async def warm_up_transcription():
+    """Loads the configured backends' models ahead of the first request (used at startup)."""
+    for backend in _backend_chain():
+        try:
+            await run_in_stage("transcription", backend.load)
+        except Exception as e:
+            print(f"Could not warm up the {backend.name} transcription backend: {e}")
+
+async def _run_backends(description: str, method: str, *args):
+    """Runs the transcription on the primary backend, then the fallback if that fails. Returns None if all fail."""
+    for backend in _backend_chain():
+        print(f"Sending {description} to the {backend.name} transcription backend")
+        try:
+            # Transcription blocks for as long as the model takes, so run it on the transcription pool
+            transcribed_text = await run_in_stage("transcription", getattr(backend, method), *args)
+            print("Transcription successful.")
+            return transcribed_text
+
+        except requests.exceptions.RequestException as e:
+            print(f"Error during transcription API request: {e}")
+        except Exception as e:
+            print(f"An unexpected error occurred during transcription ({backend.name}): {e}")
+    return None
 
 async def transcribe(mp3_file: str):
     """
-    Transcribes the given MP3 audio file using a remote API.
+    Transcribes the given audio file with the configured backend.
 
     Args:
-        mp3_file: Path to the MP3 file.
+        mp3_file: Path to the audio file.
 
     Returns:
         The transcribed text as a string, or None if transcription fails.
     """
-    # Use environment variable for API URL if available, otherwise default
-    transcribe_api_url = os.getenv("TRANSCRIPTION_API_URL", "https://ngavu2004--brainrot-mastervault-whisper-small-handle-tra-b41132.modal.run/")
-
-    if not transcribe_api_url:
-        print("Error: TRANSCRIPTION_API_URL environment variable not set and no default provided.")
-        return None
-
     if not os.path.exists(mp3_file):
         print(f"Error: Audio file not found at {mp3_file}")
         return None
 
-    print(f"Sending {mp3_file} to transcription API: {transcribe_api_url}")
-    try:
-        with open(mp3_file, "rb") as file:
-            response = requests.post(transcribe_api_url, files={"file": file}, timeout=300) # Added timeout
+    return await _run_backends(mp3_file, "transcribe_file", mp3_file)
 
-        response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
 
-        # Assuming the API returns JSON with the transcription text
-        # Adjust parsing based on the actual API response format
-        transcribed_text = response.json()
-        print("Transcription successful.")
-        return transcribed_text
+async def transcribe_audio_bytes(audio: bytes, filename: str, mime_type: str):
+    """
+    Transcribes in-memory audio (e.g. piped straight out of ffmpeg) without writing it to disk.
 
-    except requests.exceptions.RequestException as e:
-        print(f"Error during transcription API request: {e}")
-        return None
-    except Exception as e:
-        print(f"An unexpected error occurred during transcription: {e}")
-        return None
+    Args:
+        audio: The encoded audio.
+        filename: Name sent with the upload; its extension tells the API the format.
+        mime_type: MIME type of the audio.
+
+    Returns:
+        The transcribed text as a string, or None if transcription fails.
+    """
+    return await _run_backends(f"{filename} ({len(audio)} bytes)", "transcribe_bytes", audio, filename, mime_type)
@@ -0,0 +1,250 @@
+import re
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from urllib.parse import urljoin
+import requests
+from youtube_tools.db_commands import get_short_link, save_short_link
+from tools.http_client import http_get
+from tools.workers import run_in_stage
+
+YOUTUBE_ID = r"(?P<video_id>[A-Za-z0-9_-]{11})"
+TIKTOK_ID = r"(?P<video_id>\d{8,20})"
+
+# URL forms per source, as (source, hosts, path pattern, kind). 'path' takes the id (and
+# TikTok username) from the path, 'query' takes the YouTube id from the v= parameter, and
+# 'short' marks links that only name the video after a redirect (resolve_short_link).
+# Hosts are matched exactly after lowercasing; paths with re.match.
+YOUTUBE_HOSTS = ("youtube.com", "www.youtube.com", "m.youtube.com", "music.youtube.com")
+TIKTOK_HOSTS = ("tiktok.com", "www.tiktok.com", "m.tiktok.com")
+URL_RULES = [
+    ("youtube", YOUTUBE_HOSTS, r"/watch/?$", "query"),
+    ("youtube", YOUTUBE_HOSTS, rf"/(?:shorts|embed|live|v|e)/{YOUTUBE_ID}(?:[/?]|$)", "path"),
+    ("youtube", ("youtu.be", "www.youtu.be"), rf"/{YOUTUBE_ID}(?:[/?]|$)", "path"),
+    ("youtube", ("youtube-nocookie.com", "www.youtube-nocookie.com"), rf"/embed/{YOUTUBE_ID}(?:[/?]|$)", "path"),
+    ("tiktok", TIKTOK_HOSTS, rf"/@?(?P<username>[^/@?]+)/video/{TIKTOK_ID}(?:[/?]|$)", "path"),
+    ("tiktok", ("vm.tiktok.com", "vt.tiktok.com"), r"/[A-Za-z0-9]+/?$", "short"),
+    ("tiktok", TIKTOK_HOSTS, r"/t/[A-Za-z0-9]+/?$", "short"),
+    # Mobile share links carry the id but not the username the pipeline needs
+    ("tiktok", ("m.tiktok.com",), r"/v/\d{8,20}(?:\.html)?/?$", "short"),
+]
+YOUTUBE_QUERY_ID = re.compile(rf"(?:^|&)v={YOUTUBE_ID}(?:&|$)")
+
+# host -> [(compiled path pattern, source, kind)], so routing a URL is one dict lookup
+# plus the few patterns of its host
+_routes = {}
+for _source, _hosts, _pattern, _kind in URL_RULES:
+    for _host in _hosts:
+        _routes.setdefault(_host, []).append((re.compile(_pattern), _source, _kind))
+
+# Redirect hops followed when resolving a short link
+SHORT_LINK_MAX_REDIRECTS = 5
+# Resolved short links kept in memory (all of them are also stored in SQLite)
+SHORT_LINK_CACHE_SIZE = 10000
+# Seconds a short link that led nowhere is remembered, so a dead link isn't fetched again on every request
+SHORT_LINK_FAILURE_TTL = 60
+# TikTok answers clients that don't look like a browser with an error page
+SHORT_LINK_HEADERS = {"User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"}
+
+@dataclass(frozen=True)
+class VideoURL:
+    """A supported video, identified by source and id whatever URL form named it."""
+    source: str
+    video_id: str
+    username: str | None = None # TikTok only
+
+    @property
+    def key(self) -> str:
+        """'youtube:<id>' / 'tiktok:<id>', as used by single-flight and the audio store."""
+        return f"{self.source}:{self.video_id}"
+
+    @property
+    def url(self) -> str:
+        """The canonical URL, without tracking parameters, passed on to downloaders."""
+        if self.source == "youtube":
+            return f"https://www.youtube.com/watch?v={self.video_id}"
+        return f"https://www.tiktok.com/@{self.username}/video/{self.video_id}"
+
+def _split(url: str):
+    """Returns (lowercased host, path, query) of a URL, or None. A missing scheme is allowed."""
+    # Plain string partitions: several times faster than urllib.parse.urlsplit or a regex
+    if not isinstance(url, str):
+        return None
+    url = url.strip()
+    scheme, separator, rest = url.partition("://")
+    if not separator:
+        rest = url
+    elif scheme.lower() not in ("http", "https"):
+        return None
+    rest, _, query = rest.partition("#")[0].partition("?")
+    authority, slash, path = rest.partition("/")
+    # Drop user info and port
+    host = authority.rpartition("@")[2].partition(":")[0].rstrip(".").lower()
+    return host, slash + path, query
+
+def _match(url: str):
+    """Returns (source, kind, path match or query match) for a supported URL form, or None."""
+    parts = _split(url)
+    if parts is None:
+        return None
+    host, path, query = parts
+    for pattern, source, kind in _routes.get(host, ()):
+        match = pattern.match(path)
+        if match is None:
+            continue
+        if kind == "query":
+            match = YOUTUBE_QUERY_ID.search(query)
+            if match is None:
+                continue
+        return source, kind, match
+    return None
+
+def detect_source(url: str) -> str | None:
+    """Returns 'youtube' or 'tiktok' for any supported URL form (short links included), else None. No network."""
+    matched = _match(url)
+    return matched[0] if matched else None
+
+def parse_video_url(url: str) -> VideoURL | None:
+    """
+    Normalises a video URL to its VideoURL without any network access. Returns None for
+    unsupported URLs and for short links, which need resolve_short_link().
+    """
+    matched = _match(url)
+    if matched is None or matched[1] == "short":
+        return None
+    source, _, match = matched
+    if source == "tiktok":
+        return VideoURL(source, match.group("video_id"), match.group("username"))
+    return VideoURL(source, match.group("video_id"))
+
+# Counts of short links answered from memory, from SQLite, by following redirects, or not
+# at all (failed: a lookup that just failed, known_bad: a recent failure answered from memory)
+short_link_stats = {"memory": 0, "database": 0, "resolved": 0, "failed": 0, "known_bad": 0}
+_resolved = OrderedDict()
+# Short link key -> time.monotonic() its resolution failed
+_failed = OrderedDict()
+_resolved_lock = threading.Lock()
+
+def _count(outcome: str):
+    with _resolved_lock:
+        short_link_stats[outcome] += 1
+
+def short_link_key(url: str) -> str | None:
+    """The cache key of a short link: host and path, without scheme, query or trailing slash."""
+    parts = _split(url)
+    return f"{parts[0]}{parts[1].rstrip('/')}" if parts else None
+
+def _remember(key: str, video: VideoURL):
+    with _resolved_lock:
+        _resolved[key] = video
+        _resolved.move_to_end(key)
+        while len(_resolved) > SHORT_LINK_CACHE_SIZE:
+            _resolved.popitem(last=False)
+
+def _get_remembered(key: str) -> VideoURL | None:
+    """A short link's video from memory, if it is there. Never blocks."""
+    with _resolved_lock:
+        video = _resolved.get(key)
+        if video is not None:
+            _resolved.move_to_end(key)
+            short_link_stats["memory"] += 1
+        return video
+
+def _failed_recently(key: str) -> bool:
+    with _resolved_lock:
+        failed_at = _failed.get(key)
+        if failed_at is None:
+            return False
+        if time.monotonic() - failed_at > SHORT_LINK_FAILURE_TTL:
+            del _failed[key]
+            return False
+        short_link_stats["known_bad"] += 1
+        return True
+
+def _remember_failure(key: str):
+    with _resolved_lock:
+        _failed[key] = time.monotonic()
+        _failed.move_to_end(key)
+        while len(_failed) > SHORT_LINK_CACHE_SIZE:
+            _failed.popitem(last=False)
+        short_link_stats["failed"] += 1
+
+def get_resolved_short_link(url: str) -> VideoURL | None:
+    """Returns a short link's video if it was resolved before (memory, then SQLite). No network."""
+    key = short_link_key(url)
+    video = _get_remembered(key)
+    if video is not None:
+        return video
+    row = get_short_link(key)
+    if row is None:
+        return None
+    video = VideoURL(*row)
+    _remember(key, video)
+    _count("database")
+    return video
+
+def _next_location(url: str) -> str | None:
+    """Requests a URL without following redirects and returns where it redirects to, if anywhere."""
+    response = http_get(url, timeout=10, deadline=20, allow_redirects=False, stream=True, headers=SHORT_LINK_HEADERS)
+    response.close() # Only the headers are needed
+    location = response.headers.get("Location") if response.is_redirect else None
+    return urljoin(url, location) if location else None
+
+def resolve_short_link(url: str) -> VideoURL | None:
+    """
+    Resolves a short link (vm.tiktok.com/..., tiktok.com/t/..., m.tiktok.com/v/<id>.html)
+    to its video by following redirects until one names a video (blocking). Results are
+    cached in memory and in SQLite, so each short link costs one lookup ever. Returns None
+    if the link doesn't lead to a supported video.
+    """
+    video = get_resolved_short_link(url)
+    if video is not None:
+        return video
+    key = short_link_key(url)
+    if _failed_recently(key):
+        return None
+    location = url
+    try:
+        for _ in range(SHORT_LINK_MAX_REDIRECTS):
+            location = _next_location(location)
+            if location is None:
+                break
+            video = parse_video_url(location)
+            if video is not None:
+                break
+    except requests.exceptions.RequestException as e:
+        print(f"Error resolving short link {url}: {e}")
+    if video is None:
+        print(f"Short link did not lead to a supported video: {url}")
+        _remember_failure(key)
+        return None
+    save_short_link(key, video.source, video.video_id, video.username)
+    _remember(key, video)
+    _count("resolved")
+    return video
+
+async def resolve_video_url(url: str) -> VideoURL | None:
+    """
+    Normalises any supported video URL, short links included, to its VideoURL. Only
+    short links held in memory (resolved, or failed within SHORT_LINK_FAILURE_TTL) are
+    answered on the event loop; the SQLite lookup and, for a link never resolved before,
+    the redirects run on the metadata pool.
+    """
+    matched = _match(url)
+    if matched is None:
+        return None
+    if matched[1] != "short":
+        return parse_video_url(url)
+    key = short_link_key(url)
+    video = _get_remembered(key)
+    if video is not None:
+        return video
+    if _failed_recently(key):
+        return None
+    return await run_in_stage("metadata", resolve_short_link, url)
+
+def get_short_link_stats():
+    """Returns short-link lookups by where they were answered, and how many resolved and failed links are held in memory."""
+    with _resolved_lock:
+        return {**short_link_stats, "cached": len(_resolved), "cached_failures": len(_failed)}
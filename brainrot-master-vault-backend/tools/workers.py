@@ -0,0 +1,64 @@
+import os
+import asyncio
+import functools
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from tools.metrics import time_stage
+
+# Maximum number of blocking calls each pipeline stage may run at once.
+# Each stage gets its own thread pool, so a burst of slow downloads cannot starve
+# transcription or summarisation, and none of them block the event loop.
+# Override per deployment with e.g. DOWNLOAD_CONCURRENCY=8.
+STAGE_CONCURRENCY = {
+    "metadata": int(os.getenv("METADATA_CONCURRENCY", "8")),
+    "download": int(os.getenv("DOWNLOAD_CONCURRENCY", "4")),
+    "audio": int(os.getenv("AUDIO_CONCURRENCY", "2")),
+    "transcription": int(os.getenv("TRANSCRIPTION_CONCURRENCY", "4")),
+    "summarization": int(os.getenv("SUMMARIZATION_CONCURRENCY", "4")),
+    "embedding": int(os.getenv("EMBEDDING_CONCURRENCY", "2")),
+    # Transcript/summary/response cache reads and writes (SQLite or Redis). Short calls,
+    # kept off the pools above so a cache hit never waits behind a Whisper or Gemini call
+    "cache": int(os.getenv("CACHE_CONCURRENCY", "8")),
+}
+
+# Optional callback invoked with the stage name each time run_in_stage starts a stage.
+# Background job workers set it so every job records which stage it has reached.
+stage_listener = contextvars.ContextVar("stage_listener", default=None)
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+def get_executor(stage: str) -> ThreadPoolExecutor:
+    """Returns the thread pool for a pipeline stage, creating it on first use."""
+    if stage not in STAGE_CONCURRENCY:
+        raise ValueError(f"Unknown pipeline stage '{stage}'. Expected one of: {', '.join(STAGE_CONCURRENCY)}")
+    with _executors_lock:
+        executor = _executors.get(stage)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=STAGE_CONCURRENCY[stage], thread_name_prefix=f"{stage}-worker")
+            _executors[stage] = executor
+        return executor
+
+async def run_in_stage(stage: str, func, *args, **kwargs):
+    """
+    Runs a blocking function on the given stage's thread pool and awaits its result.
+
+    Calls beyond the stage's concurrency limit wait in the pool's queue without
+    holding up the event loop. Each call's duration is recorded under the stage's name.
+    """
+    listener = stage_listener.get()
+    if listener:
+        listener(stage)
+    loop = asyncio.get_running_loop()
+    # Timed from the caller's side, so queueing for a busy pool counts towards the stage
+    with time_stage(stage):
+        return await loop.run_in_executor(get_executor(stage), functools.partial(func, *args, **kwargs))
+
+def shutdown_executors():
+    """Shuts down every stage's thread pool. Call on application shutdown."""
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=False, cancel_futures=True)
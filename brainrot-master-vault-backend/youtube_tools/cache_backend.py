@@ -0,0 +1,308 @@
+import os
+import uuid
+import queue
+import socket
+import threading
+from urllib.parse import urlparse
+
+# Where cached responses, transcripts and summaries are shared between API replicas:
+# "sqlite" (default) keeps everything in this replica's database file, "redis" also
+# stores them in a Redis server (REDIS_URL) that every replica reads through on a miss.
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "sqlite").lower()
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Prefix of every key, so several deployments can share one Redis database
+REDIS_KEY_PREFIX = os.getenv("REDIS_KEY_PREFIX", "brainrot:")
+# Socket connect/read timeout (seconds) and the number of pooled connections
+REDIS_TIMEOUT = float(os.getenv("REDIS_TIMEOUT", "2"))
+REDIS_POOL_SIZE = int(os.getenv("REDIS_POOL_SIZE", "8"))
+# Keys per MGET when reading many entries; the MGETs of one call go out in a single pipeline
+REDIS_MGET_BATCH = 500
+# How long (seconds) a lock is held unless extended, so a crashed holder can't block others forever
+CACHE_LOCK_TTL = float(os.getenv("CACHE_LOCK_TTL", "120"))
+
+# Deletes/extends a lock only if it is still held with our token (a lock that expired and
+# was taken by someone else must not be released by its previous holder)
+RELEASE_LOCK_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+EXTEND_LOCK_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) else return 0 end"
+
+class CacheBackendError(Exception):
+    """Raised when the shared cache can't be reached or rejects a command."""
+
+class CacheBackend:
+    """
+    Storage shared by every replica for the per-video cache entries kept by db_commands
+    ("response", "transcript", "summary"), plus named locks. Values are strings; None
+    means missing (get_many) or delete (set_many).
+
+    db_commands always reads and writes the local SQLite database first. When `shared`
+    is True, misses are looked up here and writes are copied here.
+    """
+    name = "base"
+    shared = False
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def get_many(self, kind: str, video_ids: list[str]) -> dict:
+        """Returns {video_id: value} for the ids that have an entry."""
+        raise NotImplementedError
+
+    def set_many(self, kind: str, values: dict):
+        """Stores {video_id: value}, deleting the entries whose value is None."""
+        raise NotImplementedError
+
+    def acquire_lock(self, name: str, ttl: float = CACHE_LOCK_TTL) -> str | None:
+        """Takes the lock if it is free (or expired). Returns a token for release/extend, or None if it is held."""
+        raise NotImplementedError
+
+    def extend_lock(self, name: str, token: str, ttl: float = CACHE_LOCK_TTL) -> bool:
+        """Pushes a held lock's expiry out to ttl seconds from now. False if it was lost."""
+        raise NotImplementedError
+
+    def release_lock(self, name: str, token: str):
+        """Releases a lock taken with acquire_lock(), if it is still ours."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def stats(self):
+        """Returns hits, misses and errors of shared lookups."""
+        return {"hits": self.hits, "misses": self.misses, "errors": self.errors}
+
+class SQLiteBackend(CacheBackend):
+    """
+    The default: this replica's SQLite database is the only store, so there is nothing
+    to look up beyond it. Locks are rows of its `locks` table, so they hold between
+    processes using the same database file.
+    """
+    name = "sqlite"
+
+    def get_many(self, kind, video_ids):
+        return {}
+
+    def set_many(self, kind, values):
+        pass
+
+    def acquire_lock(self, name, ttl=CACHE_LOCK_TTL):
+        # Imported here: db_commands imports this module
+        from youtube_tools import db_commands
+        token = uuid.uuid4().hex
+        return token if db_commands.acquire_lock(name, token, ttl) else None
+
+    def extend_lock(self, name, token, ttl=CACHE_LOCK_TTL):
+        from youtube_tools import db_commands
+        return db_commands.extend_lock(name, token, ttl)
+
+    def release_lock(self, name, token):
+        from youtube_tools import db_commands
+        db_commands.release_lock(name, token)
+
+class RedisConnection:
+    """One socket speaking the Redis protocol (RESP2)."""
+
+    def __init__(self, host: str, port: int, timeout: float):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+
+    @staticmethod
+    def encode(command) -> bytes:
+        parts = [b"*%d\r\n" % len(command)]
+        for arg in command:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    def read_reply(self):
+        """Reads one reply. Error replies are returned as CacheBackendError instances, not raised."""
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("Redis closed the connection")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode("utf-8")
+        if kind == b"-":
+            return CacheBackendError(payload.decode("utf-8"))
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            return data[:-2].decode("utf-8")
+        if kind == b"*":
+            length = int(payload)
+            return None if length < 0 else [self.read_reply() for _ in range(length)]
+        raise ConnectionError(f"Unexpected reply from Redis: {line!r}")
+
+    def pipeline(self, commands):
+        """Sends every command in one write, then reads their replies in order."""
+        self.sock.sendall(b"".join(self.encode(command) for command in commands))
+        return [self.read_reply() for _ in commands]
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+class RedisBackend(CacheBackend):
+    """
+    Shares cache entries and locks between replicas through a Redis server (or anything
+    speaking its protocol). Commands go over a small pool of persistent connections, and
+    batches are pipelined so a call costs one round trip. If Redis is unreachable, lookups
+    count as misses and writes are skipped: every replica still has its own SQLite copy.
+    """
+    name = "redis"
+    shared = True
+
+    def __init__(self, url: str = REDIS_URL, key_prefix: str = REDIS_KEY_PREFIX,
+                 pool_size: int = REDIS_POOL_SIZE, timeout: float = REDIS_TIMEOUT):
+        super().__init__()
+        parsed = urlparse(url)
+        if parsed.scheme != "redis":
+            raise ValueError(f"Unsupported REDIS_URL scheme {parsed.scheme!r}; expected redis://host:port/db")
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.password = parsed.password
+        self.key_prefix = key_prefix
+        self.timeout = timeout
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+    def key(self, kind: str, name: str) -> str:
+        return f"{self.key_prefix}{kind}:{name}"
+
+    def _connect(self) -> RedisConnection:
+        connection = RedisConnection(self.host, self.port, self.timeout)
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        for reply in connection.pipeline(setup) if setup else ():
+            if isinstance(reply, CacheBackendError):
+                connection.close()
+                raise reply
+        return connection
+
+    def execute(self, *commands):
+        """
+        Runs commands as one pipeline on a pooled connection and returns their replies.
+        Raises CacheBackendError if Redis is unreachable or any command fails.
+        """
+        with self._slots:
+            try:
+                connection = self._pool.get_nowait()
+            except queue.Empty:
+                connection = None
+            try:
+                if connection is None:
+                    connection = self._connect()
+                replies = connection.pipeline(commands)
+            except (OSError, ConnectionError) as e:
+                # The connection may be half-read: never reuse it
+                if connection is not None:
+                    connection.close()
+                raise CacheBackendError(f"Redis at {self.host}:{self.port} unreachable: {e}") from e
+            self._pool.put_nowait(connection)
+        for reply in replies:
+            if isinstance(reply, CacheBackendError):
+                raise reply
+        return replies
+
+    def get_many(self, kind, video_ids):
+        video_ids = list(dict.fromkeys(video_ids))
+        if not video_ids:
+            return {}
+        batches = [video_ids[start:start + REDIS_MGET_BATCH] for start in range(0, len(video_ids), REDIS_MGET_BATCH)]
+        try:
+            replies = self.execute(*(("MGET", *(self.key(kind, video_id) for video_id in batch)) for batch in batches))
+        except CacheBackendError as e:
+            self.errors += 1
+            print(f"Shared cache error reading {len(video_ids)} {kind} entries: {e}")
+            return {}
+        values = {
+            video_id: value
+            for batch, reply in zip(batches, replies)
+            for video_id, value in zip(batch, reply)
+            if value is not None
+        }
+        self.hits += len(values)
+        self.misses += len(video_ids) - len(values)
+        return values
+
+    def set_many(self, kind, values):
+        if not values:
+            return
+        commands = [
+            ("DEL", self.key(kind, video_id)) if value is None else ("SET", self.key(kind, video_id), value)
+            for video_id, value in values.items()
+        ]
+        try:
+            self.execute(*commands)
+        except CacheBackendError as e:
+            self.errors += 1
+            print(f"Shared cache error writing {len(values)} {kind} entries: {e}")
+
+    def acquire_lock(self, name, ttl=CACHE_LOCK_TTL):
+        token = uuid.uuid4().hex
+        try:
+            reply, = self.execute(("SET", self.key("lock", name), token, "NX", "PX", int(ttl * 1000)))
+        except CacheBackendError as e:
+            # Without Redis there is nothing to coordinate with: carry on unlocked
+            self.errors += 1
+            print(f"Shared cache error taking lock {name}, continuing without it: {e}")
+            return token
+        return token if reply == "OK" else None
+
+    def extend_lock(self, name, token, ttl=CACHE_LOCK_TTL):
+        try:
+            reply, = self.execute(("EVAL", EXTEND_LOCK_SCRIPT, 1, self.key("lock", name), token, int(ttl * 1000)))
+        except CacheBackendError as e:
+            self.errors += 1
+            print(f"Shared cache error extending lock {name}: {e}")
+            return False
+        return reply == 1
+
+    def release_lock(self, name, token):
+        try:
+            self.execute(("EVAL", RELEASE_LOCK_SCRIPT, 1, self.key("lock", name), token))
+        except CacheBackendError as e:
+            # It expires after its TTL anyway
+            self.errors += 1
+            print(f"Shared cache error releasing lock {name}: {e}")
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+def make_cache_backend(name: str = CACHE_BACKEND) -> CacheBackend:
+    """Builds the backend selected by CACHE_BACKEND."""
+    if name == "redis":
+        return RedisBackend()
+    if name != "sqlite":
+        raise ValueError(f"Unknown CACHE_BACKEND {name!r}; expected 'sqlite' or 'redis'")
+    return SQLiteBackend()
+
+# The process-wide backend used by db_commands and single_flight
+_cache_backend = make_cache_backend()
+
+def get_cache_backend() -> CacheBackend:
+    return _cache_backend
+
+def set_cache_backend(backend: CacheBackend):
+    """Replaces the process-wide backend (e.g. to point a benchmark at a stand-in server)."""
+    global _cache_backend
+    _cache_backend.close()
+    _cache_backend = backend
@@ -1,6 +1,19 @@
 import sqlite3
 import json
 import os
+import re
+import time
+import uuid
+import zlib
+import threading
+from tools.metrics import timed, record_cache_lookup
+from youtube_tools.memory_cache import memory_cache
+from youtube_tools.cache_backend import get_cache_backend
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 # Define the path for the database file relative to this script's location
 if os.path.exists('/db/cache/'):
@@ -10,296 +23,1806 @@ else:
     DB_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(DB_DIR, 'youtube_cache.db')
 
-def init_db():
-    """Initializes the SQLite database and creates the cache table if it doesn't exist."""
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        # Create table if it doesn't exist
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS cache (
+# Size of sqlite3's per-connection prepared statement cache. Every query in this
+# module is a fixed SQL string, so they all stay compiled for the connection's lifetime.
+STATEMENT_CACHE_SIZE = 128
+
+# Pragmas applied once to every pooled connection.
+# WAL lets readers proceed while a writer holds the lock, and synchronous=NORMAL
+# is safe under WAL (only the last transactions can be lost on power failure).
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",    # ~16 MB page cache per connection
+    "PRAGMA mmap_size=134217728",  # 128 MB memory-mapped I/O
+    "PRAGMA foreign_keys=OFF",
+)
+
+# Codec for transcripts and summaries written to their side tables: "none" (default), "zlib",
+# or "zstd" (needs the optional zstandard package; zlib is used without it). Rows record their
+# own encoding, so the setting can be changed at any time.
+TEXT_COMPRESSION = os.getenv("TEXT_COMPRESSION", "none").lower()
+# Texts shorter than this are stored as-is: compressing them saves next to nothing
+TEXT_COMPRESSION_MIN_BYTES = 512
+
+def encode_text(text: str):
+    """Returns (body, encoding) for storing a text under TEXT_COMPRESSION."""
+    data = text.encode("utf-8")
+    if TEXT_COMPRESSION == "none" or len(data) < TEXT_COMPRESSION_MIN_BYTES:
+        return text, "plain"
+    if TEXT_COMPRESSION == "zstd" and zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(data), "zstd"
+    return zlib.compress(data, 6), "zlib"
+
+def decode_text(body, encoding: str):
+    """Inverse of encode_text(). Also registered as the decode_text() SQL function on every connection."""
+    if body is None or encoding == "plain":
+        return body
+    if encoding == "zlib":
+        return zlib.decompress(body).decode("utf-8")
+    if encoding == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd-compressed text found but the zstandard package is not installed (pip install zstandard).")
+        return zstandard.ZstdDecompressor().decompress(body).decode("utf-8")
+    raise ValueError(f"Unknown text encoding: {encoding}")
+
+# One connection per thread, keyed by DB_PATH so tests/benchmarks that repoint
+# DB_PATH get a fresh connection. All opened connections are tracked so they can
+# be closed on shutdown.
+_local = threading.local()
+_pool_lock = threading.Lock()
+_pool = []
+
+def get_connection():
+    """
+    Returns the pooled SQLite connection for the current thread, opening and
+    configuring it on first use.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.path == DB_PATH:
+        return conn
+
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=5.0,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    # Used by queries and the search index triggers to read the text side tables
+    conn.create_function("decode_text", 2, decode_text, deterministic=True)
+
+    _local.conn = conn
+    _local.path = DB_PATH
+    with _pool_lock:
+        _pool.append(conn)
+    return conn
+
+def close_connections():
+    """Closes every pooled connection. Call on application shutdown."""
+    with _pool_lock:
+        connections = list(_pool)
+        _pool.clear()
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Database error closing pooled connection: {e}")
+    _local.__dict__.clear()
+
+def _add_column_if_missing(cursor, table: str, column: str, column_type: str):
+    """Adds a column to a table unless it already has it."""
+    columns = [row[1] for row in cursor.execute(f"PRAGMA table_info({table})")]
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+        print(f"Added '{column}' column to {table} table.")
+
+# Title extraction used by the version 1 search triggers, when titles only lived in the response JSON
+_V1_TITLE_SQL = '''CASE WHEN json_valid({column})
+                    THEN COALESCE(json_extract({column}, '$.items[0].snippet.title'),
+                                  json_extract({column}, '$.title'))
+               END'''
+
+def _migration_1_baseline(cursor):
+    """
+    The schema as it stood before versioned migrations: databases created by earlier
+    releases (user_version 0) already have some or all of it, so every step is idempotent.
+    """
+    rebuild = set()
+    # Create table if it doesn't exist
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cache (
+            video_id TEXT PRIMARY KEY,
+            response_data TEXT NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Create classification table if it doesn't exist
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS classification (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            video_id TEXT NOT NULL,
+            classification TEXT NOT NULL,
+            FOREIGN KEY (video_id) REFERENCES cache (video_id)
+        );
+    ''')
+
+    # Add transcript column if it doesn't exist
+    _add_column_if_missing(cursor, "cache", "transcript", "TEXT")
+
+    # Add source column if it doesn't exist
+    _add_column_if_missing(cursor, "cache", "source", "TEXT")
+
+    # Add summary column if it doesn't exist
+    _add_column_if_missing(cursor, "cache", "summary", "TEXT")
+
+    # Index classification lookups by video so get_all() and add_classification()
+    # don't scan the whole table
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_classification_video_id ON classification (video_id)")
+
+    # Create the ingestion job queue table if it doesn't exist
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            stage TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            error TEXT,
+            result TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            run_after DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_run_after ON jobs (status, run_after)")
+
+    # Create the content-addressed audio store tables if they don't exist.
+    # audio_blobs has one row per distinct audio file (by SHA-256 of its bytes);
+    # audio_refs maps each video (e.g. 'youtube:<id>') to the blob holding its audio.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS audio_blobs (
+            sha256 TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            last_access DATETIME DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')) -- millisecond resolution for LRU order
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_audio_blobs_last_access ON audio_blobs (last_access)")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS audio_refs (
+            ref_key TEXT PRIMARY KEY,
+            sha256 TEXT NOT NULL REFERENCES audio_blobs (sha256)
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_audio_refs_sha256 ON audio_refs (sha256)")
+
+    # Create the audio fingerprint table if it doesn't exist. reused_from is set when a
+    # video's transcript was copied from another video with the same audio.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS audio_fingerprints (
+            video_id TEXT PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            duration REAL,
+            reused_from TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_audio_fingerprints_fingerprint ON audio_fingerprints (fingerprint)")
+
+    # Create the transcript chunk table if it doesn't exist. Long audio is transcribed
+    # in chunks; finished chunks are kept so a retry only redoes the ones that failed.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS transcript_chunks (
+            audio_key TEXT NOT NULL,
+            start REAL NOT NULL,
+            end REAL NOT NULL,
+            transcript TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (audio_key, start, end)
+        )
+    ''')
+
+    # Create the podcast segment table if it doesn't exist. Each row is the script for one
+    # group of videos, keyed by a hash of its inputs, so rebuilding a podcast after a few
+    # videos were added only generates the segments that changed.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS podcast_segments (
+            segment_key TEXT PRIMARY KEY,
+            classification TEXT,
+            video_ids TEXT NOT NULL,
+            script TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Create the embeddings table if it doesn't exist. It maps each video to its row in
+    # the float16 vector file managed by tools/embeddings.py.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS embeddings (
+            video_id TEXT PRIMARY KEY,
+            row INTEGER NOT NULL UNIQUE,
+            model TEXT NOT NULL,
+            content_hash TEXT,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Create the summary cache table if it doesn't exist. Summaries are keyed by a hash
+    # of (prompt template, model, input), so identical inputs are only billed once.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS summary_cache (
+            input_hash TEXT PRIMARY KEY,
+            model TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Knowledge graph tables, updated incrementally by cache_response() and add_classification().
+    # Node ids are "video:<id>", "classification:<name>" and "channel:<source>:<name>"; a node's
+    # weight is 1 for videos and its number of videos otherwise.
+    graph_exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'graph_nodes'"
+    ).fetchone()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS graph_nodes (
+            node_id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            label TEXT,
+            source TEXT,
+            weight INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_graph_nodes_kind_weight ON graph_nodes (kind, weight)")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS graph_edges (
+            source TEXT NOT NULL,
+            target TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            weight INTEGER NOT NULL DEFAULT 1,
+            PRIMARY KEY (source, target)
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_graph_edges_target ON graph_edges (target)")
+    if not graph_exists:
+        # Build the graph from the videos cached before it existed
+        rebuild.add("graph")
+
+    # Full-text index over titles, transcripts and summaries (rowid = cache.rowid),
+    # kept in sync with the cache table by triggers
+    fts_exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'cache_fts'"
+    ).fetchone()
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS cache_fts USING fts5(
+            title, transcript, summary, tokenize = 'unicode61 remove_diacritics 2'
+        )
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS cache_fts_insert AFTER INSERT ON cache BEGIN
+            INSERT INTO cache_fts (rowid, title, transcript, summary)
+            VALUES (new.rowid, {_V1_TITLE_SQL.format(column="new.response_data")}, new.transcript, new.summary);
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS cache_fts_update AFTER UPDATE OF response_data, transcript, summary ON cache BEGIN
+            DELETE FROM cache_fts WHERE rowid = old.rowid;
+            INSERT INTO cache_fts (rowid, title, transcript, summary)
+            VALUES (new.rowid, {_V1_TITLE_SQL.format(column="new.response_data")}, new.transcript, new.summary);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS cache_fts_delete AFTER DELETE ON cache BEGIN
+            DELETE FROM cache_fts WHERE rowid = old.rowid;
+        END
+    ''')
+    if not fts_exists:
+        # Index the videos cached before the search index existed
+        rebuild.add("search")
+    return rebuild
+
+# Side tables holding each video's large texts, keyed by video_id
+TEXT_TABLES = ("responses", "transcripts", "summaries")
+
+# Keeps cache_fts in step with a video's title (cache), transcript and summary (side tables)
+_FTS_REFRESH_SQL = """
+    DELETE FROM cache_fts WHERE rowid = (SELECT id FROM cache WHERE video_id = {video_id});
+    INSERT INTO cache_fts (rowid, title, transcript, summary)
+    SELECT c.id, c.title, decode_text(t.body, t.encoding), decode_text(s.body, s.encoding)
+    FROM cache c
+    LEFT JOIN transcripts t ON t.video_id = c.video_id
+    LEFT JOIN summaries s ON s.video_id = c.video_id
+    WHERE c.video_id = {video_id};
+"""
+
+def _migration_2_normalised_cache(cursor):
+    """
+    Rebuilds the cache table as one small row of typed metadata per video (parsed out of
+    response_data), and moves the response JSON, transcripts and summaries into side
+    tables that are only read when asked for. Row ids are kept, so pagination cursors
+    stay valid.
+    """
+    cursor.execute("""
+        CREATE TABLE cache_v2 (
+            id INTEGER PRIMARY KEY,
+            video_id TEXT NOT NULL UNIQUE,
+            source TEXT,
+            title TEXT,
+            channel TEXT,
+            published_at TEXT,
+            duration REAL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # One row per video, body stored as-is ('plain') or compressed (see encode_text)
+    for table in TEXT_TABLES:
+        cursor.execute(f"""
+            CREATE TABLE {table} (
                 video_id TEXT PRIMARY KEY,
-                response_data TEXT NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                body BLOB NOT NULL,
+                encoding TEXT NOT NULL DEFAULT 'plain'
             )
-        ''')
-
-        # Create classification table if it doesn't exist
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS classification (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                video_id TEXT NOT NULL,
-                classification TEXT NOT NULL,
-                FOREIGN KEY (video_id) REFERENCES cache (video_id)
-            );
-        ''')
-
-        # Add transcript column if it doesn't exist
-        try:
-            cursor.execute("ALTER TABLE cache ADD COLUMN transcript TEXT")
-            print("Added 'transcript' column to cache table.")
-        except sqlite3.OperationalError as e:
-            # Ignore error if column already exists
-            if "duplicate column name" not in str(e):
-                raise e
-            # else:
-            #     print("'transcript' column already exists.") # Optional: uncomment for verbose logging
-
-        # Add source column if it doesn't exist
-        try:
-            cursor.execute("ALTER TABLE cache ADD COLUMN source TEXT")
-            print("Added 'source' column to cache table.")
-        except sqlite3.OperationalError as e:
-            # Ignore error if column already exists
-            if "duplicate column name" not in str(e):
-                raise e
-            # else:
-            #     print("'source' column already exists.") # Optional: uncomment for verbose logging
-
-        # Add summary column if it doesn't exist
+        """)
+
+    # Streamed through a second cursor rather than fetched, so large vaults aren't held in memory
+    for rowid, video_id, source, response_json, timestamp in cursor.connection.execute(
+        "SELECT rowid, video_id, source, response_data, timestamp FROM cache"
+    ):
+        response_data = _parse_response_data(response_json)
+        stripped = _without_texts(response_data)
+        cursor.execute(
+            """
+            INSERT INTO cache_v2 (id, video_id, source, title, channel, published_at, duration, timestamp)
+            VALUES (:id, :video_id, :source, :title, :channel, :published_at, :duration, :timestamp)
+            """,
+            {"id": rowid, "video_id": video_id, "source": source, "timestamp": timestamp, **video_fields(stripped)},
+        )
+        # Rows created by cache_transcript/cache_summary alone held '{}' as a placeholder
+        if stripped:
+            cursor.execute(
+                "INSERT INTO responses (video_id, body) VALUES (?, ?)",
+                (video_id, response_json if stripped is response_data else json.dumps(stripped)),
+            )
+    # Videos whose audio was fingerprinted have a measured duration
+    cursor.execute("""
+        UPDATE cache_v2 SET duration = (SELECT duration FROM audio_fingerprints f WHERE f.video_id = cache_v2.video_id)
+        WHERE duration IS NULL
+    """)
+    # TikTok responses also carried the transcript and summary in their JSON, which fills in missing ones
+    for table, column, key in (("transcripts", "transcript", "transcription"), ("summaries", "summary", "summary")):
+        cursor.execute(f"""
+            INSERT INTO {table} (video_id, body)
+            SELECT video_id, body FROM (
+                SELECT video_id, COALESCE({column}, CASE WHEN json_valid(response_data)
+                                                         THEN json_extract(response_data, '$.{key}') END) AS body
+                FROM cache
+            ) WHERE body IS NOT NULL AND body != ''
+        """)
+
+    # Dropping the old table also drops its search triggers
+    cursor.execute("DROP TABLE cache")
+    cursor.execute("ALTER TABLE cache_v2 RENAME TO cache")
+    cursor.execute("CREATE INDEX idx_cache_source ON cache (source)")
+    cursor.execute("CREATE INDEX idx_cache_channel ON cache (channel)")
+    cursor.execute("CREATE INDEX idx_cache_published_at ON cache (published_at)")
+
+    cursor.execute(f"""
+        CREATE TRIGGER cache_fts_insert AFTER INSERT ON cache BEGIN
+            {_FTS_REFRESH_SQL.format(video_id="new.video_id")}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER cache_fts_update AFTER UPDATE OF title ON cache BEGIN
+            {_FTS_REFRESH_SQL.format(video_id="new.video_id")}
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER cache_fts_delete AFTER DELETE ON cache BEGIN
+            DELETE FROM cache_fts WHERE rowid = old.id;
+        END
+    """)
+    for table in ("transcripts", "summaries"):
+        for event, row in (("INSERT", "new"), ("UPDATE", "new"), ("DELETE", "old")):
+            cursor.execute(f"""
+                CREATE TRIGGER {table}_fts_{event.lower()} AFTER {event} ON {table} BEGIN
+                    {_FTS_REFRESH_SQL.format(video_id=f"{row}.video_id")}
+                END
+            """)
+    # Texts recovered from TikTok JSON aren't indexed yet
+    return {"search"}
+
+def _migration_3_locks(cursor):
+    """Adds the table holding SQLiteBackend's named locks (see cache_backend.py)."""
+    cursor.execute("""
+        CREATE TABLE locks (
+            name TEXT PRIMARY KEY,
+            token TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+    return set()
+
+def _migration_4_metadata_refresh(cursor):
+    """Adds what the stale-while-revalidate metadata refresh reads (see tools/metadata_refresh.py)."""
+    # Finds a source's responses older than its TTL without a scan
+    cursor.execute("CREATE INDEX idx_cache_source_timestamp ON cache (source, timestamp)")
+    cursor.execute("""
+        CREATE TABLE refresh_etags (
+            batch_key TEXT PRIMARY KEY,
+            etag TEXT NOT NULL,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    return set()
+
+def _migration_5_short_links(cursor):
+    """Adds the cache of resolved short links (see tools/video_urls.py)."""
+    cursor.execute("""
+        CREATE TABLE short_links (
+            link TEXT PRIMARY KEY,
+            source TEXT NOT NULL,
+            video_id TEXT NOT NULL,
+            username TEXT,
+            resolved_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    return set()
+
+def _migration_6_job_leases(cursor):
+    """
+    Adds job leases: a running job belongs to the worker that claimed it until
+    lease_expires, which the worker keeps extending while it runs.
+    """
+    cursor.execute("ALTER TABLE jobs ADD COLUMN claimed_at DATETIME")
+    cursor.execute("ALTER TABLE jobs ADD COLUMN lease_expires DATETIME")
+    return set()
+
+# Schema migrations as (version, description, function), applied in order by init_db().
+# PRAGMA user_version records the last one applied, so each runs once per database.
+# Append new migrations here; never change one that has shipped. A migration returns
+# the derived indexes ("search", "graph") to rebuild once all migrations have run.
+MIGRATIONS = [
+    (1, "baseline schema", _migration_1_baseline),
+    (2, "typed video columns; responses, transcripts and summaries in side tables", _migration_2_normalised_cache),
+    (3, "named locks", _migration_3_locks),
+    (4, "metadata refresh index and ETags", _migration_4_metadata_refresh),
+    (5, "resolved short links", _migration_5_short_links),
+    (6, "job leases", _migration_6_job_leases),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version() -> int:
+    """Returns the migration version the database is at (0 if it predates migrations)."""
+    return get_connection().execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn):
+    """
+    Applies every pending migration, each in its own transaction together with its
+    user_version bump, so a failed migration leaves the database at the previous version.
+    Returns the set of derived indexes the applied migrations asked to rebuild.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version > SCHEMA_VERSION:
+        raise sqlite3.DatabaseError(f"Database schema version {version} is newer than this code ({SCHEMA_VERSION})")
+    rebuild = set()
+    for target, description, migration in MIGRATIONS:
+        if target <= version:
+            continue
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
         try:
-            cursor.execute("ALTER TABLE cache ADD COLUMN summary TEXT")
-            print("Added 'summary' column to cache table.")
-        except sqlite3.OperationalError as e:
-            # Ignore error if column already exists
-            if "duplicate column name" not in str(e):
-                raise e
-            # else:
-            #     print("'summary' column already exists.") # Optional: uncomment for verbose logging
-
-        conn.commit()
-        print(f"Database initialized successfully at {DB_PATH}")
+            rebuild |= migration(cursor)
+            cursor.execute(f"PRAGMA user_version = {target}")
+            cursor.execute("COMMIT")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        print(f"Applied database migration {target}: {description}")
+    return rebuild
+
+def init_db():
+    """Initializes the SQLite database, bringing its schema up to date with MIGRATIONS."""
+    try:
+        conn = get_connection()
+        rebuild = migrate(conn)
+        with conn:
+            cursor = conn.cursor()
+            if "search" in rebuild:
+                _build_search_index(cursor)
+            if "graph" in rebuild:
+                _build_graph(cursor)
+        print(f"Database initialized successfully at {DB_PATH} (schema version {SCHEMA_VERSION})")
     except sqlite3.Error as e:
         print(f"Database error during initialization: {e}")
-    finally:
-        if conn:
-            conn.close()
 
+def _build_search_index(cursor):
+    """Refills cache_fts from the cache and text tables."""
+    cursor.execute("DELETE FROM cache_fts")
+    cursor.execute(f"""
+        INSERT INTO cache_fts (rowid, title, transcript, summary)
+        SELECT c.id, c.title, {text_sql('t')}, {text_sql('s')}
+        FROM cache c
+        LEFT JOIN transcripts t ON t.video_id = c.video_id
+        LEFT JOIN summaries s ON s.video_id = c.video_id
+    """)
+    if cursor.rowcount:
+        print(f"Built the search index for {cursor.rowcount} cached videos.")
+
+@timed("cache_lookup")
 def get_cached_response(video_id: str):
     """Fetches the cached API response for a given video_id."""
-    conn = None
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT response_data FROM cache WHERE video_id = ?", (video_id,))
-        result = cursor.fetchone()
-        if result:
-            # Return the stored JSON string, which will be parsed later
-            return result[0]
-        else:
-            return None
+        found, response_json = _get_text("responses", video_id)
+        record_cache_lookup("response_data", found)
+        # Return the stored JSON string, which will be parsed later
+        return response_json
     except sqlite3.Error as e:
         print(f"Database error fetching cache for {video_id}: {e}")
         return None
-    finally:
-        if conn:
-            conn.close()
 
+def get_cached_response_data(video_id: str):
+    """
+    Fetches the cached API response for a given video_id, already parsed.
+    Served from the in-memory tier when possible; treat the result as read-only.
+    """
+    response_data = memory_cache.get("response_data", video_id)
+    if response_data is not None:
+        return response_data
+
+    cached_data_json = get_cached_response(video_id)
+    if not cached_data_json:
+        return _get_shared_responses([video_id]).get(video_id)
+    try:
+        response_data = json.loads(cached_data_json)
+    except json.JSONDecodeError as e:
+        print(f"Error decoding cached JSON for {video_id}: {e}")
+        return None
+    memory_cache.set("response_data", video_id, response_data)
+    return response_data
+
+@timed("cache_lookup")
+def get_cached_responses_data(video_ids: list[str]) -> dict:
+    """
+    get_cached_response_data() for many videos: one query for the ones not in the memory
+    tier, then one shared cache round trip for the rest. Returns {video_id: response_data}
+    for the videos found.
+    """
+    found = {}
+    missing = []
+    for video_id in dict.fromkeys(video_ids):
+        response_data = memory_cache.get("response_data", video_id)
+        if response_data is not None:
+            found[video_id] = response_data
+        else:
+            missing.append(video_id)
+
+    try:
+        conn = get_connection()
+        # Chunked to stay under SQLite's limit on bound parameters
+        for start in range(0, len(missing), 500):
+            chunk = missing[start:start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            for video_id, body, encoding in conn.execute(
+                f"SELECT video_id, body, encoding FROM responses WHERE video_id IN ({placeholders})", chunk
+            ):
+                response_data = _parse_response_data(decode_text(body, encoding))
+                if response_data:
+                    found[video_id] = response_data
+                    memory_cache.set("response_data", video_id, response_data)
+    except sqlite3.Error as e:
+        print(f"Database error fetching cache for {len(missing)} videos: {e}")
+    for video_id in missing:
+        record_cache_lookup("response_data", video_id in found)
+
+    found.update(_get_shared_responses([video_id for video_id in missing if video_id not in found]))
+    return found
+
+ISO_DURATION_PATTERN = re.compile(r"^P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+(?:\.\d+)?)S)?)?$")
+
+def parse_iso_duration(value):
+    """Seconds in an ISO 8601 duration such as YouTube's 'PT1M5S', or None."""
+    match = ISO_DURATION_PATTERN.match(value or "")
+    if not match or not any(match.groups()):
+        return None
+    days, hours, minutes, seconds = (float(part or 0) for part in match.groups())
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+def _parse_response_data(response_json: str):
+    try:
+        return json.loads(response_json) if response_json else None
+    except json.JSONDecodeError:
+        return None
+
+# Keys of TikTok results that hold the transcript and summary. They are kept out of
+# response_data: the text side tables are the only copy.
+RESPONSE_TEXT_KEYS = ("transcription", "summary")
+
+def _without_texts(response_data):
+    if isinstance(response_data, dict) and any(key in response_data for key in RESPONSE_TEXT_KEYS):
+        return {key: value for key, value in response_data.items() if key not in RESPONSE_TEXT_KEYS}
+    return response_data
+
+def video_fields(response_data) -> dict:
+    """
+    The typed cache columns (title, channel, published_at, duration) of a stored
+    response: a YouTube Data API videoListResponse or a flattened TikTok result.
+    """
+    fields = {"title": None, "channel": None, "published_at": None, "duration": None}
+    if not isinstance(response_data, dict):
+        return fields
+    if response_data.get("items"):
+        item = response_data["items"][0]
+        snippet = item.get("snippet") or {}
+        fields.update(
+            title=snippet.get("title"),
+            channel=snippet.get("channelTitle"),
+            published_at=snippet.get("publishedAt"),
+            duration=parse_iso_duration((item.get("contentDetails") or {}).get("duration")),
+        )
+    else:
+        try:
+            duration = float(response_data["duration"]) if response_data.get("duration") else None
+        except (TypeError, ValueError):
+            duration = None
+        fields.update(
+            title=response_data.get("title"),
+            channel=response_data.get("channelTitle"),
+            published_at=response_data.get("publishedAt") or None,
+            duration=duration,
+        )
+    return fields
+
+@timed("db_write")
 def cache_response(video_id: str, response_data: dict, source: str):
     """Stores an API response in the cache, including its source ('youtube' or 'tiktok')."""
-    conn = None
     if source not in ['youtube', 'tiktok']:
         print(f"Error: Invalid source '{source}' provided for video_id {video_id}. Source must be 'youtube' or 'tiktok'.")
         return # Or raise an error
 
+    _store_response(video_id, response_data, source)
+    _share("response", {video_id: json.dumps({"source": source, "response_data": _without_texts(response_data)})})
+
+def _store_response(video_id: str, response_data: dict, source: str):
+    """Writes a response and its typed columns to this replica's database."""
     try:
         # Convert the dictionary response to a JSON string for storage
-        response_json = json.dumps(response_data)
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        # Use INSERT OR REPLACE to handle potential existing entries
-        # This will insert a new row or replace an existing one based on video_id.
-        # If replacing, it updates response_data and source. Timestamp updates automatically.
-        # If the row exists but only had a transcript before, this adds response_data and source.
-        cursor.execute('''
-            INSERT OR REPLACE INTO cache (video_id, response_data, source, timestamp, transcript)
-            VALUES (?, ?, ?, CURRENT_TIMESTAMP, (SELECT transcript FROM cache WHERE video_id = ?))
-        ''', (video_id, response_json, source, video_id))
-        # Note: The subquery `(SELECT transcript FROM cache WHERE video_id = ?)` preserves the existing transcript if the row is replaced.
-        # If it's a new insert, the subquery returns NULL, which is the desired default for transcript.
-        conn.commit()
+        response_json = json.dumps(_without_texts(response_data))
+        conn = get_connection()
+        with conn:
+            # Upsert: inserts a new row, or updates the typed columns in place. A duration
+            # measured from the audio is kept if the response has none.
+            conn.execute('''
+                INSERT INTO cache (video_id, source, title, channel, published_at, duration, timestamp)
+                VALUES (:video_id, :source, :title, :channel, :published_at, :duration, CURRENT_TIMESTAMP)
+                ON CONFLICT(video_id) DO UPDATE SET
+                    source = excluded.source,
+                    title = excluded.title,
+                    channel = excluded.channel,
+                    published_at = excluded.published_at,
+                    duration = COALESCE(excluded.duration, cache.duration),
+                    timestamp = CURRENT_TIMESTAMP
+            ''', {"video_id": video_id, "source": source, **video_fields(response_data)})
+            _save_text(conn, "responses", video_id, response_json)
+            _update_graph_video(conn, video_id)
     except sqlite3.Error as e:
         print(f"Database error caching response for {video_id}: {e}")
     finally:
-        if conn:
-            conn.close()
+        memory_cache.invalidate("response_data", video_id)
+        memory_cache.invalidate("fetched_at", video_id)
+
+def get_response_fetched_at(video_id: str):
+    """Unix time a video's response was cached or last confirmed unchanged, or None if it isn't cached."""
+    fetched_at = memory_cache.get("fetched_at", video_id)
+    if fetched_at is not None:
+        return fetched_at
+    try:
+        result = get_connection().execute(
+            "SELECT CAST(strftime('%s', timestamp) AS REAL) FROM cache WHERE video_id = ?", (video_id,)
+        ).fetchone()
+    except sqlite3.Error as e:
+        print(f"Database error fetching cache timestamp for {video_id}: {e}")
+        return None
+    fetched_at = result[0] if result else None
+    memory_cache.set("fetched_at", video_id, fetched_at)
+    return fetched_at
+
+def get_stale_video_ids(source: str, max_age: float, limit: int = 500):
+    """Returns ids of a source's cached videos fetched more than max_age seconds ago, oldest first."""
+    try:
+        cursor = get_connection().execute('''
+            SELECT video_id FROM cache
+            WHERE source = ? AND timestamp < datetime('now', ?)
+            ORDER BY timestamp, video_id LIMIT ?
+        ''', (source, f"-{int(max_age)} seconds", limit))
+        return [row[0] for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        print(f"Database error listing stale {source} videos: {e}")
+        return []
+
+@timed("db_write")
+def touch_responses(video_ids: list[str]):
+    """Marks cached responses as fetched now, without rewriting them (e.g. confirmed unchanged)."""
+    if not video_ids:
+        return
+    try:
+        conn = get_connection()
+        with conn:
+            conn.executemany(
+                "UPDATE cache SET timestamp = CURRENT_TIMESTAMP WHERE video_id = ?", ((video_id,) for video_id in video_ids)
+            )
+    except sqlite3.Error as e:
+        print(f"Database error touching {len(video_ids)} cached responses: {e}")
+    finally:
+        for video_id in video_ids:
+            memory_cache.invalidate("fetched_at", video_id)
+
+def get_refresh_etag(batch_key: str):
+    """Returns the ETag of the last refresh of this batch of videos, or None."""
+    try:
+        result = get_connection().execute("SELECT etag FROM refresh_etags WHERE batch_key = ?", (batch_key,)).fetchone()
+        return result[0] if result else None
+    except sqlite3.Error as e:
+        print(f"Database error fetching refresh ETag: {e}")
+        return None
+
+def save_refresh_etag(batch_key: str, etag: str):
+    """Stores the ETag a refresh of this batch of videos returned."""
+    try:
+        conn = get_connection()
+        with conn:
+            conn.execute('''
+                INSERT INTO refresh_etags (batch_key, etag, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(batch_key) DO UPDATE SET etag = excluded.etag, updated_at = excluded.updated_at
+            ''', (batch_key, etag))
+    except sqlite3.Error as e:
+        print(f"Database error saving refresh ETag: {e}")
+
+def get_short_link(link: str):
+    """Returns (source, video_id, username) a short link resolved to, or None."""
+    try:
+        return get_connection().execute(
+            "SELECT source, video_id, username FROM short_links WHERE link = ?", (link,)
+        ).fetchone()
+    except sqlite3.Error as e:
+        print(f"Database error fetching short link: {e}")
+        return None
+
+def save_short_link(link: str, source: str, video_id: str, username: str = None):
+    """Stores what a short link resolved to."""
+    try:
+        conn = get_connection()
+        with conn:
+            conn.execute('''
+                INSERT INTO short_links (link, source, video_id, username, resolved_at) VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(link) DO UPDATE SET source = excluded.source, video_id = excluded.video_id,
+                    username = excluded.username, resolved_at = excluded.resolved_at
+            ''', (link, source, video_id, username))
+    except sqlite3.Error as e:
+        print(f"Database error saving short link: {e}")
+
+def _save_text(conn, table: str, video_id: str, text: str):
+    """
+    Stores a response, transcript or summary in its side table (deleting it when text is
+    None), creating the video's cache row if needed.
+    """
+    conn.execute("INSERT INTO cache (video_id) VALUES (?) ON CONFLICT(video_id) DO NOTHING", (video_id,))
+    if text is None:
+        conn.execute(f"DELETE FROM {table} WHERE video_id = ?", (video_id,))
+        return
+    body, encoding = encode_text(text)
+    conn.execute(f'''
+        INSERT INTO {table} (video_id, body, encoding) VALUES (?, ?, ?)
+        ON CONFLICT(video_id) DO UPDATE SET body = excluded.body, encoding = excluded.encoding
+    ''', (video_id, body, encoding))
+
+def _get_text(table: str, video_id: str):
+    """Reads a response, transcript or summary from its side table. Returns (found, text)."""
+    result = get_connection().execute(f"SELECT body, encoding FROM {table} WHERE video_id = ?", (video_id,)).fetchone()
+    return (True, decode_text(*result)) if result else (False, None)
 
+def _share(kind: str, values: dict):
+    """Copies entries to the cache backend when it is shared between replicas."""
+    backend = get_cache_backend()
+    if backend.shared:
+        backend.set_many(kind, values)
 
+def _get_shared_texts(kind: str, table: str, video_ids: list[str]) -> dict:
+    """
+    Looks up transcripts or summaries missing from this replica's database in the shared
+    cache backend, and keeps a local copy of the ones found. Returns {video_id: text}.
+    """
+    backend = get_cache_backend()
+    if not backend.shared or not video_ids:
+        return {}
+    texts = backend.get_many(kind, video_ids)
+    if texts:
+        try:
+            conn = get_connection()
+            with conn:
+                for video_id, text in texts.items():
+                    _save_text(conn, table, video_id, text)
+        except sqlite3.Error as e:
+            print(f"Database error copying shared {kind} entries: {e}")
+        for video_id in texts:
+            memory_cache.invalidate(kind, video_id)
+    return texts
+
+def _get_shared_responses(video_ids: list[str]) -> dict:
+    """
+    Looks up responses missing from this replica's database in the shared cache backend,
+    and stores the ones found locally (typed columns, graph and all). Returns
+    {video_id: response_data}.
+    """
+    backend = get_cache_backend()
+    if not backend.shared or not video_ids:
+        return {}
+    responses = {}
+    for video_id, envelope in backend.get_many("response", video_ids).items():
+        try:
+            shared = json.loads(envelope)
+            responses[video_id] = shared["response_data"]
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            print(f"Ignoring malformed shared response for {video_id}: {e}")
+            continue
+        _store_response(video_id, responses[video_id], shared.get("source"))
+    return responses
+
+
+@timed("db_write")
 def cache_transcript(video_id: str, transcript: str):
     """Stores or updates the transcript for a given video_id."""
-    conn = None
     print(f"Caching transcript for video ID: {video_id}")
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # First check if video_id exists
-        cursor.execute("SELECT 1 FROM cache WHERE video_id = ?", (video_id,))
-        exists = cursor.fetchone() is not None
-        
-        if exists:
-            # Update transcript if row exists
-            cursor.execute('''
-                UPDATE cache SET transcript = ? WHERE video_id = ?
-            ''', (transcript, video_id))
-        else:
-            # Insert new row with empty JSON for response_data if row doesn't exist
-            cursor.execute('''
-                INSERT INTO cache (video_id, response_data, transcript)
-                VALUES (?, ?, ?)
-            ''', (video_id, json.dumps({}), transcript))
-        
-        conn.commit()
+        conn = get_connection()
+        with conn:
+            _save_text(conn, "transcripts", video_id, transcript)
     except sqlite3.Error as e:
         print(f"Database error caching transcript for {video_id}: {e}")
     finally:
-        if conn:
-            conn.close()
+        memory_cache.invalidate("transcript", video_id)
+    _share("transcript", {video_id: transcript})
 
+@timed("db_write")
 def add_classification(video_id: str, classification: str):
     # check if the video is already classified is the classification
-    conn = None
     print(f"Adding classification for video ID: {video_id}")
 
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        conn = get_connection()
+        with conn:
+            # Check if the video_id already exists in the classification table
+            cursor = conn.execute("SELECT 1 FROM classification WHERE video_id = ? AND classification = ?", (video_id, classification))
+            exists = cursor.fetchone() is not None
 
-        # Check if the video_id already exists in the classification table
-        cursor.execute("SELECT 1 FROM classification WHERE video_id = ? AND classification = ?", (video_id, classification))
-        exists = cursor.fetchone() is not None
+            if not exists:
+                # Insert new classification if it doesn't exist
+                conn.execute('''
+                    INSERT INTO classification (video_id, classification)
+                    VALUES (?, ?)
+                ''', (video_id, classification))
+                _update_graph_classification(conn, video_id, classification)
 
         if not exists:
-            # Insert new classification if it doesn't exist
-            cursor.execute('''
-                INSERT INTO classification (video_id, classification)
-                VALUES (?, ?)
-            ''', (video_id, classification))
-
-            conn.commit()
             print(f"Added classification '{classification}' for video ID: {video_id}")
         else:
             print(f"Classification '{classification}' for video ID {video_id} already exists.")
     except sqlite3.Error as e:
         print(f"Database error adding classification for {video_id}: {e}")
     finally:
-        if conn:
-            conn.close()
+        memory_cache.invalidate("classification", video_id)
 
+@timed("cache_lookup")
 def get_classification(video_id: str):
     """Fetches the classification for a given video_id."""
-    conn = None
+    classifications = memory_cache.get("classification", video_id)
+    if classifications is not None:
+        return classifications
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT classification FROM classification WHERE video_id = ?", (video_id,))
+        cursor = get_connection().execute("SELECT classification FROM classification WHERE video_id = ?", (video_id,))
         classifications = [row[0] for row in cursor.fetchall()]
+        record_cache_lookup("classification", bool(classifications))
+        memory_cache.set("classification", video_id, classifications)
         # Return the classification if it exists and is not None, otherwise return None
         return classifications
     except sqlite3.Error as e:
         print(f"Database error fetching classification for {video_id}: {e}")
         return None
-    finally:
-        if conn:
-            conn.close()
 
 
+@timed("db_write")
 def cache_summary(video_id: str, summary: str):
     """Stores or updates the summary for a given video_id."""
-    conn = None
     print(f"Caching summary for video ID: {video_id}")
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # First check if video_id exists
-        cursor.execute("SELECT 1 FROM cache WHERE video_id = ?", (video_id,))
-        exists = cursor.fetchone() is not None
-        
-        if exists:
-            # Update summary if row exists
-            cursor.execute('''
-                UPDATE cache SET summary = ? WHERE video_id = ?
-            ''', (summary, video_id))
-        else:
-            # Insert new row with empty JSON for response_data if row doesn't exist
-            cursor.execute('''
-                INSERT INTO cache (video_id, response_data, summary)
-                VALUES (?, ?, ?)
-            ''', (video_id, json.dumps({}), summary))
-        
-        conn.commit()
+        conn = get_connection()
+        with conn:
+            _save_text(conn, "summaries", video_id, summary)
     except sqlite3.Error as e:
         print(f"Database error caching summary for {video_id}: {e}")
     finally:
-        if conn:
-            conn.close()
+        memory_cache.invalidate("summary", video_id)
+    _share("summary", {video_id: summary})
 
+@timed("cache_lookup")
 def get_cached_summary(video_id: str):
     """Fetches the cached summary for a given video_id."""
-    conn = None
+    summary = memory_cache.get("summary", video_id)
+    if summary is not None:
+        return summary
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT summary FROM cache WHERE video_id = ?", (video_id,))
-        result = cursor.fetchone()
-        # Return the summary if it exists and is not None, otherwise return None
-        return result[0] if result and result[0] is not None else None
+        found, summary = _get_text("summaries", video_id)
+        record_cache_lookup("summary", found)
+        if not found:
+            summary = _get_shared_texts("summary", "summaries", [video_id]).get(video_id)
+        memory_cache.set("summary", video_id, summary)
+        return summary
     except sqlite3.Error as e:
         print(f"Database error fetching summary for {video_id}: {e}")
         return None
-    finally:
-        if conn:
-            conn.close()
 
+@timed("cache_lookup")
 def get_cached_transcript(video_id: str):
     """Fetches the cached transcript for a given video_id."""
-    conn = None
+    transcript = memory_cache.get("transcript", video_id)
+    if transcript is not None:
+        return transcript
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT transcript FROM cache WHERE video_id = ?", (video_id,))
-        result = cursor.fetchone()
-        # Return the transcript if it exists and is not None, otherwise return None
-        return result[0] if result and result[0] is not None else None
+        found, transcript = _get_text("transcripts", video_id)
+        record_cache_lookup("transcript", found)
+        if not found:
+            transcript = _get_shared_texts("transcript", "transcripts", [video_id]).get(video_id)
+        memory_cache.set("transcript", video_id, transcript)
+        return transcript
     except sqlite3.Error as e:
         print(f"Database error fetching transcript for {video_id}: {e}")
         return None
-    finally:
-        if conn:
-            conn.close()
 
 
+def text_sql(table_alias: str = None) -> str:
+    """SQL expression reading a text side table's body, only calling into Python for compressed rows."""
+    prefix = f"{table_alias}." if table_alias else ""
+    return f"CASE {prefix}encoding WHEN 'plain' THEN {prefix}body ELSE decode_text({prefix}body, {prefix}encoding) END"
+
+# Fields a caller can select from get_videos()/iter_videos(), mapped to the SQL that produces them.
+# Metadata comes from typed columns of the cache row; response JSON, transcripts and summaries
+# live in side tables and are only read when selected. Classifications are aggregated per video into a JSON
+# array (in insertion order) using the classification.video_id index, so a whole page is fetched
+# with a single query.
+VIDEO_FIELD_COLUMNS = {
+    "video_id": "c.video_id",
+    "response_data": f"(SELECT {text_sql()} FROM responses WHERE video_id = c.video_id)",
+    "transcript": f"(SELECT {text_sql()} FROM transcripts WHERE video_id = c.video_id)",
+    "summary": f"(SELECT {text_sql()} FROM summaries WHERE video_id = c.video_id)",
+    "source": "c.source",
+    "title": "c.title",
+    "channel": "c.channel",
+    "published_at": "c.published_at",
+    "duration": "c.duration",
+    "classification": '''(SELECT json_group_array(classification)
+                          FROM (SELECT classification FROM classification
+                                WHERE video_id = c.video_id ORDER BY id))''',
+}
+# Fields returned when none are requested (the shape /home has always returned)
+DEFAULT_VIDEO_FIELDS = ("video_id", "response_data", "transcript", "source", "classification")
+
+@timed("cache_list")
+def get_videos(cursor: int = None, limit: int = None, fields=None, source: str = None, classification: str = None):
+    """
+    Fetches one page of cached videos in insertion order.
+
+    Args:
+        cursor: Return videos after this cursor (the next_cursor of the previous page).
+        limit: Maximum number of videos to return, or None for all of them.
+        fields: Iterable of VIDEO_FIELD_COLUMNS keys to include; unselected columns
+            (e.g. transcripts) are never read from disk. Defaults to DEFAULT_VIDEO_FIELDS.
+        source: Only return videos from this source ('youtube' or 'tiktok').
+        classification: Only return videos with this classification.
+
+    Returns:
+        A (videos, next_cursor) tuple. next_cursor is None when there are no more pages.
+    """
+    fields = [field for field in VIDEO_FIELD_COLUMNS if field in set(fields or DEFAULT_VIDEO_FIELDS)]
+    query = "SELECT c.id, c.video_id" + "".join(f", {VIDEO_FIELD_COLUMNS[field]}" for field in fields) + " FROM cache c"
+
+    conditions, params = [], []
+    if cursor is not None:
+        conditions.append("c.id > ?")
+        params.append(cursor)
+    if source:
+        conditions.append("c.source = ?")
+        params.append(source)
+    if classification:
+        conditions.append("EXISTS (SELECT 1 FROM classification WHERE video_id = c.video_id AND classification = ?)")
+        params.append(classification)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY c.id"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+
+    try:
+        rows = get_connection().execute(query, params).fetchall()
+    except sqlite3.Error as e:
+        print(f"Database error fetching cached videos: {e}")
+        return [], None
+
+    videos = []
+    for row in rows:
+        video_id = row[1]
+        video = dict(zip(fields, row[2:]))
+        if "response_data" in video:
+            # Reuse the already-parsed object from the memory tier when there is one
+            response_data = memory_cache.get("response_data", video_id)
+            if response_data is None and video["response_data"]:
+                response_data = json.loads(video["response_data"])
+                memory_cache.set("response_data", video_id, response_data)
+            video["response_data"] = response_data
+        if "classification" in video:
+            # Ensure classification is a list
+            video["classification"] = json.loads(video["classification"]) if video["classification"] else []
+        videos.append(video)
+
+    next_cursor = rows[-1][0] if limit is not None and len(rows) == limit else None
+    return videos, next_cursor
+
+def iter_videos(fields=None, source: str = None, classification: str = None, batch_size: int = 500):
+    """
+    Yields every matching cached video, fetching batch_size rows per query so the
+    whole table is never held in memory. Each batch is a separate query, so no
+    cursor is left open between yields.
+    """
+    cursor = None
+    while True:
+        videos, cursor = get_videos(cursor, batch_size, fields, source, classification)
+        yield from videos
+        if cursor is None:
+            return
+
 def get_all(user: str = None):
-    """Fetches all cached videos (including transcripts and source) from the database."""
-    conn = None
+    """Fetches all cached videos (including transcripts, source and classifications) from the database."""
+    videos, _ = get_videos()
+    return videos
+
+def create_job(url: str, max_attempts: int = 3):
+    """Adds an ingestion job for the given URL to the queue and returns its job_id."""
+    job_id = uuid.uuid4().hex
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        # Fetch video_id, response_data, transcript, and source
-        cursor.execute("SELECT video_id, response_data, transcript, source FROM cache")
-        results = cursor.fetchall()
-        # Convert results to a list of dictionaries
-        all_data = []
-        for row in results:
-            video_id, response_data_json, transcript, source = row
-            response_data = json.loads(response_data_json) if response_data_json else None
-            classification = get_classification(video_id)
-            all_data.append({
-                "video_id": video_id,
-                "response_data": response_data,
-                "transcript": transcript,
-                "source": source, # Include the source
-                "classification": classification if classification else [], # Ensure classification is a list
-            })
-        return all_data
-    except sqlite3.Error as e:
-        print(f"Database error fetching all cached data: {e}")
+        conn = get_connection()
+        with conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, url, max_attempts) VALUES (?, ?, ?)",
+                (job_id, url, max_attempts),
+            )
+        return job_id
+    except sqlite3.Error as e:
+        print(f"Database error creating job for {url}: {e}")
+        return None
+
+def get_job(job_id: str):
+    """Fetches a job's status as a dictionary, or None if it doesn't exist."""
+    try:
+        cursor = get_connection().execute('''
+            SELECT job_id, url, status, stage, attempts, max_attempts, error, result, created_at, updated_at
+            FROM jobs WHERE job_id = ?
+        ''', (job_id,))
+        row = cursor.fetchone()
+    except sqlite3.Error as e:
+        print(f"Database error fetching job {job_id}: {e}")
+        return None
+    if not row:
+        return None
+    job = dict(zip(("job_id", "url", "status", "stage", "attempts", "max_attempts", "error", "result", "created_at", "updated_at"), row))
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+def claim_next_job(lease_seconds: float):
+    """
+    Atomically marks the oldest runnable queued job as running, leased to the caller for
+    lease_seconds, and returns (job_id, url, attempts, max_attempts), or None if no job is ready.
+    """
+    try:
+        conn = get_connection()
+        with conn:
+            cursor = conn.execute('''
+                UPDATE jobs SET status = 'running', stage = NULL, attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP,
+                    claimed_at = CURRENT_TIMESTAMP, lease_expires = datetime('now', ?)
+                WHERE job_id = (
+                    SELECT job_id FROM jobs
+                    WHERE status = 'queued' AND run_after <= CURRENT_TIMESTAMP
+                    ORDER BY created_at LIMIT 1
+                )
+                RETURNING job_id, url, attempts, max_attempts
+            ''', (f"+{lease_seconds} seconds",))
+            return cursor.fetchone()
+    except sqlite3.Error as e:
+        print(f"Database error claiming next job: {e}")
+        return None
+
+def extend_job_lease(job_id: str, lease_seconds: float):
+    """Pushes a running job's lease lease_seconds into the future, so no other worker recovers it."""
+    try:
+        conn = get_connection()
+        with conn:
+            conn.execute(
+                "UPDATE jobs SET lease_expires = datetime('now', ?) WHERE job_id = ? AND status = 'running'",
+                (f"+{lease_seconds} seconds", job_id),
+            )
+    except sqlite3.Error as e:
+        print(f"Database error extending lease of job {job_id}: {e}")
+
+def update_job_stage(job_id: str, stage: str):
+    """Records the pipeline stage a running job has reached."""
+    try:
+        conn = get_connection()
+        with conn:
+            conn.execute(
+                "UPDATE jobs SET stage = ?, updated_at = CURRENT_TIMESTAMP WHERE job_id = ?",
+                (stage, job_id),
+            )
+    except sqlite3.Error as e:
+        print(f"Database error updating stage for job {job_id}: {e}")
+
+def complete_job(job_id: str, result: dict):
+    """Marks a job as succeeded and stores its result."""
+    try:
+        conn = get_connection()
+        with conn:
+            conn.execute('''
+                UPDATE jobs SET status = 'succeeded', stage = NULL, error = NULL, result = ?, updated_at = CURRENT_TIMESTAMP,
+                    lease_expires = NULL
+                WHERE job_id = ?
+            ''', (json.dumps(result), job_id))
+    except sqlite3.Error as e:
+        print(f"Database error completing job {job_id}: {e}")
+
+def fail_job(job_id: str, error: str, retry_delay: float = None):
+    """
+    Records a job failure. With a retry_delay (seconds) the job is queued again
+    to run after the delay, otherwise it is marked as failed for good.
+    """
+    try:
+        conn = get_connection()
+        with conn:
+            if retry_delay is not None:
+                conn.execute('''
+                    UPDATE jobs SET status = 'queued', error = ?, updated_at = CURRENT_TIMESTAMP,
+                        run_after = datetime('now', ?), lease_expires = NULL
+                    WHERE job_id = ?
+                ''', (error, f"+{retry_delay} seconds", job_id))
+            else:
+                conn.execute('''
+                    UPDATE jobs SET status = 'failed', error = ?, updated_at = CURRENT_TIMESTAMP, lease_expires = NULL
+                    WHERE job_id = ?
+                ''', (error, job_id))
+    except sqlite3.Error as e:
+        print(f"Database error failing job {job_id}: {e}")
+
+def release_job(job_id: str):
+    """
+    Puts a running job back on the queue without counting the attempt, for a worker that
+    stops before the job finished (e.g. on shutdown).
+    """
+    try:
+        conn = get_connection()
+        with conn:
+            conn.execute('''
+                UPDATE jobs SET status = 'queued', stage = NULL, attempts = MAX(attempts - 1, 0),
+                    updated_at = CURRENT_TIMESTAMP, lease_expires = NULL
+                WHERE job_id = ? AND status = 'running'
+            ''', (job_id,))
+    except sqlite3.Error as e:
+        print(f"Database error releasing job {job_id}: {e}")
+
+def recover_expired_jobs():
+    """
+    Recovers running jobs whose lease has expired, i.e. whose worker died without
+    finishing them (jobs from before leases existed count as expired). They are queued
+    again, or failed if they already used all their attempts, so a job that crashes the
+    process is not retried forever. Returns (requeued, failed) counts.
+    """
+    expired = "status = 'running' AND (lease_expires IS NULL OR lease_expires <= CURRENT_TIMESTAMP)"
+    try:
+        conn = get_connection()
+        with conn:
+            failed = conn.execute(f'''
+                UPDATE jobs SET status = 'failed', updated_at = CURRENT_TIMESTAMP, lease_expires = NULL,
+                    error = 'Worker stopped responding on attempt ' || attempts || '/' || max_attempts
+                WHERE {expired} AND attempts >= max_attempts
+            ''').rowcount
+            requeued = conn.execute(f'''
+                UPDATE jobs SET status = 'queued', stage = NULL, updated_at = CURRENT_TIMESTAMP, lease_expires = NULL
+                WHERE {expired}
+            ''').rowcount
+            return requeued, failed
+    except sqlite3.Error as e:
+        print(f"Database error recovering expired jobs: {e}")
+        return 0, 0
+
+def acquire_lock(name: str, token: str, ttl: float) -> bool:
+    """
+    Takes the named lock for `ttl` seconds unless another token holds it unexpired.
+    Returns True if it is now held with `token`.
+    """
+    now = time.time()
+    try:
+        conn = get_connection()
+        with conn:
+            cursor = conn.execute('''
+                INSERT INTO locks (name, token, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET token = excluded.token, expires_at = excluded.expires_at
+                WHERE locks.expires_at <= ?
+            ''', (name, token, now + ttl, now))
+            return cursor.rowcount == 1
+    except sqlite3.Error as e:
+        # Nothing to coordinate through: carry on as if the lock was taken
+        print(f"Database error taking lock {name}: {e}")
+        return True
+
+def extend_lock(name: str, token: str, ttl: float) -> bool:
+    """Moves a held lock's expiry to `ttl` seconds from now. Returns False if it is no longer held with `token`."""
+    try:
+        conn = get_connection()
+        with conn:
+            cursor = conn.execute(
+                "UPDATE locks SET expires_at = ? WHERE name = ? AND token = ?", (time.time() + ttl, name, token)
+            )
+            return cursor.rowcount == 1
+    except sqlite3.Error as e:
+        print(f"Database error extending lock {name}: {e}")
+        return False
+
+def release_lock(name: str, token: str):
+    """Releases the named lock if it is still held with `token`."""
+    try:
+        conn = get_connection()
+        with conn:
+            conn.execute("DELETE FROM locks WHERE name = ? AND token = ?", (name, token))
+    except sqlite3.Error as e:
+        print(f"Database error releasing lock {name}: {e}")
+
+def get_audio_ref(ref_key: str):
+    """Returns (sha256, path, size) of the audio blob referenced by ref_key, or None."""
+    try:
+        cursor = get_connection().execute('''
+            SELECT b.sha256, b.path, b.size FROM audio_refs r
+            JOIN audio_blobs b ON b.sha256 = r.sha256
+            WHERE r.ref_key = ?
+        ''', (ref_key,))
+        return cursor.fetchone()
+    except sqlite3.Error as e:
+        print(f"Database error fetching audio ref {ref_key}: {e}")
+        return None
+
+def get_audio_blob(sha256: str):
+    """Returns (path, size) of the audio blob with this hash, or None."""
+    try:
+        return get_connection().execute("SELECT path, size FROM audio_blobs WHERE sha256 = ?", (sha256,)).fetchone()
+    except sqlite3.Error as e:
+        print(f"Database error fetching audio blob {sha256}: {e}")
+        return None
+
+def save_audio_blob(ref_key: str, sha256: str, path: str, size: int):
+    """Records an audio blob (if new) and points ref_key at it, marking it as just used."""
+    try:
+        conn = get_connection()
+        with conn:
+            conn.execute('''
+                INSERT INTO audio_blobs (sha256, path, size) VALUES (?, ?, ?)
+                ON CONFLICT(sha256) DO UPDATE SET last_access = strftime('%Y-%m-%d %H:%M:%f', 'now')
+            ''', (sha256, path, size))
+            conn.execute('''
+                INSERT INTO audio_refs (ref_key, sha256) VALUES (?, ?)
+                ON CONFLICT(ref_key) DO UPDATE SET sha256 = excluded.sha256
+            ''', (ref_key, sha256))
+    except sqlite3.Error as e:
+        print(f"Database error saving audio blob {sha256} for {ref_key}: {e}")
+
+def touch_audio_blob(sha256: str):
+    """Marks an audio blob as just used, for LRU eviction."""
+    try:
+        conn = get_connection()
+        with conn:
+            conn.execute("UPDATE audio_blobs SET last_access = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE sha256 = ?", (sha256,))
+    except sqlite3.Error as e:
+        print(f"Database error touching audio blob {sha256}: {e}")
+
+def get_audio_store_usage():
+    """Returns (total bytes, number of blobs, number of refs) tracked by the audio store."""
+    try:
+        conn = get_connection()
+        total_bytes, blobs = conn.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM audio_blobs").fetchone()
+        refs = conn.execute("SELECT COUNT(*) FROM audio_refs").fetchone()[0]
+        return total_bytes, blobs, refs
+    except sqlite3.Error as e:
+        print(f"Database error fetching audio store usage: {e}")
+        return 0, 0, 0
+
+def get_least_recently_used_audio_blobs(limit: int = 100):
+    """Returns up to `limit` (sha256, path, size) audio blobs, least recently used first."""
+    try:
+        cursor = get_connection().execute(
+            "SELECT sha256, path, size FROM audio_blobs ORDER BY last_access, created_at LIMIT ?", (limit,)
+        )
+        return cursor.fetchall()
+    except sqlite3.Error as e:
+        print(f"Database error fetching least recently used audio blobs: {e}")
         return []
-    finally:
-        if conn:
-            conn.close()
 
+def delete_audio_blob(sha256: str):
+    """Forgets an audio blob and every ref pointing at it (the file itself is removed by the caller)."""
+    try:
+        conn = get_connection()
+        with conn:
+            conn.execute("DELETE FROM audio_refs WHERE sha256 = ?", (sha256,))
+            conn.execute("DELETE FROM audio_blobs WHERE sha256 = ?", (sha256,))
+    except sqlite3.Error as e:
+        print(f"Database error deleting audio blob {sha256}: {e}")
+
+def save_audio_fingerprint(video_id: str, fingerprint: str, duration: float):
+    """Records the audio fingerprint and duration (seconds) of a video."""
+    try:
+        conn = get_connection()
+        with conn:
+            conn.execute('''
+                INSERT INTO audio_fingerprints (video_id, fingerprint, duration) VALUES (?, ?, ?)
+                ON CONFLICT(video_id) DO UPDATE SET fingerprint = excluded.fingerprint, duration = excluded.duration
+            ''', (video_id, fingerprint, duration))
+            # The measured duration fills in for videos whose metadata has none
+            conn.execute("UPDATE cache SET duration = ? WHERE video_id = ? AND duration IS NULL", (duration, video_id))
+    except sqlite3.Error as e:
+        print(f"Database error saving audio fingerprint for {video_id}: {e}")
+
+def find_transcript_by_fingerprint(fingerprint: str, exclude_video_id: str = None):
+    """
+    Returns (video_id, transcript) of another video with the same audio fingerprint
+    that already has a cached transcript, or None.
+    """
+    try:
+        cursor = get_connection().execute(f'''
+            SELECT f.video_id, {text_sql('t')} FROM audio_fingerprints f
+            JOIN transcripts t ON t.video_id = f.video_id
+            WHERE f.fingerprint = ? AND f.video_id != ?
+            LIMIT 1
+        ''', (fingerprint, exclude_video_id or ""))
+        return cursor.fetchone()
+    except sqlite3.Error as e:
+        print(f"Database error finding transcript for fingerprint {fingerprint}: {e}")
+        return None
+
+def mark_transcript_reused(video_id: str, reused_from: str):
+    """Records that a video's transcript was copied from another video with the same audio."""
+    try:
+        conn = get_connection()
+        with conn:
+            conn.execute("UPDATE audio_fingerprints SET reused_from = ? WHERE video_id = ?", (reused_from, video_id))
+    except sqlite3.Error as e:
+        print(f"Database error marking transcript reuse for {video_id}: {e}")
+
+def get_transcript_reuse_stats():
+    """Returns how many transcription calls, and how many seconds of audio, fingerprint reuse has saved."""
+    try:
+        calls, seconds = get_connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(duration), 0) FROM audio_fingerprints WHERE reused_from IS NOT NULL"
+        ).fetchone()
+        return {"transcriptions_saved": calls, "audio_seconds_saved": seconds}
+    except sqlite3.Error as e:
+        print(f"Database error fetching transcript reuse stats: {e}")
+        return {"transcriptions_saved": 0, "audio_seconds_saved": 0}
+
+def get_transcript_chunks(audio_key: str):
+    """Returns {(start, end): transcript} for the already transcribed chunks of an audio file."""
+    try:
+        cursor = get_connection().execute(
+            "SELECT start, end, transcript FROM transcript_chunks WHERE audio_key = ?", (audio_key,)
+        )
+        return {(start, end): transcript for start, end, transcript in cursor.fetchall()}
+    except sqlite3.Error as e:
+        print(f"Database error fetching transcript chunks for {audio_key}: {e}")
+        return {}
+
+def save_transcript_chunk(audio_key: str, start: float, end: float, transcript: str):
+    """Stores the transcript of the [start, end) seconds of an audio file."""
+    try:
+        conn = get_connection()
+        with conn:
+            conn.execute('''
+                INSERT INTO transcript_chunks (audio_key, start, end, transcript) VALUES (?, ?, ?, ?)
+                ON CONFLICT(audio_key, start, end) DO UPDATE SET transcript = excluded.transcript
+            ''', (audio_key, start, end, transcript))
+    except sqlite3.Error as e:
+        print(f"Database error saving transcript chunk {start}-{end} for {audio_key}: {e}")
+
+def get_summaries_by_hash(input_hashes: list[str]):
+    """Returns {input_hash: summary} for the given hashes that have a cached summary."""
+    if not input_hashes:
+        return {}
+    try:
+        placeholders = ",".join("?" * len(input_hashes))
+        cursor = get_connection().execute(
+            f"SELECT input_hash, summary FROM summary_cache WHERE input_hash IN ({placeholders})", input_hashes
+        )
+        return dict(cursor.fetchall())
+    except sqlite3.Error as e:
+        print(f"Database error fetching cached summaries: {e}")
+        return {}
+
+def save_summaries_by_hash(summaries: list[tuple[str, str, str]]):
+    """Stores (input_hash, model, summary) rows in the summary cache."""
+    if not summaries:
+        return
+    try:
+        conn = get_connection()
+        with conn:
+            conn.executemany('''
+                INSERT INTO summary_cache (input_hash, model, summary) VALUES (?, ?, ?)
+                ON CONFLICT(input_hash) DO UPDATE SET summary = excluded.summary
+            ''', summaries)
+    except sqlite3.Error as e:
+        print(f"Database error caching summaries: {e}")
+
+def get_podcast_segment(segment_key: str):
+    """Returns the stored script for a podcast segment, or None."""
+    try:
+        row = get_connection().execute(
+            "SELECT script FROM podcast_segments WHERE segment_key = ?", (segment_key,)
+        ).fetchone()
+        return row[0] if row else None
+    except sqlite3.Error as e:
+        print(f"Database error fetching podcast segment {segment_key}: {e}")
+        return None
+
+def save_podcast_segment(segment_key: str, classification: str, video_ids: list[str], script: str):
+    """Stores the generated script for a podcast segment."""
+    try:
+        conn = get_connection()
+        with conn:
+            conn.execute('''
+                INSERT INTO podcast_segments (segment_key, classification, video_ids, script) VALUES (?, ?, ?, ?)
+                ON CONFLICT(segment_key) DO UPDATE SET script = excluded.script
+            ''', (segment_key, classification, json.dumps(video_ids), script))
+    except sqlite3.Error as e:
+        print(f"Database error saving podcast segment {segment_key}: {e}")
+
+def get_embedding_rows():
+    """Returns (video_id, row, model) for every video with a stored embedding."""
+    try:
+        return get_connection().execute("SELECT video_id, row, model FROM embeddings ORDER BY row").fetchall()
+    except sqlite3.Error as e:
+        print(f"Database error fetching embedding rows: {e}")
+        return []
+
+def get_embedding_row_count() -> int:
+    """Returns one past the highest allocated embedding row (0 if there are none)."""
+    try:
+        return get_connection().execute("SELECT COALESCE(MAX(row) + 1, 0) FROM embeddings").fetchone()[0]
+    except sqlite3.Error as e:
+        print(f"Database error counting embedding rows: {e}")
+        return 0
+
+def save_embedding_rows(entries: list[tuple[str, str, str]], write_vectors):
+    """
+    Records (video_id, model, content_hash) embeddings and returns their rows: a video
+    keeps its row and new videos get the next free ones. Rows are allocated inside a
+    write transaction, and write_vectors(rows) is called before it commits, so processes
+    sharing the database (the server and `python tools/embeddings.py`) never hand out
+    the same row and a recorded row always has its vector on disk.
+    Returns None if the database write failed.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        rows = []
+        for video_id, model, content_hash in entries:
+            cursor.execute('''
+                INSERT INTO embeddings (video_id, row, model, content_hash)
+                VALUES (?, (SELECT COALESCE(MAX(row) + 1, 0) FROM embeddings), ?, ?)
+                ON CONFLICT(video_id) DO UPDATE SET
+                    model = excluded.model, content_hash = excluded.content_hash, updated_at = CURRENT_TIMESTAMP
+                RETURNING row
+            ''', (video_id, model, content_hash))
+            rows.append(cursor.fetchone()[0])
+        write_vectors(rows)
+        cursor.execute("COMMIT")
+        return rows
+    except BaseException as e:
+        if conn.in_transaction:
+            cursor.execute("ROLLBACK")
+        if not isinstance(e, sqlite3.Error):
+            raise
+        print(f"Database error saving embedding rows: {e}")
+        return None
+
+def get_embedding_candidates(after_id: int = 0, limit: int = 100):
+    """
+    Returns (id, video_id, title, summary, transcript, content_hash) for up to `limit`
+    videos with text, in id order after `after_id`. content_hash is that of the stored
+    embedding, or None if the video has none, so callers can tell which are out of date.
+    """
+    try:
+        return get_connection().execute(f'''
+            SELECT c.id, c.video_id, c.title, {text_sql('s')}, {text_sql('t')}, e.content_hash
+            FROM cache c
+            LEFT JOIN summaries s ON s.video_id = c.video_id
+            LEFT JOIN transcripts t ON t.video_id = c.video_id
+            LEFT JOIN embeddings e ON e.video_id = c.video_id
+            WHERE (s.video_id IS NOT NULL OR t.video_id IS NOT NULL) AND c.id > ?
+            ORDER BY c.id LIMIT ?
+        ''', (after_id, limit)).fetchall()
+    except sqlite3.Error as e:
+        print(f"Database error fetching videos to embed: {e}")
+        return []
+
+# Level-of-detail settings for get_graph(): each level adds a kind of node and the edges it brings
+GRAPH_DETAIL_LEVELS = {
+    "classifications": ("classification",),
+    "channels": ("classification", "channel"),
+    "videos": ("classification", "channel", "video"),
+}
+GRAPH_NODE_KINDS = ("classification", "channel", "video")
+GRAPH_EDGE_KINDS = ("classification", "channel", "co_classification", "channel_classification")
+
+def _build_graph(cursor):
+    """Rebuilds the graph tables from the cache and classification tables in a few bulk statements."""
+    cursor.execute("DELETE FROM graph_edges")
+    cursor.execute("DELETE FROM graph_nodes")
+    cursor.execute('''
+        INSERT INTO graph_nodes (node_id, kind, label, source, weight)
+        SELECT 'video:' || video_id, 'video', title, source, 1 FROM cache
+        WHERE source IS NOT NULL -- rows created by cache_transcript/cache_summary alone have no response yet
+    ''')
+    # Classifications may name videos whose response was never cached
+    cursor.execute('''
+        INSERT OR IGNORE INTO graph_nodes (node_id, kind, weight)
+        SELECT DISTINCT 'video:' || video_id, 'video', 1 FROM classification
+    ''')
+    channels = "SELECT video_id, source, channel FROM cache"
+    cursor.execute(f'''
+        INSERT INTO graph_nodes (node_id, kind, label, source, weight)
+        SELECT 'channel:' || source || ':' || channel, 'channel', channel, source, COUNT(*)
+        FROM ({channels}) WHERE channel IS NOT NULL GROUP BY source, channel
+    ''')
+    cursor.execute(f'''
+        INSERT INTO graph_edges (source, target, kind, weight)
+        SELECT 'video:' || video_id, 'channel:' || source || ':' || channel, 'channel', 1
+        FROM ({channels}) WHERE channel IS NOT NULL
+    ''')
+    cursor.execute('''
+        INSERT INTO graph_nodes (node_id, kind, label, weight)
+        SELECT 'classification:' || classification, 'classification', classification, COUNT(DISTINCT video_id)
+        FROM classification GROUP BY classification
+    ''')
+    cursor.execute('''
+        INSERT INTO graph_edges (source, target, kind, weight)
+        SELECT DISTINCT 'video:' || video_id, 'classification:' || classification, 'classification', 1
+        FROM classification
+    ''')
+    cursor.execute('''
+        INSERT INTO graph_edges (source, target, kind, weight)
+        SELECT 'classification:' || a.classification, 'classification:' || b.classification,
+               'co_classification', COUNT(DISTINCT a.video_id)
+        FROM classification a JOIN classification b
+          ON b.video_id = a.video_id AND b.classification > a.classification
+        GROUP BY a.classification, b.classification
+    ''')
+    cursor.execute('''
+        INSERT INTO graph_edges (source, target, kind, weight)
+        SELECT e.target, 'classification:' || c.classification, 'channel_classification', COUNT(DISTINCT c.video_id)
+        FROM classification c JOIN graph_edges e ON e.source = 'video:' || c.video_id AND e.kind = 'channel'
+        GROUP BY e.target, c.classification
+    ''')
+    videos = cursor.execute("SELECT COUNT(*) FROM graph_nodes WHERE kind = 'video'").fetchone()[0]
+    if videos:
+        print(f"Built the knowledge graph for {videos} videos.")
+
+def rebuild_graph():
+    """Rebuilds the knowledge graph tables from scratch (normally they are kept up to date incrementally)."""
+    try:
+        conn = get_connection()
+        with conn:
+            _build_graph(conn.cursor())
+    except sqlite3.Error as e:
+        print(f"Database error rebuilding the knowledge graph: {e}")
+
+def _add_graph_node(conn, node_id: str, kind: str, label: str, source: str, weight: int):
+    """Adds weight to a node, creating it if needed. Runs inside the caller's transaction."""
+    conn.execute('''
+        INSERT INTO graph_nodes (node_id, kind, label, source, weight) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(node_id) DO UPDATE SET weight = weight + excluded.weight
+    ''', (node_id, kind, label, source, weight))
+
+def _add_graph_edge(conn, source: str, target: str, kind: str, weight: int = 1):
+    """Adds weight to an edge, creating it if needed and dropping it once its weight reaches zero."""
+    conn.execute('''
+        INSERT INTO graph_edges (source, target, kind, weight) VALUES (?, ?, ?, ?)
+        ON CONFLICT(source, target) DO UPDATE SET weight = weight + excluded.weight
+    ''', (source, target, kind, weight))
+    if weight < 0:
+        conn.execute("DELETE FROM graph_edges WHERE source = ? AND target = ? AND weight <= 0", (source, target))
+
+def _update_graph_video(conn, video_id: str):
+    """Updates a video's node and moves its channel edges if its channel changed (called by cache_response)."""
+    row = conn.execute("SELECT title, channel, source FROM cache WHERE video_id = ?", (video_id,)).fetchone()
+    if row is None:
+        return
+    title, channel, source = row
+    video_node = f"video:{video_id}"
+    conn.execute('''
+        INSERT INTO graph_nodes (node_id, kind, label, source, weight) VALUES (?, 'video', ?, ?, 1)
+        ON CONFLICT(node_id) DO UPDATE SET label = excluded.label, source = excluded.source
+    ''', (video_node, title, source))
+
+    old = conn.execute("SELECT target FROM graph_edges WHERE source = ? AND kind = 'channel'", (video_node,)).fetchone()
+    old_channel = old[0] if old else None
+    new_channel = f"channel:{source}:{channel}" if channel else None
+    if old_channel == new_channel:
+        return
+    classifications = [
+        f"classification:{classification}" for (classification,) in
+        conn.execute("SELECT DISTINCT classification FROM classification WHERE video_id = ?", (video_id,))
+    ]
+    for channel_node, delta in ((old_channel, -1), (new_channel, 1)):
+        if channel_node is None:
+            continue
+        _add_graph_node(conn, channel_node, "channel", channel, source, delta)
+        _add_graph_edge(conn, video_node, channel_node, "channel", delta)
+        for classification_node in classifications:
+            _add_graph_edge(conn, channel_node, classification_node, "channel_classification", delta)
+
+def _update_graph_classification(conn, video_id: str, classification: str):
+    """Links a video to a newly added classification (called by add_classification)."""
+    video_node, classification_node = f"video:{video_id}", f"classification:{classification}"
+    conn.execute("INSERT OR IGNORE INTO graph_nodes (node_id, kind, weight) VALUES (?, 'video', 1)", (video_node,))
+    _add_graph_node(conn, classification_node, "classification", classification, None, 1)
+    _add_graph_edge(conn, video_node, classification_node, "classification")
+    for (other,) in conn.execute(
+        "SELECT DISTINCT classification FROM classification WHERE video_id = ? AND classification != ?",
+        (video_id, classification),
+    ).fetchall():
+        _add_graph_edge(conn, *sorted((classification_node, f"classification:{other}")), "co_classification")
+    channel = conn.execute("SELECT target FROM graph_edges WHERE source = ? AND kind = 'channel'", (video_node,)).fetchone()
+    if channel:
+        _add_graph_edge(conn, channel[0], classification_node, "channel_classification")
+
+@timed("graph")
+def get_graph(detail: str = "videos", max_videos: int = 500, max_channels: int = 200,
+              source: str = None, classification: str = None):
+    """
+    Returns the knowledge graph at a level of detail, array-encoded:
+    nodes are [id, kind, label, weight] and edges are [source_index, target_index,
+    kind, weight], with kinds as indexes into GRAPH_NODE_KINDS / GRAPH_EDGE_KINDS.
+
+    "classifications" returns classification nodes and how often they co-occur;
+    "channels" adds the `max_channels` largest channels; "videos" also adds the
+    `max_videos` most recently cached videos. Channels and videos can be filtered by
+    source and classification; `omitted` counts the ones left out by the limits.
+    Returns None on a database error.
+    """
+    kinds = GRAPH_DETAIL_LEVELS[detail]
+    limits = {"classification": None, "channel": max_channels, "video": max_videos}
+    # Videos are ordered newest first (their weight is always 1, so this walks the kind/weight index
+    # backwards without sorting), everything else biggest first
+    orders = {"classification": "weight DESC, node_id", "channel": "weight DESC, node_id", "video": "weight DESC, rowid DESC"}
+    try:
+        conn = get_connection()
+        nodes, omitted = [], {}
+        for kind in kinds:
+            filters, params = ["kind = ?", "weight > 0"], [kind]
+            if kind != "classification":
+                if source:
+                    filters.append("source = ?")
+                    params.append(source)
+                if classification:
+                    filters.append("EXISTS (SELECT 1 FROM graph_edges e WHERE e.source = node_id AND e.target = ?)")
+                    params.append(f"classification:{classification}")
+            where = " AND ".join(filters)
+            query = f"SELECT node_id, kind, label, weight FROM graph_nodes WHERE {where} ORDER BY {orders[kind]}"
+            if limits[kind] is None:
+                rows = conn.execute(query, params).fetchall()
+            else:
+                rows = conn.execute(f"{query} LIMIT ?", params + [limits[kind]]).fetchall()
+                total = conn.execute(f"SELECT COUNT(*) FROM graph_nodes WHERE {where}", params).fetchone()[0]
+                omitted[kind] = total - len(rows)
+            nodes.extend(rows)
+
+        index = {node[0]: i for i, node in enumerate(nodes)}
+        # Every edge's source is a selected node; keep the ones whose target was selected too
+        edges = [
+            [index[edge_source], index[target], GRAPH_EDGE_KINDS.index(kind), weight]
+            for edge_source, target, kind, weight in conn.execute(
+                "SELECT source, target, kind, weight FROM graph_edges WHERE source IN (SELECT value FROM json_each(?))",
+                (json.dumps(list(index)),),
+            )
+            if target in index
+        ]
+        return {
+            "detail": detail,
+            "node_kinds": GRAPH_NODE_KINDS,
+            "edge_kinds": GRAPH_EDGE_KINDS,
+            "nodes": [[node_id, GRAPH_NODE_KINDS.index(kind), label, weight] for node_id, kind, label, weight in nodes],
+            "edges": edges,
+            "omitted": omitted,
+        }
+    except sqlite3.Error as e:
+        print(f"Database error fetching the knowledge graph: {e}")
+        return None
+
+SEARCH_SNIPPET_TOKENS = 16
+# bm25 weights for the title, transcript and summary columns: title and summary matches rank higher
+SEARCH_COLUMN_WEIGHTS = (5.0, 1.0, 2.0)
+
+def to_fts_query(query: str) -> str:
+    """
+    Turns free text into an FTS5 query matching all of its words: each word is quoted
+    so punctuation and FTS operators in user input can't cause syntax errors. A
+    trailing * on a word is kept as a prefix search.
+    """
+    terms = []
+    for word in query.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*").replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+@timed("search")
+def search_videos(query: str, limit: int = 20, offset: int = 0, source: str = None, classification: str = None):
+    """
+    Full-text searches titles, transcripts and summaries, best matches first (bm25).
+
+    Returns a (results, next_offset) tuple. Each result has video_id, source, title,
+    classification, snippet (the best matching passage with matches in <b></b>) and
+    rank (lower is better). next_offset is None on the last page.
+    """
+    fts_query = to_fts_query(query)
+    if not fts_query:
+        return [], None
+
+    sql = f'''
+        SELECT c.video_id, c.source, c.title,
+               {VIDEO_FIELD_COLUMNS["classification"]},
+               snippet(cache_fts, -1, '<b>', '</b>', '…', {SEARCH_SNIPPET_TOKENS}),
+               bm25(cache_fts, {", ".join(str(weight) for weight in SEARCH_COLUMN_WEIGHTS)}) AS rank
+        FROM cache_fts JOIN cache c ON c.id = cache_fts.rowid
+        WHERE cache_fts MATCH ?
+    '''
+    params = [fts_query]
+    if source:
+        sql += " AND c.source = ?"
+        params.append(source)
+    if classification:
+        sql += " AND EXISTS (SELECT 1 FROM classification WHERE video_id = c.video_id AND classification = ?)"
+        params.append(classification)
+    sql += " ORDER BY rank LIMIT ? OFFSET ?"
+    params.extend([limit, offset])
+
+    try:
+        rows = get_connection().execute(sql, params).fetchall()
+    except sqlite3.Error as e:
+        print(f"Database error searching for {query!r}: {e}")
+        return [], None
+
+    results = [
+        {
+            "video_id": video_id,
+            "source": source,
+            "title": title,
+            "classification": json.loads(classifications) if classifications else [],
+            "snippet": snippet,
+            "rank": rank,
+        }
+        for video_id, source, title, classifications, snippet, rank in rows
+    ]
+    next_offset = offset + limit if len(rows) == limit else None
+    return results, next_offset
 
 
 if __name__ == '__main__':
@@ -0,0 +1,69 @@
+import os
+import threading
+from cachetools import TTLCache
+
+# Maximum number of entries held in memory, and how long (seconds) an entry may be
+# served before it is re-read from SQLite. The TTL bounds staleness when another
+# process (e.g. a second replica) writes to the same database.
+MEMORY_CACHE_SIZE = int(os.getenv("MEMORY_CACHE_SIZE", "4096"))
+MEMORY_CACHE_TTL = float(os.getenv("MEMORY_CACHE_TTL", "300"))
+
+# The columns cached per video. Entries are keyed by (column, video_id).
+COLUMNS = ("response_data", "transcript", "summary", "classification", "fetched_at")
+
+class MemoryCache:
+    """
+    A bounded, thread-safe LRU cache with per-entry TTL that sits in front of the
+    SQLite cache. Values are stored already parsed and are shared between callers,
+    so treat them as read-only.
+    """
+
+    def __init__(self, maxsize: int = MEMORY_CACHE_SIZE, ttl: float = MEMORY_CACHE_TTL):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, column: str, video_id: str):
+        """Returns the cached value, or None on a miss (missing or expired)."""
+        with self._lock:
+            value = self._cache.get((column, video_id))
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def set(self, column: str, video_id: str, value):
+        """Caches a value. None is never cached, so misses are always re-checked in SQLite."""
+        if value is None:
+            return
+        with self._lock:
+            self._cache[(column, video_id)] = value
+
+    def invalidate(self, column: str, video_id: str):
+        """Drops a cached value after the underlying row changed."""
+        with self._lock:
+            self._cache.pop((column, video_id), None)
+
+    def clear(self):
+        """Drops every entry and resets the stats."""
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Returns hits, misses, hit rate and current size."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self._cache),
+                "maxsize": self._cache.maxsize,
+            }
+
+# The process-wide memory tier used by db_commands
+memory_cache = MemoryCache()
@@ -1,52 +1,80 @@
 import os
+import hashlib
 import json # Added for parsing cached JSON
+from dataclasses import dataclass
 from dotenv import load_dotenv
 import yt_dlp
-from .db_commands import get_cached_response, cache_response # Import cache functions
+from .db_commands import ( # Import cache functions
+    get_cached_response_data, get_cached_responses_data, cache_response,
+    touch_responses, get_refresh_etag, save_refresh_etag
+)
+from tools.audio import SPEECH_AUDIO_FORMAT, get_audio_format, extract_audio
+from tools.audio_store import AUDIO_STORE_DIR, audio_key, get_audio, get_staging_path, store_audio
+from tools.metadata_refresh import refresh_if_stale, record_quota, count_refresh
+from tools.http_client import http_get
+from tools.video_urls import parse_video_url
 
 
 load_dotenv()
 
 google_api_key = os.getenv("GOOGLE_API_KEY")
+# The YouTube Data API videos endpoint (overridable to point at a local stub)
+YOUTUBE_API_URL = os.getenv("YOUTUBE_API_URL", "https://www.googleapis.com/youtube/v3/videos")
 cookies = os.getenv("COOKIES")
+
+# Audio-only formats are tried smallest first; the first with at least this bitrate
+# (kbps) is downloaded. Plenty for speech at a fraction of bestaudio's size.
+YOUTUBE_AUDIO_MIN_ABR = int(os.getenv("YOUTUBE_AUDIO_MIN_ABR", "32"))
+# Codecs the transcription backend decodes as-is; anything else is re-encoded with ffmpeg
+TRANSCRIBER_NATIVE_CODECS = tuple(
+    codec.strip() for codec in os.getenv("TRANSCRIBER_NATIVE_CODECS", "opus,mp4a,aac,mp3,vorbis,flac").split(",") if codec.strip()
+)
+
+@dataclass
+class AudioDownload:
+    """Result of download_audio(): `path` is set on success, `error` on failure."""
+    video_id: str
+    path: str | None = None
+    error: str | None = None
+    format_id: str | None = None
+    codec: str | None = None
+    size: int = 0
+    from_store: bool = False
+    resumed: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.path is not None
         
 
 def get_youtube_video_id(url):
     """
-    Extracts the video ID from a YouTube URL.
+    Extracts the video ID from a YouTube URL (any form tools/video_urls.py supports).
     """
-    if "youtube.com/watch?v=" in url:
-        return url.split("v=")[1].split("&")[0]
-    elif "youtu.be/" in url:
-        return url.split("/")[-1]
-    elif "youtube.com/shorts/" in url:
-        return url.split("/")[-1]
-    else:
-        return None
+    video = parse_video_url(url)
+    return video.video_id if video and video.source == "youtube" else None
 
 def get_youtube_video_details(video_id: str):
     """
     Fetches video details using the YouTube Data API, checking the cache first.
     """
-    # 1. Check cache first
-    cached_data_json = get_cached_response(video_id)
-    if cached_data_json:
+    # 1. Check cache first (already parsed; a corrupted entry counts as a miss)
+    cached_data = get_cached_response_data(video_id)
+    if cached_data:
         print(f"Cache hit for video ID: {video_id}")
-        try:
-            # Parse the JSON string from the cache
-            return json.loads(cached_data_json)
-        except json.JSONDecodeError as e:
-            print(f"Error decoding cached JSON for {video_id}: {e}")
-            # Proceed to fetch from API if cache is corrupted
+        # Served even if stale: past its TTL it is refreshed in the background
+        refresh_if_stale("youtube", video_id)
+        return cached_data
 
     # 2. If not in cache or cache error, fetch from API
     print(f"Cache miss for video ID: {video_id}. Fetching from API.")
     import requests # Keep import local to function if only used here
 
-    url = f"https://www.googleapis.com/youtube/v3/videos?id={video_id}&key={google_api_key}&part=snippet,contentDetails"
+    url = f"{YOUTUBE_API_URL}?id={video_id}&key={google_api_key}&part=snippet,contentDetails"
     
     try:
-        response = requests.get(url)
+        response = http_get(url, timeout=30)
+        record_quota(YOUTUBE_VIDEOS_LIST_COST, "fetch")
         response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
         
         video_data = response.json()
@@ -63,7 +91,111 @@ def get_youtube_video_details(video_id: str):
     except json.JSONDecodeError as e:
         print(f"Error decoding API response JSON for {video_id}: {e}")
         return None
-    
+
+# The YouTube Data API videos endpoint accepts at most 50 ids per call, and a call costs
+# one quota unit however many ids it has
+YOUTUBE_API_MAX_IDS = 50
+YOUTUBE_VIDEOS_LIST_COST = 1
+
+def single_video_response(video_data: dict, item: dict) -> dict:
+    """One item of a batch videoListResponse, in the shape a single-id call returns."""
+    return {
+        "kind": video_data.get("kind"),
+        "etag": item.get("etag"),
+        "items": [item],
+        "pageInfo": {"totalResults": 1, "resultsPerPage": 1},
+    }
+
+def get_youtube_videos_details(video_ids: list[str]):
+    """
+    Fetches details for many videos, checking the cache first and requesting the
+    missing ones from the YouTube Data API in batches of up to 50 ids per call.
+
+    Each video is cached in the same shape get_youtube_video_details() returns (a
+    videoListResponse with a single item), so later single lookups hit the cache.
+
+    Returns a dict of video_id -> video details for the videos that were found.
+    """
+    # One cache query (and one shared cache round trip) for the whole batch
+    details = get_cached_responses_data(video_ids)
+    missing = [video_id for video_id in dict.fromkeys(video_ids) if video_id not in details] # De-duplicate, keeping order
+    for video_id in details:
+        refresh_if_stale("youtube", video_id)
+
+    print(f"Batch lookup: {len(details)} cache hit(s), fetching {len(missing)} video(s) from API.")
+    import requests # Keep import local to function if only used here
+
+    for start in range(0, len(missing), YOUTUBE_API_MAX_IDS):
+        chunk = missing[start:start + YOUTUBE_API_MAX_IDS]
+        params = {"id": ",".join(chunk), "key": google_api_key, "part": "snippet,contentDetails"}
+        try:
+            response = http_get(YOUTUBE_API_URL, params=params, timeout=30)
+            record_quota(YOUTUBE_VIDEOS_LIST_COST, "fetch")
+            response.raise_for_status()
+            video_data = response.json()
+        except requests.exceptions.RequestException as e:
+            print(f"Batch API request failed for {len(chunk)} video(s): {e}")
+            continue
+        except json.JSONDecodeError as e:
+            print(f"Error decoding batch API response JSON: {e}")
+            continue
+
+        for item in video_data.get("items", []):
+            single = single_video_response(video_data, item)
+            cache_response(item["id"], single, source='youtube')
+            details[item["id"]] = single
+
+    return details
+
+def refresh_youtube_videos(video_ids: list[str]):
+    """
+    Re-fetches up to 50 cached videos in one videos.list call (see tools/metadata_refresh.py).
+
+    The call is conditional on the ETag the same batch returned last time: if nothing changed
+    the API answers 304 Not Modified with no body and no quota is used. Otherwise only videos
+    whose item ETag changed are rewritten; the rest, and videos the API no longer returns
+    (deleted or private), keep their cached response and are just marked as fetched now.
+    """
+    import requests # Keep import local to function if only used here
+
+    batch_key = hashlib.sha1(",".join(sorted(video_ids)).encode()).hexdigest()
+    etag = get_refresh_etag(batch_key)
+    params = {"id": ",".join(video_ids), "key": google_api_key, "part": "snippet,contentDetails"}
+    try:
+        response = http_get(YOUTUBE_API_URL, params=params, headers={"If-None-Match": etag} if etag else {}, timeout=30)
+        count_refresh(api_calls=1)
+        if response.status_code == 304:
+            touch_responses(video_ids)
+            count_refresh(not_modified=len(video_ids))
+            return
+        record_quota(YOUTUBE_VIDEOS_LIST_COST, "refresh")
+        response.raise_for_status()
+        video_data = response.json()
+    except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
+        count_refresh(errors=1)
+        print(f"Refresh request failed for {len(video_ids)} video(s): {e}")
+        return
+
+    cached = get_cached_responses_data(video_ids)
+    unchanged = []
+    returned = set()
+    for item in video_data.get("items", []):
+        returned.add(item["id"])
+        cached_items = (cached.get(item["id"]) or {}).get("items") or [{}]
+        if item.get("etag") and cached_items[0].get("etag") == item.get("etag"):
+            unchanged.append(item["id"])
+        else:
+            cache_response(item["id"], single_video_response(video_data, item), source='youtube')
+            count_refresh(refreshed=1)
+    missing = [video_id for video_id in video_ids if video_id not in returned]
+    touch_responses(unchanged + missing)
+    count_refresh(unchanged=len(unchanged), missing=len(missing))
+
+    # If-None-Match must echo the HTTP ETag header; the body carries the same value
+    new_etag = response.headers.get("ETag") or video_data.get("etag")
+    if new_etag:
+        save_refresh_etag(batch_key, new_etag)
+
 def parse_video_details(video_details: dict):
     """
     Parses the video details and returns relevant information.
@@ -89,37 +221,103 @@ def parse_video_details(video_details: dict):
         "tags": snippet.get("tags"),
     }
 
+def get_legacy_audio_path(video_id: str) -> str:
+    """Where audio was saved before the audio store existed (adopted into the store on first use)."""
+    if os.path.exists('/db/cache/'):
+        return os.path.join("/db/cache/youtube_audio", f"{video_id}.mp3")
+    return os.path.join("youtube_audio", f"{video_id}.mp3")
+
+def get_stored_audio(video_id: str):
+    """Returns the path of this video's audio in the audio store, or None if it hasn't been downloaded."""
+    return get_audio(audio_key('youtube', video_id), legacy_paths=[get_legacy_audio_path(video_id)])
+
+def get_partial_download_base(video_id: str) -> str:
+    """
+    Returns the fixed path (without extension) yt-dlp downloads a video's audio to.
+    The path is the same on every attempt, so an interrupted download leaves a .part
+    file that the next attempt resumes instead of starting over.
+    """
+    partial_dir = os.path.join(AUDIO_STORE_DIR, "partial")
+    os.makedirs(partial_dir, exist_ok=True)
+    return os.path.join(partial_dir, f"youtube_{video_id}")
+
+def _has_partial_download(partial_base: str) -> bool:
+    prefix = os.path.basename(partial_base) + "."
+    return any(name.startswith(prefix) and name.endswith(".part") for name in os.listdir(os.path.dirname(partial_base)))
+
+def _download_and_store(ydl_opts: dict, url: str, video_id: str, partial_base: str) -> AudioDownload:
+    """
+    Runs yt-dlp and moves the downloaded audio into the audio store. Audio in a codec
+    the transcriber can't take (or muxed with video) is re-encoded with ffmpeg first.
+    Raises on download errors.
+    """
+    resumed = _has_partial_download(partial_base)
+    if resumed:
+        print(f"Resuming partial audio download for {video_id}")
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=True)
+    if not info:
+        return AudioDownload(video_id, error="yt-dlp returned no video info")
+
+    requested = (info.get("requested_downloads") or [{}])[0]
+    downloaded_path = requested.get("filepath")
+    if not downloaded_path or not os.path.exists(downloaded_path):
+        return AudioDownload(video_id, error="yt-dlp finished but produced no audio file")
+
+    codec = (info.get("acodec") or "").split(".")[0]
+    if codec not in TRANSCRIBER_NATIVE_CODECS or info.get("vcodec") not in (None, "none"):
+        print(f"Re-encoding {codec or 'unknown'} audio of {video_id} for transcription")
+        converted_path = get_staging_path(get_audio_format()["extension"])
+        try:
+            extract_audio(downloaded_path, converted_path)
+        except Exception:
+            if os.path.exists(converted_path):
+                os.remove(converted_path)
+            raise
+        finally:
+            os.remove(downloaded_path)
+        downloaded_path = converted_path
+        codec = SPEECH_AUDIO_FORMAT
+
+    size = os.path.getsize(downloaded_path)
+    stored_path = store_audio(audio_key('youtube', video_id), downloaded_path)
+    return AudioDownload(
+        video_id, path=stored_path, format_id=info.get("format_id"), codec=codec, size=size, resumed=resumed
+    )
+
 # Download audio from url using yt-dlp   
-def download_audio(url, video_id):
+def download_audio(url, video_id) -> AudioDownload:
     """
-    Downloads audio from a YouTube URL using yt-dlp.
+    Downloads audio from a YouTube URL using yt-dlp into the audio store.
+
+    The smallest audio-only format of at least YOUTUBE_AUDIO_MIN_ABR kbps is chosen
+    and kept in its native codec when the transcriber accepts it. Downloads resume
+    from the partial file an interrupted attempt left behind.
+
+    Returns an AudioDownload: `ok` and `path` on success, `error` on failure.
     """
-    # Ensure output directory exists
-    if os.path.exists('/db/cache/'):
-        output_dir = os.path.dirname("/db/cache/youtube_audio/")
-    else:
-        # Fallback to the current directory if the path doesn't exist
-        output_dir = "youtube_audio" 
-    os.makedirs(output_dir, exist_ok=True)
-    
     # Check if audio file already exists
-    if os.path.exists(os.path.join(output_dir, f"{video_id}.mp3")):
+    stored_path = get_stored_audio(video_id)
+    if stored_path:
         print("Audio file already exists.")
-        return
-    
+        return AudioDownload(video_id, path=stored_path, size=os.path.getsize(stored_path), from_store=True)
+
+    partial_base = get_partial_download_base(video_id)
+    last_error = None
+
     # Base options for yt-dlp
     ydl_opts = {
-        'format': 'bestaudio/best',
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'mp3',
-            'preferredquality': '192',
-        }],
-        'outtmpl': os.path.join(output_dir, '%(id)s.%(ext)s'),
-        'quiet': False,
+        # Sorted smallest bitrate first, so 'ba' is the smallest adequate audio-only format
+        'format': f'ba[abr>={YOUTUBE_AUDIO_MIN_ABR}]/ba/b',
+        'format_sort': ['+abr', '+size'],
+        'outtmpl': f"{partial_base}.%(ext)s",
+        'continuedl': True,
+        # Ranged requests of 10 MB: avoids throttling and resumes at chunk granularity
+        'http_chunk_size': 10 * 1024 * 1024,
+        'retries': 10,
+        'quiet': True,
+        'noprogress': True,
         'no_warnings': False,
-        'ignoreerrors': True,
-        'verbose': True,
     }
     
     # Handle cookies if provided
@@ -145,11 +343,13 @@ def download_audio(url, video_id):
                 
                 # Try to download with the cookie file
                 try:
-                    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                        ydl.download([url])
-                    print(f"Successfully downloaded audio for {video_id}")
-                    return
+                    result = _download_and_store(ydl_opts, url, video_id, partial_base)
+                    if result.ok:
+                        print(f"Successfully downloaded audio for {video_id} (format {result.format_id}, {result.codec}, {result.size} bytes)")
+                        return result
+                    last_error = result.error
                 except Exception as e:
+                    last_error = str(e)
                     print(f"Error downloading with cookies: {e}")
                     print("Trying alternative cookie handling...")
             finally:
@@ -158,17 +358,23 @@ def download_audio(url, video_id):
                     os.unlink(cookie_file.name)
                 except:
                     pass
+                ydl_opts.pop('cookiefile', None)
     
     # Try without cookies as a last resort
     print("Attempting download without cookies")
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
-        print(f"Successfully downloaded audio for {video_id}")
+        result = _download_and_store(ydl_opts, url, video_id, partial_base)
+        if result.ok:
+            print(f"Successfully downloaded audio for {video_id} (format {result.format_id}, {result.codec}, {result.size} bytes)")
+            return result
+        last_error = result.error
+        print(f"{result.error} for {video_id}")
     except Exception as e:
+        last_error = str(e)
         print(f"Error downloading audio: {e}")
-        print("Failed to download the video. For YouTube bot detection issues:")
-        print("1. Make sure your cookies are fresh and in correct Netscape format")
-        print("2. You can generate fresh cookies using: yt-dlp --cookies-from-browser firefox --cookies-file cookies.txt")
-        print("3. Either set the COOKIES environment variable to the path of this file")
-        print("   or copy the entire content of the file into the COOKIES environment variable")
+    print("Failed to download the video. For YouTube bot detection issues:")
+    print("1. Make sure your cookies are fresh and in correct Netscape format")
+    print("2. You can generate fresh cookies using: yt-dlp --cookies-from-browser firefox --cookies-file cookies.txt")
+    print("3. Either set the COOKIES environment variable to the path of this file")
+    print("   or copy the entire content of the file into the COOKIES environment variable")
+    return AudioDownload(video_id, error=last_error or "Download failed")